@@ -1,4 +1,5 @@
 import streamlit as st
+import pandas as pd
 
 st.set_page_config(
     page_title="StartupCFO Tool | Automatización Contable",
@@ -52,11 +53,52 @@ with col2:
 
 st.divider()
 
-from src.loader import get_prepared_data
-from src.processor import find_missing_records
-from src.classifier import classify_missing_records
-from src.writer import save_to_excel
-from src.config import OUTPUT_FILE
+import io
+from src.classifier import SuggestionCache
+from src.pipeline import load_and_audit, add_new_movements, LOAD_STAGES, UPDATE_STAGES
+from src.validator import EXACT_DUPLICATES, EXAMPLE_ROWS
+from src.profiling import RunProfile
+from src.background import BackgroundRun
+
+# Seconds between two refreshes of the progress bar while the pipeline runs
+PROGRESS_POLL_SECONDS = 0.5
+
+STAGE_MESSAGES = {
+    "get_prepared_data": " Paso 1: Cargando y normalizando datos...",
+    "audit_data_quality": " Paso 1: Revisando la calidad de los datos...",
+    "find_missing_records": " Paso 2: Buscando registros faltantes en el histórico...",
+    "classify_missing_records": " Paso 3: Clasificando nuevos gastos (IA Fuzzy Logic)...",
+    "save_to_excel": " Paso 4: Generando archivo Excel con formato...",
+}
+
+def load_job(input_bytes, mayor_bytes, listener):
+    profile = RunProfile("web", listener=listener)
+    # Never fork the multi-threaded server: load both files in this worker thread
+    input_df, mayor_df, findings = load_and_audit(
+        io.BytesIO(input_bytes), io.BytesIO(mayor_bytes), profile, parallel_load=False
+    )
+    return input_df, mayor_df, findings, profile
+
+def update_job(input_df, mayor_df, input_bytes, load_stages, cache, listener):
+    profile = RunProfile("web", stages=load_stages, listener=listener)
+    update = add_new_movements(
+        input_df, mayor_df, io.BytesIO(input_bytes), profile,
+        in_memory=True, fix_existing_rows=True, cache=cache
+    )
+    return update, profile
+
+@st.fragment(run_every=PROGRESS_POLL_SECONDS)
+def show_progress(run_key):
+    """Progress bar of a background run, refreshed on its own; the whole page reruns when it finishes."""
+    run = st.session_state[run_key]
+    if run is None or run.done():
+        st.rerun()
+    snapshot = run.snapshot()
+    message = STAGE_MESSAGES.get(snapshot["stage"], " Preparando el proceso...")
+    if snapshot["rows"]:
+        done, total = snapshot["rows"]
+        message += f" ({done:,} de {total:,} filas)"
+    st.progress(snapshot["overall"], text=message)
 
 if 'data_loaded' not in st.session_state:
     st.session_state.data_loaded = False
@@ -64,47 +106,80 @@ if 'input_df' not in st.session_state:
     st.session_state.input_df = None
 if 'mayor_df' not in st.session_state:
     st.session_state.mayor_df = None
-if 'all_warnings' not in st.session_state:
-    st.session_state.all_warnings = []
-
-if st.button(" Ejecutar Proceso"):
-    if input_file and mayor_file:
+if 'all_findings' not in st.session_state:
+    st.session_state.all_findings = []
+if 'load_profile' not in st.session_state:
+    st.session_state.load_profile = RunProfile("web")
+if 'suggestion_cache' not in st.session_state:
+    st.session_state.suggestion_cache = SuggestionCache()
+if 'load_run' not in st.session_state:
+    st.session_state.load_run = None
+if 'update_run' not in st.session_state:
+    st.session_state.update_run = None
+if 'update_result' not in st.session_state:
+    st.session_state.update_result = None
+if 'run_error' not in st.session_state:
+    st.session_state.run_error = None
 
-        status = st.empty()
-        
+# Collect the runs that finished since the last rerun, before any button is drawn
+load_run = st.session_state.load_run
+if load_run is not None and load_run.done():
+    st.session_state.load_run = None
+    try:
+        input_df, mayor_df, all_findings, load_profile = load_run.result()
+        st.session_state.input_df = input_df
+        st.session_state.mayor_df = mayor_df
+        st.session_state.all_findings = all_findings
+        st.session_state.load_profile = load_profile
+        st.session_state.data_loaded = True
+    except ValueError as e:
+        st.session_state.run_error = str(e)
+        st.session_state.data_loaded = False
 
-        status.info(" Paso 1: Cargando y normalizando datos...")
-        try:
-            input_df, mayor_df = get_prepared_data(input_file, mayor_file)
+update_run = st.session_state.update_run
+if update_run is not None and update_run.done():
+    st.session_state.update_run = None
+    try:
+        st.session_state.update_result = update_run.result()
+    except ValueError as e:
+        st.session_state.run_error = str(e)
 
-            st.session_state.input_df = input_df
-            st.session_state.mayor_df = mayor_df
-            st.session_state.data_loaded = True
+running = st.session_state.load_run is not None or st.session_state.update_run is not None
 
-            from src.validator import audit_data_quality
-            all_warnings = audit_data_quality(input_df, "InputPL") + audit_data_quality(mayor_df, "Mayor")
-            st.session_state.all_warnings = all_warnings
-            
-        except ValueError as e:
-            status.error(str(e))
-            st.session_state.data_loaded = False
-            st.stop()
+if st.button(" Ejecutar Proceso", disabled=running):
+    if input_file and mayor_file:
+        st.session_state.input_bytes = input_file.getvalue()
+        st.session_state.data_loaded = False
+        st.session_state.update_result = None
+        st.session_state.run_error = None
+        st.session_state.load_run = BackgroundRun(
+            load_job, LOAD_STAGES, st.session_state.input_bytes, mayor_file.getvalue()
+        )
+        running = True
     else:
         st.warning("Por favor, sube ambos archivos para continuar.")
         st.session_state.data_loaded = False
 
+if st.session_state.load_run is not None:
+    show_progress("load_run")
+
+if st.session_state.run_error:
+    st.error(st.session_state.run_error)
+
 if st.session_state.data_loaded and st.session_state.input_df is not None and st.session_state.mayor_df is not None:
     input_df = st.session_state.input_df
     mayor_df = st.session_state.mayor_df
-    all_warnings = st.session_state.all_warnings
+    all_findings = st.session_state.all_findings
     
-    if all_warnings:
+    if all_findings:
         with st.expander("**Avisos de Calidad de Datos** (Pulsa para ver detalles)", expanded=False):
-            for warning in all_warnings:
-                st.write(warning)
+            for finding in all_findings:
+                st.write(finding.message)
+                if finding.count > EXAMPLE_ROWS:
+                    st.dataframe(pd.DataFrame({"Fila Excel": finding.excel_rows}), height=150)
             st.caption("Nota: El proceso continuará, pero se recomienda revisar estos puntos.")
 
-    has_duplicates = any("duplicados exactos" in warning.lower() for warning in all_warnings)
+    has_duplicates = any(finding.check_id == EXACT_DUPLICATES for finding in all_findings)
     if has_duplicates:
         st.markdown("### Opciones de Limpieza")
         remove_duplicates = st.checkbox(
@@ -132,41 +207,60 @@ if st.session_state.data_loaded and st.session_state.input_df is not None and st
                 st.session_state.input_df = input_df
                 st.session_state.mayor_df = mayor_df
     
-    if st.button("Continuar con el Procesamiento", key="continue_button"):
-        status = st.empty()
-
-        input_df = st.session_state.input_df
-        mayor_df = st.session_state.mayor_df
-
-        status.info(" Paso 2: Buscando registros faltantes en el histórico...")
-        new_movements = find_missing_records(input_df, mayor_df)
-        
-        if new_movements is not None and len(new_movements) > 0:
-                st.success(f" **Análisis finalizado:** Se han detectado **{len(new_movements)}** movimientos nuevos en el Mayor que no estaban en el InputPL.")
-
-                status.info(" Paso 3: Clasificando nuevos gastos (IA Fuzzy Logic)...")
-                classified_df = classify_missing_records(new_movements, input_df)
-
-                st.write("###  Nuevos registros clasificados")
-                st.info("A continuación se muestran solo los registros que se van a añadir al archivo final:")
-                st.dataframe(classified_df, width='stretch')
-
-                status.info(" Paso 4: Generando archivo Excel con formato...")
-               
-                save_to_excel(classified_df, input_file, input_df=input_df)
-                
-                status.success(" ¡Todo listo! El histórico ha sido actualizado.")
-                
-                st.markdown("---")
-                st.write("### Descarga de resultados")
-                st.write("El siguiente botón generará el archivo **InputPL completo**, incluyendo los datos originales y estos nuevos registros clasificados en su lugar correspondiente.")
-                
-                with open(OUTPUT_FILE, "rb") as file:
-                    st.download_button(
-                        label="Descargar Excel Actualizado (.xlsx)",
-                        data=file,
-                        file_name="InputPL_Actualizado.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        width='stretch'
-                    )
-            
+    if st.button("Continuar con el Procesamiento", key="continue_button", disabled=running):
+        st.session_state.update_result = None
+        st.session_state.run_error = None
+        st.session_state.update_run = BackgroundRun(
+            update_job, UPDATE_STAGES,
+            st.session_state.input_df, st.session_state.mayor_df, st.session_state.input_bytes,
+            st.session_state.load_profile.stages, st.session_state.suggestion_cache
+        )
+
+if st.session_state.update_run is not None:
+    show_progress("update_run")
+
+if st.session_state.update_result is not None:
+    update, profile = st.session_state.update_result
+    tolerance_report = update.tolerance_report
+    classified_df = update.classified_df
+
+    if tolerance_report is not None and len(tolerance_report) > 0:
+        st.warning(f" **{len(tolerance_report)}** movimientos del Mayor coinciden con el InputPL solo dentro de la tolerancia de Saldo y no se añadirán:")
+        st.dataframe(tolerance_report, width='stretch')
+
+    if classified_df is not None and len(classified_df) > 0:
+        st.success(f" **Análisis finalizado:** Se han detectado **{len(classified_df)}** movimientos nuevos en el Mayor que no estaban en el InputPL.")
+
+        st.write("###  Nuevos registros clasificados")
+        st.info("A continuación se muestran solo los registros que se van a añadir al archivo final:")
+        st.dataframe(classified_df, width='stretch')
+
+        st.success(" ¡Todo listo! El histórico ha sido actualizado.")
+
+        st.markdown("---")
+        st.write("### Descarga de resultados")
+        st.write("El siguiente botón generará el archivo **InputPL completo**, incluyendo los datos originales y estos nuevos registros clasificados en su lugar correspondiente.")
+
+        st.download_button(
+            label="Descargar Excel Actualizado (.xlsx)",
+            data=update.output.getvalue(),
+            file_name="InputPL_Actualizado.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            width='stretch'
+        )
+
+    with st.expander("**Rendimiento del proceso**", expanded=False):
+        st.dataframe(
+            profile.to_frame().rename(columns={
+                "stage": "Etapa", "wall_s": "Tiempo (s)", "cpu_s": "CPU del hilo (s)",
+                "child_cpu_s": "CPU de subprocesos (s)", "process_peak_rss_mib": "Pico RSS del proceso (MiB)",
+                "rows": "Filas",
+            }),
+            width='stretch'
+        )
+        st.download_button(
+            label="Descargar informe de rendimiento (.json)",
+            data=profile.to_json(),
+            file_name="informe_rendimiento.json",
+            mime="application/json"
+        )
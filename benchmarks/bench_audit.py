@@ -0,0 +1,147 @@
+"""
+Benchmark for the data quality audit and exact-duplicate removal.
+
+Compares audit_data_quality (one AuditFrame shared by every check) with the previous
+implementation (kept below as legacy_audit_data_quality) and checks that both return
+identical warnings; and the mask-based remove_exact_duplicates with the previous
+split/concat/sort_index version (legacy_remove_exact_duplicates), checking identical frames.
+
+Usage (from the project root):
+    python -m benchmarks.bench_audit --rows 200000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.config import UNIQUE_IDENTIFIERS
+from src.validator import audit_data_quality, remove_exact_duplicates
+
+
+def legacy_audit_data_quality(df, file_label):
+    """audit_data_quality before the shared AuditFrame."""
+    warnings = []
+
+    if df is None or df.empty:
+        return warnings
+
+    for col in ['Debe', 'Haber']:
+        if col in df.columns:
+            negatives = df[pd.to_numeric(df[col], errors='coerce') < 0]
+            if not negatives.empty:
+                count = len(negatives)
+                rows = (negatives.index + 2).tolist()[:5]
+                warnings.append(f"**[{file_label}]** Detectados {count} valores negativos en la columna '{col}' (Filas Excel aprox: {rows}...).")
+
+    for col in ['Concepto', 'Nº Asiento', 'Fecha']:
+        if col in df.columns:
+            empties = df[df[col].isna() | (df[col].astype(str).str.strip() == "")]
+            if col == 'Nº Asiento':
+                empties = empties[empties[col].astype(str).str.upper() != 'END']
+            if not empties.empty:
+                count = len(empties)
+                rows = (empties.index + 2).tolist()[:5]
+                warnings.append(f" **[{file_label}]** Detectadas {count} celdas vacías en la columna crítica '{col}' (Filas Excel aprox: {rows}...).")
+
+    if all(c in df.columns for c in UNIQUE_IDENTIFIERS):
+        clean_df = df[df['Nº Asiento'].astype(str).str.upper() != 'END']
+        duplicates = clean_df.groupby(UNIQUE_IDENTIFIERS).size()
+        duplicate_groups = duplicates[duplicates > 1]
+        if not duplicate_groups.empty:
+            count_groups = len(duplicate_groups)
+            total_duplicate_rows = duplicate_groups.sum()
+            first_duplicate_key = duplicate_groups.index[0]
+            mask = True
+            for idx, col in enumerate(UNIQUE_IDENTIFIERS):
+                if col == 'Fecha':
+                    mask = mask & (pd.to_datetime(clean_df[col]) == pd.to_datetime(first_duplicate_key[idx]))
+                else:
+                    mask = mask & (clean_df[col] == first_duplicate_key[idx])
+            duplicate_rows = clean_df[mask]
+            example_rows = (duplicate_rows.index + 2).tolist()[:5]
+            warnings.append(
+                f"**[{file_label}]** Detectados {count_groups} grupos de duplicados exactos "
+                f"(mismo Nº Asiento, Fecha y Saldo) con un total de {total_duplicate_rows} filas afectadas "
+                f"(Filas Excel aprox: {example_rows}...)."
+            )
+
+    if all(c in df.columns for c in ['Nº Asiento', 'Fecha', 'Saldo']):
+        clean_df = df[df['Nº Asiento'].astype(str).str.upper() != 'END']
+        inconsistent = clean_df.groupby(['Nº Asiento', 'Fecha'])['Saldo'].nunique()
+        bad_groups = inconsistent[inconsistent > 1]
+        if not bad_groups.empty:
+            count = len(bad_groups)
+            warnings.append(f" **[{file_label}]** Detectadas {count} posibles inconsistencias: Registros con mismo Nº Asiento y Fecha pero diferente Saldo (posibles duplicados con error).")
+
+    return warnings
+
+
+def legacy_remove_exact_duplicates(df, file_label):
+    """remove_exact_duplicates before the single boolean mask."""
+    original_size = len(df)
+    end_mask = df['Nº Asiento'].astype(str).str.upper() == 'END'
+    end_rows = df[end_mask].copy() if end_mask.any() else pd.DataFrame()
+    clean_df = df[~end_mask].copy()
+    df_cleaned = clean_df.drop_duplicates(subset=UNIQUE_IDENTIFIERS, keep='first')
+    if not end_rows.empty:
+        df_cleaned = pd.concat([df_cleaned, end_rows], ignore_index=False)
+        df_cleaned = df_cleaned.sort_index()
+    removed_count = original_size - len(df_cleaned)
+    summary_message = f"[{file_label}] Se eliminaron {removed_count} duplicados exactos automáticamente." if removed_count > 0 else ""
+    return df_cleaned, removed_count, summary_message
+
+
+def make_ledger(rows, seed=42):
+    """A normalized ledger with negatives, blanks, END rows, exact duplicates and Saldo conflicts."""
+    rng = np.random.default_rng(seed)
+    asiento = pd.Series(rng.integers(1, rows // 3 + 2, rows), dtype=object)
+    asiento[rng.random(rows) < 0.001] = None
+    asiento[rng.choice(rows, 3, replace=False)] = 'END'
+    fecha = pd.Series(pd.Timestamp('2024-01-01') + pd.to_timedelta(rng.integers(0, 60, rows), unit='D'))
+    fecha[rng.random(rows) < 0.001] = pd.NaT
+    saldo = np.round(rng.choice([10.0, 20.5, 99.99, 150.0], rows), 2)
+    saldo[rng.random(rows) < 0.001] = np.nan
+    concepto = pd.Series(rng.choice(['Amazon', 'Taxi', 'Nomina', '', ' '], rows, p=[0.4, 0.3, 0.28, 0.01, 0.01]))
+    return pd.DataFrame({
+        'Nº Asiento': asiento,
+        'Fecha': fecha,
+        'Concepto': concepto,
+        'Debe': np.where(rng.random(rows) < 0.01, -1.0, 1.0) * saldo,
+        'Haber': np.where(rng.random(rows) < 0.01, -5.0, 0.0),
+        'Saldo': saldo,
+    })
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200000, help="ledger rows to audit")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per implementation (best is reported)")
+    args = parser.parse_args()
+
+    df = make_ledger(args.rows)
+    legacy_time, expected = timed(lambda: legacy_audit_data_quality(df, "Mayor"), args.repeat)
+    shared_time, result = timed(lambda: audit_data_quality(df, "Mayor"), args.repeat)
+
+    assert result == expected, f"warnings differ:\n{result}\n{expected}"
+    print(f"audit, {args.rows} rows: legacy {legacy_time:.3f}s, shared {shared_time:.3f}s "
+          f"({legacy_time / shared_time:.1f}x faster), identical warnings")
+
+    legacy_time, (expected_df, *expected) = timed(lambda: legacy_remove_exact_duplicates(df, "Mayor"), args.repeat)
+    mask_time, (result_df, *result) = timed(lambda: remove_exact_duplicates(df, "Mayor"), args.repeat)
+
+    pd.testing.assert_frame_equal(result_df, expected_df)
+    assert result == expected, f"results differ: {result} != {expected}"
+    print(f"duplicate removal, {args.rows} rows: concat+sort {legacy_time:.3f}s, mask {mask_time:.3f}s "
+          f"({legacy_time / mask_time:.1f}x faster), identical frames")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark for concept deduplication and the suggestion cache in classify_missing_records.
+
+Usage (from the project root):
+    python -m benchmarks.bench_classifier --rows 20000 --unique 1500
+"""
+import argparse
+import random
+import time
+import numpy as np
+import pandas as pd
+from src.classifier import ConceptIndex, SuggestionCache, classify_missing_records, create_knowledge_base, get_suggestions
+
+WORDS = (
+    "pago factura nomina amazon google aws seguro alquiler oficina luz agua telefono movistar "
+    "vodafone comision banco santander bbva transferencia cuota autonomos hacienda iva irpf "
+    "gasolina repsol taxi uber cabify restaurante comida material papeleria software licencia "
+    "adobe microsoft slack notion hosting dominio asesoria gestoria abogado notario formacion"
+).split()
+CATEGORIES = ["IT", "Admin", "Sales", "Marketing", "Payroll", "Travel", "Taxes", "Bank"]
+
+
+def make_concept(rng):
+    concept = " ".join(rng.sample(WORDS, rng.randint(2, 4)))
+    return f"{concept} {rng.randint(1, 999)}" if rng.random() < 0.5 else concept
+
+
+def make_datasets(rows, unique, history, seed=42):
+    rng = random.Random(seed)
+    historical_df = pd.DataFrame({
+        'Concepto': [make_concept(rng) for _ in range(history)],
+        'Tipo de gasto': [rng.choice(CATEGORIES) for _ in range(history)],
+    })
+    vocabulary = [make_concept(rng) for _ in range(unique)]
+    # Zipf-like repetition: a few recurring suppliers account for most rows
+    weights = 1 / np.arange(1, unique + 1)
+    picks = np.random.default_rng(seed).choice(unique, size=rows, p=weights / weights.sum())
+    new_df = pd.DataFrame({'Concepto': [vocabulary[i] for i in picks]})
+    return new_df, historical_df
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000, help="new movements to classify")
+    parser.add_argument("--unique", type=int, default=1500, help="distinct concepts among the new movements")
+    parser.add_argument("--history", type=int, default=5000, help="rows in the historical InputPL")
+    args = parser.parse_args()
+
+    new_df, historical_df = make_datasets(args.rows, args.unique, args.history)
+    repeated = 1 - new_df['Concepto'].nunique() / len(new_df)
+    print(f"{len(new_df)} rows, {new_df['Concepto'].nunique()} unique concepts ({repeated:.0%} repeated), "
+          f"{len(historical_df)} history rows")
+
+    def per_row():
+        knowledge_base = create_knowledge_base(historical_df)
+        return get_suggestions(new_df['Concepto'], knowledge_base, index=ConceptIndex(knowledge_base))
+
+    row_time, (row_categories, row_scores) = timed(per_row)
+    dedup_time, dedup_df = timed(lambda: classify_missing_records(new_df.copy(), historical_df))
+
+    cache = SuggestionCache()
+    classify_missing_records(new_df.copy(), historical_df, cache=cache)
+    cached_time, cached_df = timed(lambda: classify_missing_records(new_df.copy(), historical_df, cache=cache))
+
+    identical = (list(row_categories) == list(dedup_df['Tipo de gasto'])
+                 and list(row_scores) == list(dedup_df['Confidence'])
+                 and dedup_df['Tipo de gasto'].equals(cached_df['Tipo de gasto']))
+
+    print(f"{'per row':<14}{row_time:>9.3f}s")
+    print(f"{'deduplicated':<14}{dedup_time:>9.3f}s  x{row_time / dedup_time:.1f}")
+    print(f"{'warm cache':<14}{cached_time:>9.3f}s  x{row_time / cached_time:.1f}")
+    print(f"identical results: {identical}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark for the vectorized 'Mes' normalization in normalize_data.
+
+Compares normalize_mes with the previous row-by-row implementation (kept below as
+legacy_normalize_mes) and checks that both produce identical output.
+
+Usage (from the project root):
+    python -m benchmarks.bench_normalize --rows 100000
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from src.loader import normalize_mes
+
+MONTHS = {1: 'ene', 2: 'feb', 3: 'mar', 4: 'abr', 5: 'may', 6: 'jun',
+          7: 'jul', 8: 'ago', 9: 'sep', 10: 'oct', 11: 'nov', 12: 'dic'}
+
+
+def legacy_format_month_year(date_value):
+    if pd.isna(date_value):
+        return None
+    if hasattr(date_value, 'month') and hasattr(date_value, 'year'):
+        return f"{MONTHS[date_value.month]}/{str(date_value.year)[2:]}"
+    return None
+
+
+def legacy_normalize_mes(mes, fecha):
+    """The 'Mes' block of normalize_data before vectorization."""
+    df = pd.DataFrame({'Mes': mes.astype(object), 'Fecha': fecha})
+    temp_mes_date = pd.to_datetime(df['Mes'], errors='coerce')
+    mask_valid_from_mes = temp_mes_date.notna()
+    if mask_valid_from_mes.any():
+        df.loc[mask_valid_from_mes, 'Mes'] = temp_mes_date[mask_valid_from_mes].apply(legacy_format_month_year)
+
+    text = df['Mes'].astype(str).str.strip()
+    mask_needs_fecha_derivation = ~mask_valid_from_mes | df['Mes'].isna() | text.isin(['', 'None', 'nan'])
+    if mask_needs_fecha_derivation.any():
+        formatted_from_fecha = df.loc[mask_needs_fecha_derivation, 'Fecha'].apply(legacy_format_month_year)
+        valid_fecha_mask = formatted_from_fecha.notna()
+        if valid_fecha_mask.any():
+            final_mask = mask_needs_fecha_derivation.copy()
+            final_mask[mask_needs_fecha_derivation] = valid_fecha_mask
+            df.loc[final_mask, 'Mes'] = formatted_from_fecha[valid_fecha_mask].values
+
+    text = df['Mes'].astype(str).str.strip()
+    cleanup_mask = df['Mes'].isna() | text.isin(['None', 'nan'])
+    if cleanup_mask.any():
+        df.loc[cleanup_mask, 'Mes'] = ''
+    return df['Mes']
+
+
+def make_columns(rows, seed=42):
+    """Mes values as they appear in real files: dates, 'ene/25' texts, blanks and junk; Fecha with gaps."""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 6 * 365, rows), unit='D')
+    fecha = pd.Series(dates).where(rng.random(rows) > 0.02)
+    kinds = rng.choice(6, size=rows, p=[0.5, 0.2, 0.1, 0.1, 0.05, 0.05])
+    mes = pd.Series(dates.normalize() - pd.to_timedelta(dates.day - 1, unit='D'), dtype=object)
+    mes[kinds == 1] = 'dic/99'
+    mes[kinds == 2] = None
+    mes[kinds == 3] = ''
+    mes[kinds == 4] = 'None'
+    mes[kinds == 5] = ' nan '
+    return mes, fecha
+
+
+def timed(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="rows to normalize")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per implementation (best is reported)")
+    args = parser.parse_args()
+
+    mes, fecha = make_columns(args.rows)
+    legacy_time, expected = timed(lambda: legacy_normalize_mes(mes, fecha), args.repeat)
+    vectorized_time, result = timed(lambda: normalize_mes(mes, fecha), args.repeat)
+
+    pd.testing.assert_series_equal(result, expected, check_names=False)
+    print(f"{args.rows} rows: legacy {legacy_time:.3f}s, vectorized {vectorized_time:.3f}s "
+          f"({legacy_time / vectorized_time:.1f}x faster), identical output")
+
+
+if __name__ == "__main__":
+    main()
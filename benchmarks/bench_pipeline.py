@@ -0,0 +1,138 @@
+"""
+End-to-end pipeline benchmark on synthetic InputPL/Mayor workbooks, with stored baselines.
+
+For each --rows value a pair of workbooks is generated (benchmarks.synthetic) and every
+pipeline stage is timed with src.profiling.RunProfile: loading, audit, duplicate removal,
+comparison, classification and writing. Timings are compared with benchmarks/baseline.json
+(the best of --repeat runs per stage) and the script exits with status 1 when a stage is
+more than --tolerance times slower than its baseline. --save-baseline stores the run instead.
+
+Usage (from the project root):
+    python -m benchmarks.bench_pipeline --rows 10000 100000
+    python -m benchmarks.bench_pipeline --rows 10000 100000 --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import pandas as pd
+from benchmarks.synthetic import END_PLACEMENTS, write_pair
+from src.classifier import classify_missing_records
+from src.loader import get_prepared_data
+from src.processor import find_missing_records
+from src.profiling import RunProfile, count_rows
+from src.validator import audit_findings, remove_exact_duplicates
+from src.writer import save_to_excel
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Slowdowns below this many seconds are timer noise, whatever the ratio
+MIN_SLOWDOWN_S = 0.05
+
+
+def scenario_key(args, rows):
+    return (f"rows={rows} vocabulary={args.vocabulary} duplicates={args.duplicate_rate} "
+            f"new={args.new_rate} end={args.end_placement} seed={args.seed}")
+
+
+def run_pipeline(input_path, mayor_path):
+    """One run of the pipeline as main.py chains it, always removing duplicates; returns its RunProfile."""
+    profile = RunProfile("bench")
+    with profile.stage("get_prepared_data") as stage:
+        input_df, mayor_df = get_prepared_data(input_path, mayor_path, use_cache=False)
+        stage.rows = count_rows((input_df, mayor_df))
+    with profile.stage("audit_data_quality", rows=len(input_df) + len(mayor_df)):
+        audit_findings(input_df, "InputPL")
+        audit_findings(mayor_df, "Mayor")
+    with profile.stage("remove_exact_duplicates", rows=len(input_df) + len(mayor_df)):
+        input_df, _, _ = remove_exact_duplicates(input_df, "InputPL")
+        mayor_df, _, _ = remove_exact_duplicates(mayor_df, "Mayor")
+    with profile.stage("find_missing_records", rows=len(mayor_df)):
+        new_movements = find_missing_records(input_df, mayor_df)
+    with profile.stage("classify_missing_records", rows=len(new_movements)):
+        classified_df = classify_missing_records(new_movements, input_df)
+    with profile.stage("save_to_excel", rows=len(classified_df)):
+        save_to_excel(classified_df, input_path, input_df=input_df, in_memory=True)
+    return profile
+
+
+def best_of(profiles):
+    """Per stage, the run with the lowest wall time."""
+    frame = pd.concat([profile.to_frame() for profile in profiles], ignore_index=True)
+    return frame.loc[frame.groupby("stage", sort=False)["wall_s"].idxmin()].reset_index(drop=True)
+
+
+def compare(stages, baseline, tolerance):
+    """Print each stage next to its baseline; return the names of the stages that regressed."""
+    regressions = []
+    print(f"  {'Stage':<26}{'Wall s':>8}{'Baseline':>10}{'Ratio':>7}{'Rows':>9}")
+    for stage in stages.itertuples():
+        reference = baseline.get(stage.stage)
+        if reference is None:
+            print(f"  {stage.stage:<26}{stage.wall_s:>8.2f}{'-':>10}{'-':>7}{stage.rows:>9}")
+            continue
+        ratio = stage.wall_s / reference if reference else float('inf')
+        regressed = ratio > tolerance and stage.wall_s - reference > MIN_SLOWDOWN_S
+        flag = "  REGRESSION" if regressed else ""
+        print(f"  {stage.stage:<26}{stage.wall_s:>8.2f}{reference:>10.2f}{ratio:>7.2f}{stage.rows:>9}{flag}")
+        if regressed:
+            regressions.append(stage.stage)
+    return regressions
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000], help="Mayor movements per scenario (10k to 1M)")
+    parser.add_argument("--vocabulary", type=int, default=2000, help="distinct concepts")
+    parser.add_argument("--duplicate-rate", type=float, default=0.01, help="share of exact duplicate rows")
+    parser.add_argument("--new-rate", type=float, default=0.05, help="share of Mayor rows missing from InputPL")
+    parser.add_argument("--end-placement", choices=END_PLACEMENTS, default="notes", help="END markers in InputPL")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per scenario (best per stage is kept)")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    baseline = load_baseline(args.baseline)
+    scenarios = baseline.setdefault("scenarios", {})
+    regressions = []
+    for rows in args.rows:
+        key = scenario_key(args, rows)
+        with tempfile.TemporaryDirectory() as directory:
+            input_path, mayor_path = write_pair(directory, rows, args.vocabulary, args.duplicate_rate,
+                                                args.new_rate, args.end_placement, args.seed)
+            stages = best_of([run_pipeline(input_path, mayor_path) for _ in range(args.repeat)])
+
+        print(f"{key}: {stages['wall_s'].sum():.2f}s")
+        reference = scenarios.get(key, {}).get("stages", {})
+        regressions += [f"{rows} rows: {stage}" for stage in compare(stages, reference, args.tolerance)]
+        if args.save_baseline:
+            scenarios[key] = {"rows": rows, "stages": dict(zip(stages["stage"], stages["wall_s"].round(3)))}
+
+    if args.save_baseline:
+        baseline["environment"] = {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+            "system": platform.system(),
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+    elif regressions:
+        print("Regressions: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
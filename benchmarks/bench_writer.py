@@ -0,0 +1,146 @@
+"""
+Benchmark for writing new classified rows into the InputPL sheet.
+
+Compares the bulk writer (src.writer._write_new_rows) with the previous per-cell
+implementation (kept below as legacy_write_new_rows), and the one-pass row layout
+(src.writer._relayout_rows) with insert_rows/delete_rows (legacy_relayout_rows),
+checking that both produce the same cells.
+
+Usage (from the project root):
+    python -m benchmarks.bench_writer --rows 20000 --history 100000 --stray-ends 50
+"""
+import argparse
+import time
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl.styles import PatternFill
+from src.config import INPUT_PL_COLS
+from src.writer import _relayout_rows, _write_new_rows
+
+
+def legacy_write_new_rows(sheet, classified_df, end_row):
+    """The new-row loop of save_to_excel before the bulk writer."""
+    warning_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
+    for i, (index, row_data) in enumerate(classified_df.iterrows()):
+        current_row = end_row + i
+        for col_idx, col_name in enumerate(INPUT_PL_COLS, start=1):
+            if col_name in row_data:
+                cell_value = row_data[col_name]
+                if col_name == 'Fecha' and hasattr(cell_value, 'to_pydatetime'):
+                    cell_value = cell_value.to_pydatetime()
+                cell = sheet.cell(row=current_row, column=col_idx)
+                if col_name == 'Fecha':
+                    cell.value = cell_value
+                    cell.number_format = 'DD/MM/YYYY'
+                elif col_name == 'Mes':
+                    cell.number_format = '@'
+                    cell.value = str(cell_value) if cell_value else ""
+                elif col_name in ['Debe', 'Haber', 'Saldo', 'Neto']:
+                    cell.value = cell_value
+                    cell.number_format = '#,##0.00'
+                else:
+                    cell.value = cell_value
+                if row_data.get('Confidence', 100) < 80:
+                    cell.fill = warning_fill
+
+
+def legacy_relayout_rows(sheet, end_rows, amount):
+    """The END cleanup and row insertion of save_to_excel before the one-pass layout."""
+    end_row = min(end_rows)
+    for row_to_delete in sorted(end_rows[1:], reverse=True):
+        sheet.delete_rows(row_to_delete)
+    sheet.insert_rows(end_row, amount=amount)
+    sheet.delete_rows(end_row + amount)
+
+
+def make_history_sheet(rows, stray_ends, seed=42):
+    """A styled InputPL sheet with rows movements, END markers spread below the first one and notes."""
+    rng = np.random.default_rng(seed)
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    sheet.append(INPUT_PL_COLS)
+    for i in range(rows):
+        sheet.append([i, f"2025-01-{i % 28 + 1:02d}", f"DOC{i}", "Concepto", 600, 10.5, 0, 10.5])
+        sheet.cell(row=i + 2, column=6).number_format = '#,##0.00'
+    end_rows = [rows + 2] + sorted(rng.choice(np.arange(rows + 3, rows + 3 + 4 * stray_ends), stray_ends, replace=False).tolist())
+    for row in end_rows:
+        sheet.cell(row=row, column=1).value = 'END'
+    for row in range(rows + 3, rows + 3 + 4 * stray_ends):
+        if row not in end_rows:
+            sheet.cell(row=row, column=1).value = f"Nota {row}"
+    return sheet, [int(row) for row in end_rows]
+
+
+def make_classified(rows, seed=42):
+    """Classified movements shaped like the output of classify_missing_records."""
+    rng = np.random.default_rng(seed)
+    amounts = np.round(rng.uniform(1, 5000, rows), 2)
+    dates = pd.Timestamp('2025-01-01') + pd.to_timedelta(rng.integers(0, 365, rows), unit='D')
+    return pd.DataFrame({
+        'Nº Asiento': np.arange(1, rows + 1),
+        'Fecha': dates,
+        'Documento': [f"DOC{i}" for i in range(rows)],
+        'Concepto': rng.choice(['Amazon AWS', 'Google Ads', 'Nomina', 'Taxi'], rows),
+        'Cuenta': rng.integers(600, 700, rows),
+        'Debe': amounts,
+        'Haber': 0.0,
+        'Saldo': amounts,
+        'Nombre cuenta': 'Gastos',
+        'Neto': -amounts,
+        'Mes': dates.strftime('%b/%y').str.lower(),
+        'Tipo de gasto': rng.choice(['IT', 'Marketing', 'Payroll', 'Travel'], rows),
+        'Confidence': rng.choice([100, 90, 75, 0], rows),
+    })
+
+
+def write_with(writer, classified_df):
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    sheet.append(INPUT_PL_COLS)
+    start = time.perf_counter()
+    writer(wb, sheet, classified_df)
+    return time.perf_counter() - start, sheet
+
+
+def cell_signature(sheet):
+    return [(cell.value, cell.number_format, cell.fill.fgColor.rgb if cell.fill.fill_type else None)
+            for row in sheet.iter_rows(min_row=2) for cell in row]
+
+
+def bench_layout(history, stray_ends, amount):
+    timings, signatures = [], []
+    for relayout in (legacy_relayout_rows, _relayout_rows):
+        sheet, end_rows = make_history_sheet(history, stray_ends)
+        start = time.perf_counter()
+        relayout(sheet, end_rows, amount)
+        timings.append(time.perf_counter() - start)
+        # insert_rows/delete_rows also materialize empty cells, which are not saved
+        signatures.append(sorted((cell.row, cell.column, cell.value, cell.number_format)
+                                 for cell in sheet._cells.values() if cell.value is not None or cell.has_style))
+
+    assert signatures[0] == signatures[1], "layouts differ"
+    print(f"{history} history rows, {stray_ends} stray END rows: insert/delete {timings[0]:.2f}s, "
+          f"one pass {timings[1]:.2f}s ({timings[0] / timings[1]:.1f}x faster), identical layout")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000, help="new rows to write")
+    parser.add_argument("--history", type=int, default=100000, help="existing rows above the END marker")
+    parser.add_argument("--stray-ends", type=int, default=50, help="extra END rows below the first one")
+    args = parser.parse_args()
+
+    bench_layout(args.history, args.stray_ends, args.rows)
+
+    classified_df = make_classified(args.rows)
+    legacy_time, legacy_sheet = write_with(lambda wb, sheet, df: legacy_write_new_rows(sheet, df, 2), classified_df)
+    bulk_time, bulk_sheet = write_with(lambda wb, sheet, df: _write_new_rows(wb, sheet, df, 2), classified_df)
+
+    assert cell_signature(bulk_sheet) == cell_signature(legacy_sheet), "outputs differ"
+    print(f"{args.rows} rows: per-cell {legacy_time:.2f}s, bulk {bulk_time:.2f}s "
+          f"({legacy_time / bulk_time:.1f}x faster), identical cells")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Synthetic InputPL/Mayor generator for the benchmarks.
+
+make_pair builds a Mayor ledger and the InputPL that already holds all but its newest
+movements; write_workbook saves either one as an Excel file shaped like the real ones,
+with the END marker placed as requested.
+
+Usage (from the project root), to write a pair of workbooks for manual runs:
+    python -m benchmarks.synthetic --rows 100000 --out data/raw/synthetic --end-placement notes
+"""
+import argparse
+import os
+import random
+import numpy as np
+import openpyxl
+import pandas as pd
+from benchmarks.bench_classifier import CATEGORIES, make_concept
+from src.config import INPUT_PL_COLS
+
+END_PLACEMENTS = ("none", "bottom", "notes", "stray")
+
+
+def make_vocabulary(size, seed=42):
+    """size distinct supplier concepts, each with the expense category it is booked under."""
+    rng = random.Random(seed)
+    concepts = set()
+    while len(concepts) < size:
+        concepts.add(make_concept(rng))
+    concepts = sorted(concepts)
+    categories = np.random.default_rng(seed).choice(CATEGORIES, size)
+    return np.array(concepts, dtype=object), categories.astype(object)
+
+
+def make_ledger(rows, vocabulary=2000, duplicate_rate=0.01, seed=42):
+    """
+    rows accounting movements in date order, with Zipf-distributed concepts from a vocabulary
+    of the given size and about duplicate_rate of them repeated as exact duplicates.
+    """
+    rng = np.random.default_rng(seed)
+    concepts, categories = make_vocabulary(vocabulary, seed)
+    weights = 1 / np.arange(1, vocabulary + 1)
+    picks = rng.choice(vocabulary, size=rows, p=weights / weights.sum())
+
+    dates = pd.Timestamp('2024-01-01') + pd.to_timedelta(np.sort(rng.integers(0, 730, rows)), unit='D')
+    amounts = np.round(rng.uniform(1, 5000, rows), 2)
+    refunds = rng.random(rows) < 0.1
+    debe = np.where(refunds, 0.0, amounts)
+    haber = np.where(refunds, amounts, 0.0)
+    cuenta = rng.integers(600, 700, rows)
+    df = pd.DataFrame({
+        'Nº Asiento': np.arange(1, rows + 1),
+        'Fecha': dates,
+        'Documento': [f"FAC-{i:07d}" for i in range(rows)],
+        'Concepto': concepts[picks],
+        'Cuenta': cuenta,
+        'Debe': debe,
+        'Haber': haber,
+        'Saldo': debe - haber,
+        'Nombre cuenta': [f"Gastos {c}" for c in cuenta],
+        'Neto': haber - debe,
+        # Month cells hold the first day of the month, as Excel date cells
+        'Mes': dates.to_period('M').to_timestamp(),
+        'Tipo de gasto': categories[picks],
+    })
+
+    duplicates = int(rows * duplicate_rate)
+    if duplicates:
+        # Replace random rows by copies of the row before them, keeping the date order
+        targets = np.sort(rng.choice(np.arange(1, rows), size=min(duplicates, rows - 1), replace=False))
+        df.iloc[targets] = df.iloc[targets - 1].to_numpy()
+    return df
+
+
+def make_pair(rows, vocabulary=2000, duplicate_rate=0.01, new_rate=0.05, seed=42):
+    """
+    (input_df, mayor_df): the Mayor has rows movements; the InputPL holds all but the newest
+    new_rate of them, already classified. The Mayor carries no classification.
+    """
+    mayor_df = make_ledger(rows, vocabulary, duplicate_rate, seed)
+    input_df = mayor_df.iloc[:rows - int(rows * new_rate)].copy()
+    mayor_df['Tipo de gasto'] = None
+    return input_df, mayor_df
+
+
+def write_workbook(path, df, end_placement="bottom", notes=3):
+    """
+    Write df in the INPUT_PL_COLS layout with openpyxl's write-only mode. end_placement is
+    one of END_PLACEMENTS: no END row, END after the data, END followed by note rows, or
+    END followed by notes with further stray END rows among them.
+    """
+    if end_placement not in END_PLACEMENTS:
+        raise ValueError(f"end_placement must be one of {END_PLACEMENTS}")
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet()
+    sheet.append(INPUT_PL_COLS)
+
+    columns = [col for col in INPUT_PL_COLS if col != 'END']
+    values = [
+        df[col].dt.to_pydatetime().tolist() if pd.api.types.is_datetime64_any_dtype(df[col])
+        else df[col].astype(object).where(df[col].notna(), None).tolist()
+        for col in columns
+    ]
+    for row in zip(*values):
+        sheet.append(row)
+
+    if end_placement != "none":
+        sheet.append(['END'])
+    if end_placement in ("notes", "stray"):
+        for i in range(notes):
+            sheet.append([None, None, None, f"Nota {i + 1}"])
+            if end_placement == "stray":
+                sheet.append(['END'])
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    wb.save(path)
+    return path
+
+
+def write_pair(directory, rows, vocabulary=2000, duplicate_rate=0.01, new_rate=0.05,
+               end_placement="bottom", seed=42):
+    """Write InputPL.xlsx and Mayor.xlsx for make_pair into directory and return their paths."""
+    input_df, mayor_df = make_pair(rows, vocabulary, duplicate_rate, new_rate, seed)
+    input_path = write_workbook(os.path.join(directory, "InputPL.xlsx"), input_df, end_placement)
+    mayor_path = write_workbook(os.path.join(directory, "Mayor.xlsx"), mayor_df, "bottom")
+    return input_path, mayor_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000, help="Mayor movements (10k to 1M)")
+    parser.add_argument("--vocabulary", type=int, default=2000, help="distinct concepts")
+    parser.add_argument("--duplicate-rate", type=float, default=0.01, help="share of exact duplicate rows")
+    parser.add_argument("--new-rate", type=float, default=0.05, help="share of Mayor rows missing from InputPL")
+    parser.add_argument("--end-placement", choices=END_PLACEMENTS, default="bottom", help="END markers in InputPL")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="data/raw/synthetic", help="output directory")
+    args = parser.parse_args()
+
+    paths = write_pair(args.out, args.rows, args.vocabulary, args.duplicate_rate, args.new_rate,
+                       args.end_placement, args.seed)
+    print("Wrote " + " and ".join(paths))
+
+
+if __name__ == "__main__":
+    main()
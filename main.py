@@ -1,69 +1,119 @@
-from src.loader import get_prepared_data
-from src.processor import find_missing_records
-from src.classifier import classify_missing_records
-from src.writer import save_to_excel
-from src.config import INPUT_PL_FILE
+import argparse
+import os
+import sys
+from src.batch import discover_jobs, read_manifest, run_batch, save_summary
+from src.pipeline import run_reconciliation, DUPLICATE_POLICIES
+from src.config import (
+    INPUT_PL_FILE, MAYOR_FILE, OUTPUT_FILE, SALDO_TOLERANCE_CENTS, INCREMENTAL_RECONCILIATION, STREAMING_WRITE
+)
 from src.logger import setup_logger
+from src.profiling import RunProfile
 
 logger = setup_logger("StartupCFO", use_rich=True)
 
-def main():
-    logger.info("=" * 50)
-    logger.info("StartupCFO Tool - Accounting Reconciliation")
-    logger.info("=" * 50)
+BATCH_OUTPUT_DIR = "data/output/batch"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="StartupCFO Tool - Accounting Reconciliation")
+    parser.add_argument("--input", default=INPUT_PL_FILE, help="InputPL workbook (single company)")
+    parser.add_argument("--mayor", default=MAYOR_FILE, help="Mayor workbook (single company)")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="updated InputPL to write (single company)")
+    batch = parser.add_mutually_exclusive_group()
+    batch.add_argument("--batch", metavar="DIR", help="directory with one subdirectory per company")
+    batch.add_argument("--manifest", metavar="CSV", help="CSV with columns company, input_pl, mayor[, output]")
+    parser.add_argument("--output-dir", default=BATCH_OUTPUT_DIR, help="batch outputs, one subdirectory per company")
+    parser.add_argument("--workers", type=int, default=None, help="batch worker processes (default: CPU count)")
+    parser.add_argument("--summary", default=None, help="batch summary CSV (default: <output-dir>/summary.csv)")
+    parser.add_argument("--duplicates", choices=DUPLICATE_POLICIES, default=None,
+                        help="exact duplicates: ask (default on a terminal), remove, or keep (default otherwise)")
+    parser.add_argument("--tolerance-cents", type=int, default=SALDO_TOLERANCE_CENTS, help="Saldo tolerance in cents")
+    incremental = parser.add_mutually_exclusive_group()
+    incremental.add_argument("--incremental", dest="incremental", action="store_true", default=INCREMENTAL_RECONCILIATION,
+                             help="reuse the reconciled keys saved with the InputPL")
+    incremental.add_argument("--full", dest="incremental", action="store_false", help="always compare every row")
+    parser.add_argument("--streaming-write", action="store_true", default=STREAMING_WRITE, help="stream the output workbook")
+    args = parser.parse_args(argv)
 
+    is_batch = args.batch or args.manifest
+    if args.duplicates is None:
+        args.duplicates = "ask" if sys.stdin.isatty() and not is_batch else "keep"
+    if args.duplicates == "ask" and is_batch:
+        parser.error("--duplicates ask is not available in batch mode; use remove or keep")
+    return args
+
+def ask_remove_duplicates():
+    logger.info("Se han detectado duplicados exactos en los datos.")
+    response = input("¿Desea eliminar duplicados exactos automáticamente? (s/n): ").strip().lower()
+    return response in ('s', 'y', 'yes', 'si')
+
+def run_single(args, policies):
+    profile = RunProfile("cli")
     try:
-        input_df, mayor_df = get_prepared_data()
+        run_reconciliation(args.input, args.mayor, args.output, duplicates=args.duplicates,
+                           confirm=ask_remove_duplicates, profile=profile, **policies)
+        status = 0
     except ValueError as e:
         logger.error(f"{e}")
-        return
-
-    if input_df is not None and mayor_df is not None:
-        from src.validator import audit_data_quality
-        all_warnings = audit_data_quality(input_df, "InputPL") + audit_data_quality(mayor_df, "Mayor")
-        if all_warnings:
-            logger.warning("\nSe han detectado problemas de calidad en los datos:")
-            for warning in all_warnings:
-                logger.warning(f"  {warning}")
-            logger.info("")
+        status = 1
 
-        has_duplicates = any("duplicados exactos" in warning.lower() for warning in all_warnings)
-        if has_duplicates:
-            logger.info("\nSe han detectado duplicados exactos en los datos.")
-            response = input("¿Desea eliminar duplicados exactos automáticamente? (s/n): ").strip().lower()
-            
-            if response == 's' or response == 'y' or response == 'yes' or response == 'si':
-                from src.validator import remove_exact_duplicates
+    if profile.stages:
+        logger.info("Pipeline timings:")
+        for line in profile.format_table().splitlines():
+            logger.info(f"  {line}")
+        report_path = profile.save()
+        if report_path:
+            logger.info(f"Run report saved to: {report_path}")
+    return status
 
-                input_df, removed_input, msg_input = remove_exact_duplicates(input_df, "InputPL")
-                if msg_input:
-                    logger.info(f"  {msg_input}")
+def run_companies(args, policies):
+    try:
+        jobs = read_manifest(args.manifest, args.output_dir) if args.manifest else discover_jobs(args.batch, args.output_dir)
+    except (OSError, ValueError) as e:
+        logger.error(f"{e}")
+        return 1
+    if not jobs:
+        logger.error("No companies found to reconcile.")
+        return 1
 
-                mayor_df, removed_mayor, msg_mayor = remove_exact_duplicates(mayor_df, "Mayor")
-                if msg_mayor:
-                    logger.info(f"  {msg_mayor}")
-                
-                total_removed = removed_input + removed_mayor
-                if total_removed > 0:
-                    logger.success(f"Se eliminaron {total_removed} duplicados en total. Continuando con datos limpios...\n")
-            else:
-                logger.info("Continuando sin eliminar duplicados...\n")
+    results = run_batch(jobs, workers=args.workers, duplicates=args.duplicates, **policies)
 
-        new_movements = find_missing_records(input_df, mayor_df)
+    logger.info("Batch summary:")
+    logger.info(f"  {'Company':<18}{'Status':<11}{'New':>6}{'Dups':>6}{'Low':>5}{'Secs':>7}")
+    for result in results:
+        logger.info(
+            f"  {result['company'][:17]:<18}{result['status']:<11}{result.get('new_rows', 0):>6}"
+            f"{result.get('duplicates_removed', 0):>6}{result.get('low_confidence', 0):>5}{result.get('seconds', 0):>7.1f}"
+        )
+    failed = [result for result in results if result["status"] == "error"]
+    for result in failed:
+        logger.error(f"  {result['company']}: {result['error']}")
 
-        if new_movements is not None and len(new_movements) > 0:
+    summary_path = save_summary(results, args.summary or os.path.join(args.output_dir, "summary.csv"))
+    logger.info(f"Batch summary saved to: {summary_path}")
+    if failed:
+        logger.warning(f"{len(failed)} of {len(results)} companies failed.")
+    else:
+        logger.success(f"{len(results)} companies reconciled.")
+    return 1 if failed else 0
 
-            classified_df = classify_missing_records(new_movements, input_df)
+def main(argv=None):
+    args = parse_args(argv)
+    logger.info("=" * 50)
+    logger.info("StartupCFO Tool - Accounting Reconciliation")
+    logger.info("=" * 50)
 
-            save_to_excel(classified_df, INPUT_PL_FILE)
-            
-        else:
-            logger.info("No new records found to add. Everything is up to date!")
-            
+    policies = {
+        "tolerance_cents": args.tolerance_cents,
+        "incremental": args.incremental,
+        "streaming_write": args.streaming_write,
+    }
+    if args.batch or args.manifest:
+        status = run_companies(args, policies)
     else:
-        logger.error("Flow stopped because of missing or corrupt files.")
+        status = run_single(args, policies)
 
     logger.info("=" * 50)
+    return status
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from src.config import BACKGROUND_WORKERS
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Shared by every session of the web app, so a few long runs cannot start unbounded threads
+_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="pipeline")
+
+class ProgressState:
+    """
+    Latest progress of a run over a known list of stages. It is a RunProfile listener, called
+    from the worker thread, and snapshot() is read from the UI thread.
+    """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self._lock = threading.Lock()
+        self._stage = None
+        self._fraction = 0.0
+        self._rows = None
+
+    def __call__(self, stage, fraction, done=None, total=None):
+        with self._lock:
+            self._stage = stage
+            self._fraction = fraction
+            self._rows = (done, total) if total else None
+
+    def snapshot(self):
+        """
+        Dict with the current stage, its fraction, (done, total) rows when reported, and the
+        overall fraction, each stage weighing the same.
+        """
+        with self._lock:
+            stage, fraction, rows = self._stage, self._fraction, self._rows
+        position = self.stages.index(stage) if stage in self.stages else 0
+        overall = (position + fraction) / len(self.stages) if self.stages else fraction
+        return {"stage": stage, "fraction": fraction, "rows": rows, "overall": min(overall, 1.0)}
+
+class BackgroundRun:
+    """
+    Run func(*args, listener=progress, **kwargs) in the shared worker pool. The caller polls
+    done() and snapshot(), and gets the return value (or exception) from result().
+    """
+
+    def __init__(self, func, stages, *args, **kwargs):
+        self.progress = ProgressState(stages)
+        self.future = _executor.submit(func, *args, listener=self.progress, **kwargs)
+
+    def done(self):
+        return self.future.done()
+
+    def snapshot(self):
+        return self.progress.snapshot()
+
+    def result(self):
+        return self.future.result()
@@ -0,0 +1,153 @@
+import csv
+import fnmatch
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from src.config import OUTPUT_FILE
+from src.logger import get_logger
+from src.pipeline import run_reconciliation
+
+logger = get_logger(__name__)
+
+# File names looked up in each company directory (case-insensitive)
+INPUT_PL_PATTERN = "inputpl*.xlsx"
+MAYOR_PATTERN = "mayor*.xlsx"
+MANIFEST_COLUMNS = ("company", "input_pl", "mayor")
+# Directory, next to each company's output, holding that company's on-disk caches
+COMPANY_CACHE_DIR = "cache"
+
+COUNT_COLUMNS = [
+    "input_rows", "mayor_rows", "findings", "duplicates_removed", "tolerance_matches", "new_rows", "low_confidence",
+]
+SUMMARY_COLUMNS = [
+    "company", "status", "input_rows", "mayor_rows", "findings", "duplicates_removed",
+    "tolerance_matches", "new_rows", "low_confidence", "seconds", "output", "error",
+]
+
+class CompanyJob:
+    """One company to reconcile: its InputPL, Mayor and output paths, or why it cannot run."""
+
+    def __init__(self, company, input_path, mayor_path, output_path, error=None):
+        self.company = company
+        self.input_path = input_path
+        self.mayor_path = mayor_path
+        self.output_path = output_path
+        self.error = error
+
+    def __repr__(self):
+        return f"CompanyJob({self.company!r}, {self.input_path!r}, {self.mayor_path!r})"
+
+def _output_path(output_dir, company):
+    return os.path.join(output_dir, company, os.path.basename(OUTPUT_FILE))
+
+def company_cache_dir(job):
+    """The cache directory of one company, so companies never evict each other's cache entries."""
+    return os.path.join(os.path.dirname(job.output_path), COMPANY_CACHE_DIR)
+
+def _match_one(directory, names, pattern):
+    matches = [name for name in names if fnmatch.fnmatch(name.lower(), pattern) and not name.startswith("~$")]
+    return os.path.join(directory, matches[0]) if len(matches) == 1 else None
+
+def discover_jobs(directory, output_dir):
+    """
+    One job per subdirectory of directory (named after the company) holding exactly one
+    InputPL*.xlsx and one Mayor*.xlsx. Subdirectories without them become failed jobs,
+    so they show up in the summary instead of being skipped silently.
+    """
+    if not os.path.isdir(directory):
+        raise ValueError(f"No se encontró el directorio de empresas: {directory}")
+    jobs = []
+    for company in sorted(os.listdir(directory)):
+        company_dir = os.path.join(directory, company)
+        if not os.path.isdir(company_dir):
+            continue
+        names = os.listdir(company_dir)
+        input_path = _match_one(company_dir, names, INPUT_PL_PATTERN)
+        mayor_path = _match_one(company_dir, names, MAYOR_PATTERN)
+        error = None
+        if input_path is None or mayor_path is None:
+            error = "Se necesita exactamente un archivo InputPL*.xlsx y un Mayor*.xlsx en el directorio de la empresa."
+        jobs.append(CompanyJob(company, input_path, mayor_path, _output_path(output_dir, company), error))
+    return jobs
+
+def read_manifest(path, output_dir):
+    """
+    Jobs from a CSV manifest with the columns company, input_pl, mayor and optionally output.
+    Relative paths in the manifest are resolved against its directory; without an output
+    column the output goes to output_dir/<company>/.
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = [col for col in MANIFEST_COLUMNS if col not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"Faltan columnas en el manifiesto {path}: {missing}")
+        rows = list(reader)
+
+    jobs = []
+    for row in rows:
+        company = row["company"].strip()
+        output = (row.get("output") or "").strip()
+        jobs.append(CompanyJob(
+            company,
+            os.path.join(base_dir, row["input_pl"].strip()),
+            os.path.join(base_dir, row["mayor"].strip()),
+            os.path.join(base_dir, output) if output else _output_path(output_dir, company),
+        ))
+    return jobs
+
+def run_company(job, **policies):
+    """
+    Reconcile one company (see run_reconciliation for policies) and return its summary row.
+    Unless policies set cache_dir, the company's caches go to company_cache_dir(job).
+    Failures are reported in the row, never raised, so one company cannot stop the batch.
+    """
+    start = time.perf_counter()
+    result = {"company": job.company, "status": "error", "error": job.error}
+    missing = [path for path in (job.input_path, job.mayor_path) if path and not os.path.exists(path)]
+    if job.error is None and missing:
+        result["error"] = f"No se encontró el archivo: {missing[0]}"
+    elif job.error is None:
+        try:
+            result.update(run_reconciliation(
+                job.input_path, job.mayor_path, job.output_path, **{"cache_dir": company_cache_dir(job), **policies}
+            ))
+        except Exception as e:
+            logger.error(f"[{job.company}] {e}")
+            result["error"] = str(e).strip()
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    return result
+
+def run_batch(jobs, workers=None, **policies):
+    """
+    Reconcile every job, in a pool of worker processes when workers > 1, and return the
+    summary rows in job order. Loads inside a worker are not parallelized again.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [run_company(job, **policies) for job in jobs]
+
+    policies.setdefault("parallel_load", False)
+    logger.info(f"Reconciling {len(jobs)} companies with {workers} worker processes...")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_company, job, **policies) for job in jobs]
+        for job, future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                logger.error(f"[{job.company}] {e}")
+                results.append({"company": job.company, "status": "error", "error": str(e) or type(e).__name__})
+    return results
+
+def summary_frame(results):
+    """The summary rows as a DataFrame with one row per company (counts are empty for failed companies)."""
+    return pd.DataFrame(results, columns=SUMMARY_COLUMNS).astype({col: "Int64" for col in COUNT_COLUMNS})
+
+def save_summary(results, path):
+    """Write the batch summary as CSV and return its path."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    summary_frame(results).to_csv(path, index=False)
+    return path
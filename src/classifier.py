@@ -1,57 +1,490 @@
+import hashlib
+from collections import OrderedDict
+from collections.abc import Mapping
+import numpy as np
 import pandas as pd
-from thefuzz import process, fuzz
+from rapidfuzz import process as rf_process, fuzz as rf_fuzz
+from thefuzz import process, fuzz, utils
 from src.logger import get_logger
 
 logger = get_logger(__name__)
 
-def create_knowledge_base(historical_df):
+NEEDS_REVIEW = "NEW - NEEDS REVIEW"
+NGRAM_SIZE = 3
+CANDIDATE_LIMIT = 100
+MAX_MATRIX_CELLS = 2_000_000
+SUGGESTION_CACHE_SIZE = 50_000
+# Unique concepts scored between two progress reports of classify_missing_records
+PROGRESS_CONCEPTS = 500
+
+def _concept_ngrams(concept, ngram_size=NGRAM_SIZE):
+    """
+    Return the set of padded character n-grams of a concept.
+    Each token is padded with spaces so that short tokens ('sl', 'sa') still produce n-grams.
+    """
+    grams = set()
+    for token in utils.full_process(str(concept), force_ascii=True).split():
+        padded = f" {token} "
+        for i in range(max(len(padded) - ngram_size + 1, 1)):
+            grams.add(padded[i:i + ngram_size])
+    return grams
+
+def _process_query(concept):
     """
-    Create a mapping dictionary between Concept and Expense Type based on historical data.
+    Preprocess a new concept the way thefuzz's extractOne preprocesses the query:
+    its default processor first, then the scorer's own ASCII processing.
     """
-   
-    clean_history = historical_df.dropna(subset=['Concepto', 'Tipo de gasto'])
-    
-    mapping = dict(zip(clean_history['Concepto'], clean_history['Tipo de gasto']))
-    
-    return mapping
+    return utils.full_process(utils.full_process(str(concept)), force_ascii=True)
+
+def _process_choices(concepts):
+    """Preprocess known concepts the way thefuzz's token_set_ratio preprocesses the choices."""
+    return [utils.full_process(concept, force_ascii=True) for concept in concepts]
+
+class KnowledgeBase(Mapping):
+    """
+    Frequency-weighted knowledge base learned from the historical InputPL.
+
+    `stats` holds one row per (Concepto, Tipo de gasto) pair with the number of
+    historical rows that used it ('count') and the position of the most recent one
+    ('last_seen'). As a mapping, each concept returns its majority category, ties
+    going to the most recently used one, and `agreement` holds the share of the
+    concept's rows that used that category. Concepts keep the order in which they
+    first appear in the history.
+    """
+
+    STATS_COLUMNS = ['Concepto', 'Tipo de gasto', 'count', 'last_seen']
+
+    def __init__(self, stats):
+        self.stats = stats[self.STATS_COLUMNS].reset_index(drop=True)
+
+        concept_codes, concepts = pd.factorize(self.stats['Concepto'])
+        counts = self.stats['count'].to_numpy(dtype=np.int64)
+        last_seen = self.stats['last_seen'].to_numpy(dtype=np.int64)
+
+        # Majority category per concept in a single linear pass: rank each pair by
+        # (count, last_seen), which is unique within a concept
+        rank = counts * (int(last_seen.max(initial=0)) + 1) + last_seen
+        best_rank = np.full(len(concepts), -1, dtype=np.int64)
+        np.maximum.at(best_rank, concept_codes, rank)
+        is_best = rank == best_rank[concept_codes]
+        best_rows = np.empty(len(concepts), dtype=np.int64)
+        best_rows[concept_codes[is_best]] = np.flatnonzero(is_best)
+
+        self.concepts = list(concepts)
+        self.categories = self.stats['Tipo de gasto'].to_numpy(dtype=object)[best_rows]
+        self.agreement = counts[best_rows] / np.bincount(concept_codes, weights=counts, minlength=len(concepts))
+        self._positions = dict(zip(self.concepts, range(len(self.concepts))))
+
+    def __getitem__(self, concept):
+        return self.categories[self._positions[concept]]
+
+    def __iter__(self):
+        return iter(self.concepts)
+
+    def __len__(self):
+        return len(self.concepts)
+
+    def __contains__(self, concept):
+        return concept in self._positions
+
+    def agreement_of(self, concept):
+        """Return the share of the concept's historical rows labelled with its majority category."""
+        return float(self.agreement[self._positions[concept]])
+
+    def merge(self, other):
+        """Return a new KnowledgeBase with the counts of both, e.g. to add newly confirmed rows."""
+        stats = pd.concat([self.stats, other.stats], ignore_index=True)
+        return KnowledgeBase(_aggregate_stats(stats, count=('count', 'sum')))
+
+def _aggregate_stats(table, count):
+    """Group a table by (Concepto, Tipo de gasto) in order of first appearance."""
+    return table.groupby(['Concepto', 'Tipo de gasto'], sort=False).agg(
+        count=count, last_seen=('last_seen', 'max')
+    ).reset_index()
 
-def get_suggestion(concept, mapping, threshold=70):
+def _knowledge_arrays(mapping):
+    """
+    Return (concepts, categories, agreement) aligned arrays for a KnowledgeBase or a plain dict.
+    A plain dict has one label per concept, i.e. full agreement.
+    """
+    if isinstance(mapping, KnowledgeBase):
+        return mapping.concepts, mapping.categories, mapping.agreement
+    return list(mapping.keys()), np.array(list(mapping.values()), dtype=object), np.ones(len(mapping))
+
+def _agreement(mapping, concept):
+    return mapping.agreement_of(concept) if isinstance(mapping, KnowledgeBase) else 1.0
+
+class ConceptIndex:
+    """
+    Character n-gram inverted index over the concepts of a knowledge base.
+
+    Instead of scoring a new concept against every known concept, only the
+    concepts that share the most n-grams with it (up to `candidate_limit`) are
+    scored with token_set_ratio.
+
+    Tolerance compared to a full linear scan: the result is identical whenever the
+    best known concept is among the candidates, which is always the case when it
+    shares a token with the new concept and the candidate set is not truncated.
+    When it is truncated, the suggestion may come from a slightly lower scoring
+    concept (on a synthetic 20k-concept history, over 99% of the suggestions were
+    identical). Concepts that share no n-gram at all are never scored, so for them
+    the suggestion is "NEW - NEEDS REVIEW" with confidence 0 instead of a low score.
+    """
+
+    def __init__(self, mapping, ngram_size=NGRAM_SIZE, candidate_limit=CANDIDATE_LIMIT, base=None):
+        """
+        With base, an index over a prefix of the concepts of mapping (e.g. before new history
+        rows were merged into the knowledge base), only the concepts after that prefix are indexed.
+        """
+        self.mapping = mapping
+        self.ngram_size = ngram_size
+        self.candidate_limit = candidate_limit
+        self.concepts, self.categories, self.agreement = _knowledge_arrays(mapping)
+        if base is not None and (base.ngram_size != ngram_size or base.concepts != self.concepts[:len(base)]):
+            base = None
+        start = len(base) if base is not None else 0
+
+        postings = {}
+        gram_counts = np.zeros(len(self.concepts) - start, dtype=np.int32)
+        for offset, concept in enumerate(self.concepts[start:]):
+            grams = _concept_ngrams(concept, ngram_size)
+            gram_counts[offset] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(start + offset)
+        postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+        choices = np.array(_process_choices(self.concepts[start:]), dtype=object)
+
+        if base is None:
+            self.choices, self._gram_counts, self._postings = choices, gram_counts, postings
+        else:
+            self.choices = np.concatenate([base.choices, choices])
+            self._gram_counts = np.concatenate([base._gram_counts, gram_counts])
+            self._postings = dict(base._postings)
+            for gram, ids in postings.items():
+                self._postings[gram] = np.concatenate([self._postings[gram], ids]) if gram in self._postings else ids
+
+    def __len__(self):
+        return len(self.concepts)
+
+    def to_arrays(self):
+        """
+        Return the index structures as plain numpy arrays (no Python objects), e.g. to persist
+        them with np.savez. Choices are newline-joined UTF-8: preprocessing leaves no newlines.
+        """
+        grams = list(self._postings)
+        ids = [self._postings[gram] for gram in grams]
+        return {
+            "ngram_size": np.int64(self.ngram_size),
+            "choices": np.frombuffer("\n".join(self.choices).encode("utf-8"), dtype=np.uint8),
+            "gram_counts": self._gram_counts,
+            "grams": np.array(grams, dtype=str),
+            "offsets": np.cumsum([0] + [len(posting) for posting in ids], dtype=np.int64),
+            "ids": np.concatenate(ids) if ids else np.empty(0, dtype=np.int32),
+        }
+
+    @classmethod
+    def from_arrays(cls, mapping, arrays, candidate_limit=CANDIDATE_LIMIT):
+        """
+        Rebuild the index over mapping saved by to_arrays, without preprocessing or
+        tokenizing its concepts again. Raises ValueError if the arrays do not fit mapping.
+        """
+        index = cls.__new__(cls)
+        index.mapping = mapping
+        index.ngram_size = int(arrays["ngram_size"])
+        index.candidate_limit = candidate_limit
+        index.concepts, index.categories, index.agreement = _knowledge_arrays(mapping)
+        text = arrays["choices"].tobytes().decode("utf-8")
+        index.choices = np.array(text.split("\n") if len(index.concepts) else [], dtype=object)
+        index._gram_counts = arrays["gram_counts"]
+        if len(index.choices) != len(index.concepts) or len(index._gram_counts) != len(index.concepts):
+            raise ValueError("index does not match the knowledge base")
+        ids, offsets = arrays["ids"], arrays["offsets"]
+        index._postings = {
+            gram: ids[begin:end] for gram, begin, end in zip(arrays["grams"].tolist(), offsets[:-1], offsets[1:])
+        }
+        return index
+
+    def candidates(self, concept):
+        """
+        Return the known concepts sharing n-grams with `concept`, in knowledge base order.
+        """
+        return [self.concepts[i] for i in self.candidate_ids(concept)]
+
+    def candidate_ids(self, concept):
+        """
+        Return the positions of the candidate concepts for `concept`, in knowledge base order.
+        When there are more than `candidate_limit`, keep those with the highest containment
+        (shared n-grams over the n-grams of the shorter concept), which mirrors how
+        token_set_ratio rewards a concept whose tokens are a subset of the other.
+        """
+        return self.candidate_pairs([concept])[1]
+
+    def candidate_pairs(self, concepts):
+        """
+        Return the candidates of many concepts at once as two aligned arrays (position of the
+        concept in `concepts`, position of the candidate in the knowledge base), sorted by both.
+        Overlaps and the `candidate_limit` cut are computed only over the known concepts found
+        in the posting lists of each concept, never over the whole knowledge base.
+        """
+        query_ids, concept_ids = [], []
+        for i, concept in enumerate(concepts):
+            query_grams = _concept_ngrams(concept, self.ngram_size)
+            hits = [self._postings[gram] for gram in query_grams if gram in self._postings]
+            if not hits:
+                continue
+            ids, overlap = np.unique(np.concatenate(hits), return_counts=True)
+
+            if self.candidate_limit and len(ids) > self.candidate_limit:
+                containment = overlap / np.minimum(self._gram_counts[ids], len(query_grams))
+                # Keep every concept above the candidate_limit-th best containment and, among those
+                # equal to it, the earliest ones, as extractOne does on equal scores
+                nth_best = np.argpartition(-containment, self.candidate_limit - 1)[self.candidate_limit - 1]
+                threshold = containment[nth_best]
+                above = containment > threshold
+                tied = containment == threshold
+                ids = ids[above | (tied & (np.cumsum(tied) <= self.candidate_limit - above.sum()))]
+
+            query_ids.append(np.full(len(ids), i, dtype=np.int64))
+            concept_ids.append(ids.astype(np.int64))
+
+        if not query_ids:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(query_ids), np.concatenate(concept_ids)
+
+class SuggestionCache:
+    """
+    Bounded LRU memo of normalized concept -> (category, confidence).
+
+    Suggestions are only valid for the knowledge base they were computed from, so the
+    cache is bound to a knowledge base fingerprint and cleared when it changes. It is
+    meant to live across runs, e.g. in the Streamlit session state.
+    """
+
+    def __init__(self, maxsize=SUGGESTION_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def bind(self, fingerprint):
+        """Clear the cache if it was filled with a different knowledge base."""
+        if fingerprint != self.fingerprint:
+            self._entries.clear()
+            self.fingerprint = fingerprint
+
+    def get(self, concept):
+        """Return the cached (category, confidence) for a concept, or None."""
+        entry = self._entries.get(concept)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(concept)
+        self.hits += 1
+        return entry
+
+    def put(self, concept, suggestion):
+        """Store a suggestion, evicting the least recently used entries beyond maxsize."""
+        self._entries[concept] = suggestion
+        self._entries.move_to_end(concept)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+def knowledge_base_fingerprint(mapping, threshold=70):
+    """
+    Return a hash identifying a knowledge base (and threshold) for SuggestionCache.
+    """
+    if not mapping:
+        return f"empty:{threshold}"
+    concepts, categories, agreement = _knowledge_arrays(mapping)
+    table = pd.DataFrame({
+        'concept': pd.Series(concepts, dtype=object).map(str),
+        'category': pd.Series(categories, dtype=object).map(str),
+        'agreement': agreement,
+    })
+    hashes = pd.util.hash_pandas_object(table, index=False).to_numpy()
+    return f"{hashlib.sha1(hashes.tobytes()).hexdigest()}:{threshold}"
+
+def normalize_concepts(concepts):
+    """
+    Normalize concepts before classification: text with collapsed and trimmed whitespace.
+    Rows whose concepts only differ in spacing share the same suggestion.
+    """
+    return concepts.map(str).str.split().str.join(' ')
+
+def create_knowledge_base(historical_df, row_offset=0):
+    """
+    Create a frequency-weighted KnowledgeBase between Concept and Expense Type based on historical data.
+    Category counts and recency are computed in one groupby pass; `row_offset` is the
+    position of the first row of historical_df in the full history.
+    """
+
+    history = historical_df[['Concepto', 'Tipo de gasto']].assign(
+        last_seen=np.arange(row_offset, row_offset + len(historical_df))
+    )
+    clean_history = history.dropna(subset=['Concepto', 'Tipo de gasto'])
+
+    return KnowledgeBase(_aggregate_stats(clean_history, count=('last_seen', 'size')))
+
+def _confidence(score, agreement):
+    """Scale a similarity score by the label agreement of the matched concept."""
+    return int(round(score * agreement))
+
+def get_suggestion(concept, mapping, threshold=70, index=None):
     """
     Find the best category match for a new concept using fuzzy string matching.
+    If a ConceptIndex is given, only its candidates are scored instead of every known concept.
+    The confidence is the similarity score scaled by the label agreement of the matched concept.
     """
-   
+
     if concept in mapping:
-        return mapping[concept], 100
+        return mapping[concept], _confidence(100, _agreement(mapping, concept))
+
+    if index is not None:
+        concepts_known = index.candidates(concept)
+    else:
+        concepts_known = list(mapping.keys())
 
-    concepts_known = list(mapping.keys())
-    
     if not concepts_known:
-        return "NEW - NEEDS REVIEW", 0
+        return NEEDS_REVIEW, 0
 
     best_match, score = process.extractOne(concept, concepts_known, scorer=fuzz.token_set_ratio)
 
     if score >= threshold:
-        return mapping[best_match], score
-    
-    return "NEW - NEEDS REVIEW", score
+        return mapping[best_match], _confidence(score, _agreement(mapping, best_match))
+
+    return NEEDS_REVIEW, score
+
+def get_suggestions(concepts, mapping, threshold=70, index=None):
+    """
+    Batch version of get_suggestion for a whole column of concepts.
+
+    Exact matches are resolved with a single vectorized lookup. The remaining concepts
+    and the known concepts are preprocessed once and scored with rapidfuzz in native code:
+    without an index, as a cdist score matrix against every known concept; with a ConceptIndex,
+    as the sparse matrix of (concept, candidate) pairs, scored in one cpdist call. Both run in
+    blocks of at most MAX_MATRIX_CELLS scores.
+    Scores, confidences and tie-breaking are the same as get_suggestion.
+
+    Returns:
+        tuple: (categories, scores) numpy arrays aligned with `concepts`
+    """
+    concepts = pd.Series(concepts, dtype=object).map(str).reset_index(drop=True)
+    categories = np.full(len(concepts), NEEDS_REVIEW, dtype=object)
+    scores = np.zeros(len(concepts), dtype=np.int64)
 
-def classify_missing_records(new_df, historical_df):
+    if not mapping:
+        return categories, scores
+
+    known_concepts, known_categories, known_agreement = _knowledge_arrays(mapping)
+    positions = pd.Index(known_concepts, dtype=object).get_indexer(concepts)
+    is_exact = positions >= 0
+    categories[is_exact] = known_categories[positions[is_exact]]
+    scores[is_exact] = np.rint(100 * known_agreement[positions[is_exact]])
+
+    pending = np.flatnonzero(~is_exact)
+    if len(pending) == 0:
+        return categories, scores
+
+    pending_concepts = concepts.iloc[pending].tolist()
+    queries = [_process_query(concept) for concept in pending_concepts]
+    best_scores = np.zeros(len(pending), dtype=np.float64)
+    best_ids = np.full(len(pending), -1, dtype=np.int64)
+
+    if index is None:
+        choices = _process_choices(known_concepts)
+        block = max(1, MAX_MATRIX_CELLS // len(choices))
+        for start in range(0, len(queries), block):
+            matrix = rf_process.cdist(
+                queries[start:start + block], choices,
+                scorer=rf_fuzz.token_set_ratio, dtype=np.float64, workers=-1
+            )
+            best = matrix.argmax(axis=1)
+            best_scores[start:start + block] = matrix[np.arange(len(best)), best]
+            best_ids[start:start + block] = best
+    else:
+        queries = np.array(queries, dtype=object)
+        block = max(1, MAX_MATRIX_CELLS // (index.candidate_limit or len(index)))
+        for start in range(0, len(queries), block):
+            query_ids, candidate_ids = index.candidate_pairs(pending_concepts[start:start + block])
+            if len(query_ids) == 0:
+                continue
+            pair_scores = rf_process.cpdist(
+                queries[start + query_ids], index.choices[candidate_ids],
+                scorer=rf_fuzz.token_set_ratio, dtype=np.float64, workers=-1
+            )
+            # Best candidate of each concept, the earliest one on equal scores
+            ranking = np.lexsort((candidate_ids, -pair_scores, query_ids))
+            first = ranking[np.r_[True, query_ids[ranking][1:] != query_ids[ranking][:-1]]]
+            best_scores[start + query_ids[first]] = pair_scores[first]
+            best_ids[start + query_ids[first]] = candidate_ids[first]
+
+    # thefuzz rounds scores with Python's round(), i.e. half to even like np.rint
+    best_scores = np.rint(best_scores).astype(np.int64)
+    above = best_scores >= threshold
+    scores[pending] = best_scores
+    categories[pending[above]] = known_categories[best_ids[above]]
+    scores[pending[above]] = np.rint(best_scores[above] * known_agreement[best_ids[above]])
+
+    return categories, scores
+
+def classify_missing_records(new_df, historical_df, cache=None, knowledge_base=None, index=None, progress=None):
     """
     Main function to fill 'Tipo de gasto' and 'Confidence' for new accounting movements.
+    Each unique normalized concept is classified once and the result is fanned out to
+    all its rows. An optional SuggestionCache is reused across runs, and an already
+    built knowledge base (e.g. from src.knowledge_store) skips learning from historical_df,
+    as an already built ConceptIndex over it skips indexing its concepts.
+    With progress, progress(done, total) is called with the rows classified so far after
+    every PROGRESS_CONCEPTS scored concepts.
     """
     if new_df is None or len(new_df) == 0:
         return new_df
 
-    logger.info("Learning from historical accounting movements...")
-    knowledge_base = create_knowledge_base(historical_df)
+    if knowledge_base is None:
+        logger.info("Learning from historical accounting movements...")
+        knowledge_base = create_knowledge_base(historical_df)
+
+    codes, unique_concepts = pd.factorize(normalize_concepts(new_df['Concepto']))
+    logger.info(f"Classifying {len(new_df)} new movements ({len(unique_concepts)} unique concepts)...")
 
-    logger.info(f"Classifying {len(new_df)} new movements...")
+    categories = np.empty(len(unique_concepts), dtype=object)
+    scores = np.zeros(len(unique_concepts), dtype=np.int64)
+    pending = np.arange(len(unique_concepts))
 
-    results = new_df['Concepto'].apply(lambda x: get_suggestion(str(x), knowledge_base))
+    if cache is not None:
+        cache.bind(knowledge_base_fingerprint(knowledge_base))
+        cached = [cache.get(concept) for concept in unique_concepts]
+        is_cached = np.array([entry is not None for entry in cached], dtype=bool)
+        for i in np.flatnonzero(is_cached):
+            categories[i], scores[i] = cached[i]
+        pending = np.flatnonzero(~is_cached)
+        logger.info(f"{int(is_cached.sum())} concepts served from the suggestion cache.")
 
-    new_df['Tipo de gasto'] = [res[0] for res in results]
-    new_df['Confidence'] = [res[1] for res in results]
+    if len(pending) > 0:
+        if index is None:
+            index = ConceptIndex(knowledge_base)
+        pending_concepts = unique_concepts[pending]
+        if progress is None:
+            categories[pending], scores[pending] = get_suggestions(pending_concepts, knowledge_base, index=index)
+        else:
+            rows_per_concept = np.bincount(codes, minlength=len(unique_concepts))
+            done = len(new_df) - int(rows_per_concept[pending].sum())
+            for start in range(0, len(pending), PROGRESS_CONCEPTS):
+                batch = pending[start:start + PROGRESS_CONCEPTS]
+                categories[batch], scores[batch] = get_suggestions(unique_concepts[batch], knowledge_base, index=index)
+                done += int(rows_per_concept[batch].sum())
+                progress(done, len(new_df))
+        if cache is not None:
+            for concept, category, score in zip(pending_concepts, categories[pending], scores[pending]):
+                cache.put(concept, (category, int(score)))
+
+    new_df['Tipo de gasto'] = categories[codes]
+    new_df['Confidence'] = scores[codes]
 
     logger.success("Classification finished successfully.")
-    
+
     return new_df
@@ -1,6 +1,11 @@
 INPUT_PL_FILE = "data/raw/InputPL.xlsx"
 MAYOR_FILE = "data/raw/Mayor_TSCFO.xlsx"
 OUTPUT_FILE = "data/output/InputPL_Updated.xlsx"
+CACHE_DIR = "data/cache"
+KNOWLEDGE_BASE_DIR = f"{CACHE_DIR}/knowledge_base"
+FRAME_CACHE_DIR = f"{CACHE_DIR}/frames"
+RECONCILIATION_DIR = f"{CACHE_DIR}/reconciliation"
+PROFILE_DIR = "data/output/profiles"
 
 
 INPUT_PL_COLS = [
@@ -15,3 +20,19 @@ COLUMN_MAPPING = {
 }
 
 UNIQUE_IDENTIFIERS = ["Nº Asiento", "Fecha", "Saldo"]
+
+# Saldo differences (in cents) still treated as the same movement; 0 = exact match in cents
+SALDO_TOLERANCE_CENTS = 0
+
+# Mayor columns read by the streaming loader: the InputPL layout before COLUMN_MAPPING is applied
+MAYOR_COLS = INPUT_PL_COLS + list(COLUMN_MAPPING)
+
+STREAMING_LOAD = True
+# Stream the output with a write-only workbook (low memory; drops column widths and merged cells)
+STREAMING_WRITE = False
+FRAME_CACHE = True
+# Load InputPL and Mayor in two forked processes (CLI only; the web app always loads in its worker thread)
+PARALLEL_LOAD = True
+INCREMENTAL_RECONCILIATION = True
+# Worker threads shared by all web sessions to run the pipeline off the UI thread
+BACKGROUND_WORKERS = 4
@@ -0,0 +1,192 @@
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from src.config import FRAME_CACHE_DIR
+from src.logger import get_logger
+
+try:
+    import pyarrow
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+logger = get_logger(__name__)
+
+MAX_ENTRIES = 20
+CHUNK_SIZE = 1024 * 1024
+TYPE_SUFFIX = "__type"
+METADATA_KEY = b"startupcfo"
+
+# Tags for the values of mixed object columns (e.g. Nº Asiento with numbers and 'END')
+NONE, INT, FLOAT, STR, BOOL, DATETIME, NAN = range(7)
+
+def file_hash(source):
+    """
+    Return the SHA-256 of an Excel file given as a path or a file-like object (e.g. a Streamlit upload).
+    """
+    digest = hashlib.sha256()
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+    elif hasattr(source, "getvalue"):
+        digest.update(source.getvalue())
+    else:
+        position = source.tell()
+        digest.update(source.read())
+        source.seek(position)
+    return digest.hexdigest()
+
+def cache_key(source, *parts):
+    """
+    Return the cache key of a workbook: its content hash plus everything that affects
+    the parsed result (loader version, file role, loader options).
+    """
+    key = json.dumps([file_hash(source), *parts], default=str)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+def _tag(value):
+    if value is None:
+        return NONE
+    if pd.isna(value):
+        # Blank cells read as NaN (or NaT) next to numbers and text
+        return NAN
+    if isinstance(value, (bool, np.bool_)):
+        return BOOL
+    if isinstance(value, (int, np.integer)):
+        return INT
+    if isinstance(value, (float, np.floating)):
+        return FLOAT
+    if isinstance(value, str):
+        return STR
+    if isinstance(value, pd.Timestamp) or hasattr(value, "isoformat"):
+        return DATETIME
+    raise TypeError(f"unsupported value {value!r}")
+
+def _encode_mixed(series):
+    """
+    Split a mixed object column into a string column and a type tag column, which Parquet can store.
+    """
+    tags = np.fromiter((_tag(value) for value in series), dtype=np.int8, count=len(series))
+    text = series.map(lambda value: value.isoformat() if hasattr(value, "isoformat") else str(value))
+    text[(tags == NONE) | (tags == NAN)] = None
+    return text.astype(object), tags
+
+def _decode_mixed(text, tags):
+    """
+    Rebuild the original Python values of a mixed object column.
+    """
+    values = np.full(len(text), None, dtype=object)
+    text = text.to_numpy(dtype=object)
+    for tag, convert in (
+        (INT, lambda v: pd.to_numeric(v).astype(np.int64)),
+        (FLOAT, lambda v: pd.to_numeric(v).astype(np.float64)),
+        (STR, lambda v: v),
+        (BOOL, lambda v: v == "True"),
+        (DATETIME, lambda v: pd.DatetimeIndex(pd.to_datetime(v)).to_pydatetime()),
+        (NAN, lambda v: np.full(len(v), np.nan)),
+    ):
+        mask = tags == tag
+        if mask.any():
+            values[mask] = np.asarray(convert(pd.Series(text[mask], dtype=object))).astype(object)
+    return values
+
+def _encode(df):
+    """
+    Return a Parquet-friendly copy of df and the metadata needed to restore it exactly.
+    """
+    encoded = {}
+    mixed = []
+    for col in df.columns:
+        series = df[col]
+        if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) not in ("string", "empty"):
+            encoded[col], encoded[col + TYPE_SUFFIX] = _encode_mixed(series)
+            mixed.append(col)
+        else:
+            encoded[col] = series
+    metadata = {
+        "columns": list(map(str, df.columns)),
+        "dtypes": [str(dtype) for dtype in df.dtypes],
+        "mixed": mixed,
+    }
+    return pd.DataFrame(encoded, index=df.index), metadata
+
+def _decode(table, metadata):
+    """
+    Restore the DataFrame written by _encode.
+    """
+    df = pd.DataFrame(index=table.index)
+    for col, dtype in zip(metadata["columns"], metadata["dtypes"]):
+        if col in metadata["mixed"]:
+            df[col] = pd.Series(_decode_mixed(table[col], table[col + TYPE_SUFFIX].to_numpy()), index=table.index, dtype=object)
+        elif dtype == "object":
+            series = table[col].astype(object)
+            df[col] = series.mask(series.isna(), np.nan)
+        else:
+            df[col] = table[col].astype(dtype) if str(table[col].dtype) != dtype else table[col]
+    return df
+
+def _entry_path(key, cache_dir):
+    return os.path.join(cache_dir, f"{key}.parquet")
+
+def load_frame(key, cache_dir=FRAME_CACHE_DIR):
+    """
+    Return the cached DataFrame for a key, or None on a miss or an unreadable entry.
+    """
+    path = _entry_path(key, cache_dir)
+    if not PARQUET_AVAILABLE or not os.path.exists(path):
+        return None
+    try:
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        metadata = json.loads(table.schema.metadata[METADATA_KEY])
+        df = _decode(table.to_pandas(), metadata)
+        os.utime(path)
+        return df
+    except Exception as e:
+        logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+def store_frame(key, df, cache_dir=FRAME_CACHE_DIR):
+    """
+    Write a normalized DataFrame to the cache. Failures only disable caching for this frame.
+    """
+    if not PARQUET_AVAILABLE:
+        return
+    path = _entry_path(key, cache_dir)
+    tmp_path = f"{path}.tmp"
+    try:
+        import pyarrow.parquet as pq
+        encoded, metadata = _encode(df)
+        table = pyarrow.Table.from_pandas(encoded)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            METADATA_KEY: json.dumps(metadata).encode("utf-8"),
+        })
+        os.makedirs(cache_dir, exist_ok=True)
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning(f"Could not cache parsed workbook: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    _prune(cache_dir)
+
+def _prune(cache_dir):
+    """
+    Keep only the MAX_ENTRIES most recently used entries.
+    """
+    entries = sorted(glob.glob(os.path.join(cache_dir, "*.parquet")), key=os.path.getmtime, reverse=True)
+    for path in entries[MAX_ENTRIES:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
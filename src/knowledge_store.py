@@ -0,0 +1,192 @@
+import glob
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from src.classifier import ConceptIndex, KnowledgeBase, create_knowledge_base, NGRAM_SIZE
+from src.config import KNOWLEDGE_BASE_DIR
+from src.frame_cache import file_hash
+from src.logger import get_logger
+
+logger = get_logger(__name__)
+
+KNOWLEDGE_BASE_VERSION = 4
+MAX_ARTIFACTS = 20
+HASH_COLUMNS = ['Concepto', 'Tipo de gasto']
+# Source part of the artifact name when the history was not loaded from a known file
+NO_SOURCE = "frame"
+
+def history_row_hashes(historical_df):
+    """
+    Return one uint64 hash per historical row, computed from the columns the knowledge base learns from.
+    """
+    return pd.util.hash_pandas_object(historical_df[HASH_COLUMNS], index=False).to_numpy()
+
+def history_digest(row_hashes):
+    """
+    Return the content hash of a sequence of historical rows.
+    """
+    return hashlib.sha256(row_hashes.tobytes()).hexdigest()
+
+def _artifact_path(store_dir, rows, digest, source):
+    return os.path.join(store_dir, f"kb-{rows}-{digest}-{source}.npz")
+
+def _artifact_names(store_dir, pattern="kb-*-*-*.npz"):
+    """
+    Return (rows, digest, source, path) for every artifact in store_dir matching pattern.
+    """
+    artifacts = []
+    for path in glob.glob(os.path.join(store_dir, pattern)):
+        try:
+            _, rows, digest, source = os.path.basename(path)[:-len(".npz")].split("-")
+            artifacts.append((int(rows), digest, source, path))
+        except ValueError:
+            continue
+    return artifacts
+
+def _read_artifact(path, rows, digest):
+    """
+    Load the (KnowledgeBase, ConceptIndex) stored in an artifact. Returns None if the artifact
+    is missing, corrupt, from another version or does not match the expected rows and digest.
+    """
+    try:
+        with np.load(path) as data:
+            if (int(data["version"]) != KNOWLEDGE_BASE_VERSION or int(data["rows"]) != rows
+                    or str(data["content_hash"]) != digest):
+                raise ValueError("stale artifact")
+            concepts, categories, dtypes = json.loads(data["labels"].tobytes().decode("utf-8"))
+            knowledge_base = KnowledgeBase(pd.DataFrame({
+                'Concepto': pd.Series(concepts, dtype=pd.api.types.pandas_dtype(dtypes[0])),
+                'Tipo de gasto': pd.Series(categories, dtype=pd.api.types.pandas_dtype(dtypes[1])),
+                'count': data["count"],
+                'last_seen': data["last_seen"],
+            }))
+            index = ConceptIndex.from_arrays(knowledge_base, data) if int(data["ngram_size"]) == NGRAM_SIZE else None
+        return knowledge_base, index if index is not None else ConceptIndex(knowledge_base)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError, EOFError) as e:
+        logger.warning(f"Discarding unusable knowledge base artifact {path}: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+def _write_artifact(path, rows, digest, knowledge_base, index):
+    """
+    Atomically write the knowledge base counts and its index structures to an artifact file.
+    Labels are stored as JSON, with their column dtypes, so that the artifact holds no pickled objects.
+    """
+    stats = knowledge_base.stats
+    labels = json.dumps([
+        stats['Concepto'].tolist(), stats['Tipo de gasto'].tolist(),
+        [str(stats['Concepto'].dtype), str(stats['Tipo de gasto'].dtype)],
+    ], ensure_ascii=False)
+    tmp_path = f"{path}.tmp.npz"
+    try:
+        np.savez(
+            tmp_path, version=KNOWLEDGE_BASE_VERSION, rows=rows, content_hash=digest,
+            labels=np.frombuffer(labels.encode("utf-8"), dtype=np.uint8),
+            count=stats['count'].to_numpy(dtype=np.int64), last_seen=stats['last_seen'].to_numpy(dtype=np.int64),
+            **index.to_arrays()
+        )
+        os.replace(tmp_path, path)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning(f"Could not persist knowledge base: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def _prune_artifacts(store_dir):
+    """
+    Keep only the MAX_ARTIFACTS most recently used artifacts (older formats included).
+    """
+    artifacts = sorted(glob.glob(os.path.join(store_dir, "kb-*")), key=os.path.getmtime, reverse=True)
+    for path in artifacts[MAX_ARTIFACTS:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def _find_source_artifact(store_dir, rows, source):
+    """
+    Find the artifact saved for the same source file and row count, without hashing the history.
+    Returns (knowledge_base, index) or None.
+    """
+    for _, digest, _, path in _artifact_names(store_dir, f"kb-{rows}-*-{source}.npz"):
+        loaded = _read_artifact(path, rows, digest)
+        if loaded is not None:
+            os.utime(path)
+            return loaded
+    return None
+
+def _find_base_artifact(store_dir, row_hashes):
+    """
+    Find the largest persisted knowledge base learned from the current history or a prefix of it.
+    Returns (rows, knowledge_base, index) or (0, None, None).
+    """
+    digests = {}
+    for rows, digest, _, path in sorted(_artifact_names(store_dir), reverse=True):
+        if rows > len(row_hashes):
+            continue
+        if rows not in digests:
+            digests[rows] = history_digest(row_hashes[:rows])
+        if digests[rows] != digest:
+            continue
+        loaded = _read_artifact(path, rows, digest)
+        if loaded is not None:
+            return (rows, *loaded)
+
+    return 0, None, None
+
+def load_knowledge_base(historical_df, store_dir=KNOWLEDGE_BASE_DIR, input_source=None):
+    """
+    Return (knowledge_base, index) for historical_df: the KnowledgeBase and the ConceptIndex
+    over it, reusing the artifact persisted on disk.
+
+    Artifacts are versioned and hold the category counts together with the index structures
+    (preprocessed choices and n-gram postings), keyed by the content hash of the history and
+    by input_source, the InputPL file historical_df was loaded from. An artifact of the same
+    file and row count is loaded without hashing the history. When the history only grew (new
+    confirmed rows appended to InputPL), the artifact of the previous run is extended with the
+    new rows and their concepts instead of re-learning the entire history. A missing, stale or
+    corrupt artifact triggers a full rebuild.
+    """
+    rows = len(historical_df)
+    try:
+        source = file_hash(input_source) if input_source is not None else NO_SOURCE
+    except OSError:
+        source = NO_SOURCE
+    os.makedirs(store_dir, exist_ok=True)
+
+    if source != NO_SOURCE:
+        loaded = _find_source_artifact(store_dir, rows, source)
+        if loaded is not None:
+            logger.info(f"Loaded knowledge base for {rows} historical rows from the artifact of this InputPL")
+            return loaded
+
+    row_hashes = history_row_hashes(historical_df)
+    digest = history_digest(row_hashes)
+    path = _artifact_path(store_dir, rows, digest, source)
+
+    base_rows, knowledge_base, index = _find_base_artifact(store_dir, row_hashes)
+    if knowledge_base is not None and base_rows == rows:
+        logger.info(f"Loaded knowledge base for {rows} historical rows from a persisted artifact")
+    elif knowledge_base is not None:
+        logger.info(f"Extending persisted knowledge base with {rows - base_rows} new historical rows...")
+        new_rows = create_knowledge_base(historical_df.iloc[base_rows:], row_offset=base_rows)
+        knowledge_base = knowledge_base.merge(new_rows)
+        index = ConceptIndex(knowledge_base, base=index)
+    else:
+        logger.info(f"Building knowledge base from {rows} historical rows...")
+        knowledge_base = create_knowledge_base(historical_df)
+        index = ConceptIndex(knowledge_base)
+
+    if not os.path.exists(path):
+        _write_artifact(path, rows, digest, knowledge_base, index)
+    else:
+        os.utime(path)
+    _prune_artifacts(store_dir)
+
+    return knowledge_base, index
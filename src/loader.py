@@ -1,9 +1,35 @@
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import openpyxl
 import pandas as pd
-from src.config import INPUT_PL_FILE, MAYOR_FILE, COLUMN_MAPPING, INPUT_PL_COLS, UNIQUE_IDENTIFIERS
+from src import frame_cache
+from src.config import (
+    INPUT_PL_FILE, MAYOR_FILE, COLUMN_MAPPING, INPUT_PL_COLS, MAYOR_COLS, UNIQUE_IDENTIFIERS, STREAMING_LOAD,
+    FRAME_CACHE, FRAME_CACHE_DIR, PARALLEL_LOAD
+)
 from src.logger import get_logger
+from src.profiling import process_peak_rss_mib
 
 logger = get_logger(__name__)
 
+# Bump whenever loading or normalization changes, so cached parsed workbooks are not reused
+LOADER_VERSION = 1
+
+NUMERIC_COLS = ['Debe', 'Haber', 'Saldo', 'Neto']
+
+# Month abbreviations indexed by month number (1-12)
+MONTH_ABBREVIATIONS = np.array(['', 'ene', 'feb', 'mar', 'abr', 'may', 'jun',
+                                'jul', 'ago', 'sep', 'oct', 'nov', 'dic'], dtype=object)
+
+STREAMING_DTYPES = {
+    **{col: 'float64' for col in NUMERIC_COLS + ['Net']},
+    'Fecha': object,
+    'Mes': object,
+    'Month': object,
+}
+
 def validate_columns(df, required_cols, file_label):
     """
     Checks if all required columns are present in the DataFrame.
@@ -16,16 +42,91 @@ def validate_columns(df, required_cols, file_label):
     if missing:
         raise ValueError(f"Error de Estructura en {file_label}: Faltan las columnas: {', '.join(missing)}")
 
-def load_data(file_source):
+def _header_names(header):
+    """
+    Build column names from the header row the way pd.read_excel does:
+    empty cells become 'Unnamed: i' and repeated names get a '.n' suffix.
+    """
+    names = []
+    seen = {}
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+def _build_column(name, values):
+    """
+    Build a column from raw cell values with an explicit dtype when one is known.
+    Fecha and Mes keep the raw values so that normalize_data can report unreadable dates.
+    """
+    dtype = STREAMING_DTYPES.get(name)
+    if dtype == 'float64':
+        return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').astype('float64')
+    series = pd.Series(values, dtype=dtype)
+    if series.dtype == object and dtype is None:
+        series = series.mask(series.isna(), np.nan).infer_objects()
+    return series
+
+def stream_excel(file_source, columns=None):
+    """
+    Read the first sheet of an Excel file in openpyxl read-only mode, row by row,
+    materializing only `columns` (all columns if None). The DataFrame is built
+    column-wise; trailing empty rows are dropped like pd.read_excel does.
+    """
+    wb = openpyxl.load_workbook(file_source, read_only=True, data_only=True)
+    try:
+        sheet = wb.worksheets[0]
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(values_only=True)
+
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+
+        names = _header_names(header)
+        wanted = [i for i, name in enumerate(names) if columns is None or name in columns]
+        width = len(names)
+        values = {i: [] for i in wanted}
+        last_row = 0
+
+        for row_number, row in enumerate(rows, start=1):
+            if len(row) < width:
+                row = tuple(row) + (None,) * (width - len(row))
+            if row.count(None) != len(row):
+                last_row = row_number
+            for i in wanted:
+                values[i].append(row[i])
+    finally:
+        wb.close()
+
+    return pd.DataFrame({names[i]: _build_column(names[i], values[i][:last_row]) for i in wanted})
+
+def load_data(file_source, columns=None, streaming=False):
     """
     Generic function to load an Excel file from a path or a file-like object.
+    With streaming=True the file is read with stream_excel, keeping only `columns`,
+    and the load time and the process peak RSS (over the process lifetime) are reported.
     """
     try:
         if isinstance(file_source, str):
             logger.info(f"Reading file from path: {file_source}")
         else:
             logger.info("Reading file from upload buffer")
-            
+
+        if streaming:
+            start = time.perf_counter()
+            df = stream_excel(file_source, columns)
+            elapsed = time.perf_counter() - start
+            peak = process_peak_rss_mib()
+            memory = f", process peak RSS {peak:.0f} MiB" if peak is not None else ""
+            logger.success(f"Loaded {len(df)} rows x {len(df.columns)} columns in {elapsed:.2f}s{memory}")
+            return df
+
         df = pd.read_excel(file_source, engine='openpyxl')
         logger.success(f"Loaded {len(df)} rows")
         return df
@@ -36,6 +137,49 @@ def load_data(file_source):
         logger.error(f"An unexpected error occurred: {e}")
         return None
 
+def format_month_year(dates):
+    """
+    Format datetimes as 'ene/25', 'feb/25', ... (NaT becomes None). Returns an object array.
+    Each distinct month is formatted once and broadcast to its rows.
+    """
+    dates = pd.DatetimeIndex(dates)
+    labels = np.full(len(dates), None, dtype=object)
+    valid = dates.notna()
+    if valid.any():
+        valid_dates = dates[valid]
+        codes, months = pd.factorize(np.asarray(valid_dates.year * 100 + valid_dates.month, dtype=np.int64))
+        month_labels = MONTH_ABBREVIATIONS[months % 100] + '/' + np.char.zfill((months // 100 % 100).astype(str), 2).astype(object)
+        labels[valid] = month_labels[codes]
+    return labels
+
+def normalize_mes(mes, fecha=None):
+    """
+    Normalize the 'Mes' column to the 'ene/25' format.
+    Values that parse as dates are formatted; the rest are derived from Fecha when it is a
+    valid date and kept otherwise. Missing values and 'None'/'nan' texts become ''.
+    """
+    mes = mes.astype(object)
+    mes_dates = pd.DatetimeIndex(pd.to_datetime(mes, errors='coerce'))
+    from_mes = mes_dates.notna()
+
+    values = mes.to_numpy(dtype=object, copy=True)
+    values[from_mes] = format_month_year(mes_dates[from_mes])
+
+    kept = ~from_mes
+    if kept.any() and fecha is not None:
+        logger.info(f"Deriving {kept.sum()} 'Mes' values from 'Fecha' column...")
+        fecha_dates = pd.DatetimeIndex(pd.to_datetime(fecha, errors='coerce'))
+        from_fecha = kept & fecha_dates.notna()
+        values[from_fecha] = format_month_year(fecha_dates[from_fecha])
+        kept &= ~from_fecha
+
+    if kept.any():
+        original = pd.Series(values[kept], dtype=object)
+        empty = original.isna() | original.astype(str).str.strip().isin(['None', 'nan'])
+        values[np.flatnonzero(kept)[empty.to_numpy()]] = ''
+
+    return pd.Series(values, index=mes.index, name=mes.name, dtype=object)
+
 def normalize_data(df, is_mayor=False):
     """
     Standardize column names and data types (especially dates and formats).
@@ -52,9 +196,11 @@ def normalize_data(df, is_mayor=False):
     if 'Fecha' in df.columns:
         temp_fecha = pd.to_datetime(df['Fecha'], errors='coerce')
         
-       
-        is_not_end = df['Fecha'].astype(str).str.upper().str.strip() != 'END'
-        invalid_dates = temp_fecha.isna() & df['Fecha'].notna() & is_not_end
+        # Only unparsed values need the (string) END check
+        invalid_dates = temp_fecha.isna() & df['Fecha'].notna()
+        if invalid_dates.any():
+            unparsed = df.loc[invalid_dates, 'Fecha']
+            invalid_dates[invalid_dates] = unparsed.astype(str).str.upper().str.strip() != 'END'
         
         if invalid_dates.any():
             bad_rows = df.index[invalid_dates].tolist()
@@ -72,97 +218,145 @@ def normalize_data(df, is_mayor=False):
         
         df['Fecha'] = temp_fecha
 
-  
-    month_translation = {
-        1: 'ene', 2: 'feb', 3: 'mar', 4: 'abr', 5: 'may', 6: 'jun',
-        7: 'jul', 8: 'ago', 9: 'sep', 10: 'oct', 11: 'nov', 12: 'dic'
-    }
-
-    def format_month_year(date_value):
-        """Convierte una fecha a formato 'ene/25', 'feb/25', etc."""
-        if pd.isna(date_value):
-            return None
-        try:
-            if hasattr(date_value, 'month') and hasattr(date_value, 'year'):
-                return f"{month_translation[date_value.month]}/{str(date_value.year)[2:]}"
-        except (KeyError, AttributeError):
-            pass
-        return None
-
-   
     if 'Mes' in df.columns:
         logger.info("Processing 'Mes' column...")
-        
-        df['Mes'] = df['Mes'].astype(object)
-        
-
-        temp_mes_date = pd.to_datetime(df['Mes'], errors='coerce')
-        mask_valid_from_mes = temp_mes_date.notna()
-        
-
-        if mask_valid_from_mes.any():
-            df.loc[mask_valid_from_mes, 'Mes'] = temp_mes_date[mask_valid_from_mes].apply(format_month_year)
-
-        mask_needs_fecha_derivation = (
-            ~mask_valid_from_mes | 
-            df['Mes'].isna() | 
-            (df['Mes'].astype(str).str.strip() == '') | 
-            (df['Mes'].astype(str).str.strip() == 'None') |  
-            (df['Mes'].astype(str).str.strip() == 'nan')  
-        )
-        
-        if mask_needs_fecha_derivation.any() and 'Fecha' in df.columns:
-            logger.info(f"Deriving {mask_needs_fecha_derivation.sum()} 'Mes' values from 'Fecha' column...")
-            
-            fecha_values = df.loc[mask_needs_fecha_derivation, 'Fecha']
-            formatted_from_fecha = fecha_values.apply(format_month_year)
-            
-            valid_fecha_mask = formatted_from_fecha.notna()
-            if valid_fecha_mask.any():
-              
-                final_mask = mask_needs_fecha_derivation.copy()
-                final_mask[mask_needs_fecha_derivation] = valid_fecha_mask
-                
-                df.loc[final_mask, 'Mes'] = formatted_from_fecha[valid_fecha_mask].values
-        
-       
-        cleanup_mask = (
-            df['Mes'].isna() | 
-            (df['Mes'].astype(str).str.strip() == 'None') |
-            (df['Mes'].astype(str).str.strip() == 'nan')
-        )
-        if cleanup_mask.any():
-            df.loc[cleanup_mask, 'Mes'] = ''
-        
+        df['Mes'] = normalize_mes(df['Mes'], df['Fecha'] if 'Fecha' in df.columns else None)
         logger.success("'Mes' column processed successfully.")
 
 
-    numeric_cols = ['Debe', 'Haber', 'Saldo', 'Neto']
-    for col in numeric_cols:
+    for col in NUMERIC_COLS:
         if col in df.columns:
            
             df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0).round(2)
     
     return df
 
-def get_prepared_data(input_source=INPUT_PL_FILE, mayor_source=MAYOR_FILE):
+def _frame_cache_key(source, is_mayor, streaming):
+    """
+    Return the parsed data cache key of a workbook, or None if it cannot be read
+    (load_data then reports the problem).
+    """
+    columns = MAYOR_COLS if is_mayor else INPUT_PL_COLS
+    try:
+        return frame_cache.cache_key(source, LOADER_VERSION, is_mayor, streaming, columns)
+    except OSError:
+        return None
+
+def _prepare_workbook(source, is_mayor, streaming):
+    """
+    Load, validate and normalize one workbook.
+    Returns (df, timings); df is None if the file could not be loaded.
+    """
+    start = time.perf_counter()
+    df = load_data(source, columns=MAYOR_COLS if is_mayor else INPUT_PL_COLS, streaming=streaming)
+    loaded = time.perf_counter()
+    if df is None:
+        return None, {"load": loaded - start, "normalize": 0.0}
+
+    if is_mayor:
+        df = normalize_data(df, is_mayor=True)
+        validate_columns(df, UNIQUE_IDENTIFIERS + ["Concepto"], "Mayor")
+    else:
+        validate_columns(df, INPUT_PL_COLS, "InputPL")
+        df = normalize_data(df, is_mayor=False)
+
+    return df, {"load": loaded - start, "normalize": time.perf_counter() - loaded}
+
+def _picklable_source(source):
+    """
+    Return a path or the raw bytes of a file-like source (e.g. a Streamlit upload),
+    which can be sent to a worker process.
+    """
+    if isinstance(source, str) or source is None:
+        return source
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    position = source.tell()
+    data = source.read()
+    source.seek(position)
+    return data
+
+def _prepare_workbook_worker(source, is_mayor, streaming):
+    """Process pool entry point: rebuild the buffer of uploaded files and prepare the workbook."""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return _prepare_workbook(source, is_mayor, streaming)
+
+def _run_prepare(jobs, streaming, parallel):
+    """
+    Prepare the given workbooks ({label: (source, is_mayor)}), concurrently in a process pool
+    when parallel=True and there is more than one. ValueErrors are returned instead of raised
+    so the caller can report them in the same order as a sequential run.
+    """
+    results = {}
+    if parallel and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+            futures = {
+                label: pool.submit(_prepare_workbook_worker, _picklable_source(source), is_mayor, streaming)
+                for label, (source, is_mayor) in jobs.items()
+            }
+            for label, future in futures.items():
+                try:
+                    results[label] = future.result()
+                except ValueError as e:
+                    results[label] = (e, {})
+    else:
+        for label, (source, is_mayor) in jobs.items():
+            try:
+                results[label] = _prepare_workbook(source, is_mayor, streaming)
+            except ValueError as e:
+                results[label] = (e, {})
+    return results
+
+def get_prepared_data(input_source=INPUT_PL_FILE, mayor_source=MAYOR_FILE, streaming=STREAMING_LOAD,
+                      use_cache=FRAME_CACHE, parallel=PARALLEL_LOAD, cache_dir=FRAME_CACHE_DIR):
     """
     Main function to load and prepare both datasets.
     Accepts paths or file-like objects.
+    With streaming=True only the columns the pipeline uses are read (see stream_excel).
+    With use_cache=True, normalized DataFrames are cached on disk in a columnar format,
+    keyed by file content and LOADER_VERSION, so unchanged files skip parsing entirely.
+    The cache lives in cache_dir.
+    With parallel=True, InputPL and Mayor are loaded and normalized in separate processes.
     Raises ValueError if validation fails.
     """
-    input_df = load_data(input_source)
-    mayor_df = load_data(mayor_source)
+    start = time.perf_counter()
+    input_key = _frame_cache_key(input_source, False, streaming) if use_cache else None
+    mayor_key = _frame_cache_key(mayor_source, True, streaming) if use_cache else None
+    frames = {
+        "InputPL": frame_cache.load_frame(input_key, cache_dir) if input_key else None,
+        "Mayor": frame_cache.load_frame(mayor_key, cache_dir) if mayor_key else None,
+    }
+    cache_elapsed = time.perf_counter() - start
 
-    if input_df is None or mayor_df is None:
-        raise ValueError("No se pudieron cargar los archivos seleccionados.")
+    if frames["InputPL"] is not None and frames["Mayor"] is not None:
+        logger.success(
+            f"Loaded {len(frames['InputPL'])} InputPL and {len(frames['Mayor'])} Mayor rows "
+            f"from the parsed data cache in {cache_elapsed:.2f}s"
+        )
+        return frames["InputPL"], frames["Mayor"]
+
+    sources = {"InputPL": (input_source, False), "Mayor": (mayor_source, True)}
+    jobs = {label: job for label, job in sources.items() if frames[label] is None}
+    results = _run_prepare(jobs, streaming, parallel)
 
-    validate_columns(input_df, INPUT_PL_COLS, "InputPL")
+    if any(df is None for df, _ in results.values()):
+        raise ValueError("No se pudieron cargar los archivos seleccionados.")
+    for label in jobs:
+        df, timings = results[label]
+        if isinstance(df, ValueError):
+            raise df
+        frames[label] = df
+        logger.info(f"{label}: loaded in {timings['load']:.2f}s, normalized in {timings['normalize']:.2f}s")
 
-    input_df = normalize_data(input_df, is_mayor=False)
-    mayor_df = normalize_data(mayor_df, is_mayor=True)
+    if input_key and "InputPL" in jobs:
+        frame_cache.store_frame(input_key, frames["InputPL"], cache_dir)
+    if mayor_key and "Mayor" in jobs:
+        frame_cache.store_frame(mayor_key, frames["Mayor"], cache_dir)
 
-    mayor_required = UNIQUE_IDENTIFIERS + ["Concepto"]
-    validate_columns(mayor_df, mayor_required, "Mayor")
-    
-    return input_df, mayor_df
+    mode = "in parallel" if parallel and len(jobs) > 1 else "sequentially"
+    logger.success(
+        f"Prepared {', '.join(jobs)} {mode} in {time.perf_counter() - start:.2f}s "
+        f"(cache lookup {cache_elapsed:.2f}s)"
+    )
+    return frames["InputPL"], frames["Mayor"]
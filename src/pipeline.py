@@ -0,0 +1,164 @@
+import os
+from src.classifier import classify_missing_records
+from src.config import (
+    INPUT_PL_FILE, MAYOR_FILE, OUTPUT_FILE, SALDO_TOLERANCE_CENTS, INCREMENTAL_RECONCILIATION,
+    STREAMING_WRITE, PARALLEL_LOAD, CACHE_DIR, FRAME_CACHE_DIR, KNOWLEDGE_BASE_DIR, RECONCILIATION_DIR
+)
+from src.knowledge_store import load_knowledge_base
+from src.loader import get_prepared_data
+from src.logger import get_logger
+from src.processor import find_missing_records
+from src.profiling import RunProfile, count_rows
+from src.reconciliation_store import load_reconciliation_state, save_reconciliation_state
+from src.validator import audit_findings, remove_exact_duplicates, EXACT_DUPLICATES
+from src.writer import save_to_excel, LOW_CONFIDENCE
+
+logger = get_logger(__name__)
+
+# What to do with exact duplicates: ask confirm(), always remove them, or keep them
+DUPLICATE_POLICIES = ("ask", "remove", "keep")
+
+# Stages of load_and_audit and add_new_movements, in order (e.g. for a progress bar)
+LOAD_STAGES = ["get_prepared_data", "audit_data_quality"]
+UPDATE_STAGES = ["find_missing_records", "classify_missing_records", "save_to_excel"]
+
+def _store_dir(cache_dir, default_dir):
+    """The directory of one on-disk store (default_dir, under CACHE_DIR) placed under cache_dir instead."""
+    return os.path.join(cache_dir, os.path.relpath(default_dir, CACHE_DIR))
+
+class InputPLUpdate:
+    """
+    Outcome of add_new_movements: the Mayor rows matched only within tolerance, the classified
+    new rows (None when InputPL is already up to date) and the output (a path or a buffer).
+    """
+
+    def __init__(self, tolerance_report, classified_df=None, output=None):
+        self.tolerance_report = tolerance_report
+        self.classified_df = classified_df
+        self.output = output
+
+def load_and_audit(input_source, mayor_source, profile, parallel_load=PARALLEL_LOAD, cache_dir=CACHE_DIR):
+    """
+    Load, normalize and audit both files, recording each stage in profile.
+    Parsed files are cached under cache_dir.
+    Returns (input_df, mayor_df, findings); raises ValueError when a file fails validation.
+    """
+    with profile.stage("get_prepared_data") as stage:
+        input_df, mayor_df = get_prepared_data(
+            input_source, mayor_source, parallel=parallel_load, cache_dir=_store_dir(cache_dir, FRAME_CACHE_DIR)
+        )
+        stage.rows = count_rows((input_df, mayor_df))
+    with profile.stage("audit_data_quality", rows=len(input_df) + len(mayor_df)):
+        findings = audit_findings(input_df, "InputPL") + audit_findings(mayor_df, "Mayor")
+    return input_df, mayor_df, findings
+
+def add_new_movements(input_df, mayor_df, input_source, profile, output_path=OUTPUT_FILE, in_memory=False,
+                      fix_existing_rows=False, cache=None, tolerance_cents=SALDO_TOLERANCE_CENTS,
+                      incremental=INCREMENTAL_RECONCILIATION, streaming_write=STREAMING_WRITE, cache_dir=CACHE_DIR):
+    """
+    Find the Mayor rows missing from InputPL, classify them and write the updated InputPL to
+    output_path (or to a returned buffer with in_memory=True). Each stage is recorded in
+    profile, and classification and writing report their row progress to profile.listener.
+    With fix_existing_rows the existing rows are also rewritten from input_df.
+    The knowledge base and the reconciliation state are persisted under cache_dir.
+    Returns an InputPLUpdate.
+    """
+    reconciliation_dir = _store_dir(cache_dir, RECONCILIATION_DIR)
+    reconciled = load_reconciliation_state(input_source, reconciliation_dir) if incremental else None
+    with profile.stage("find_missing_records", rows=len(mayor_df)):
+        new_movements, tolerance_report = find_missing_records(
+            input_df, mayor_df, reconciled=reconciled, tolerance_cents=tolerance_cents, return_report=True
+        )
+    if len(new_movements) == 0:
+        return InputPLUpdate(tolerance_report)
+
+    knowledge_base, index = load_knowledge_base(
+        input_df, store_dir=_store_dir(cache_dir, KNOWLEDGE_BASE_DIR), input_source=input_source
+    )
+    with profile.stage("classify_missing_records", rows=len(new_movements)) as stage:
+        classified_df = classify_missing_records(
+            new_movements, input_df, cache=cache, knowledge_base=knowledge_base, index=index,
+            progress=stage.progress if profile.listener else None
+        )
+
+    with profile.stage("save_to_excel", rows=len(classified_df)) as stage:
+        output = save_to_excel(
+            classified_df, input_source, input_df=input_df if fix_existing_rows else None,
+            streaming=streaming_write, in_memory=in_memory, output_path=output_path,
+            progress=stage.progress if profile.listener else None
+        )
+    output = output if in_memory else output_path
+    if incremental:
+        save_reconciliation_state(output, input_df, classified_df, store_dir=reconciliation_dir)
+    return InputPLUpdate(tolerance_report, classified_df, output)
+
+def run_reconciliation(input_path=INPUT_PL_FILE, mayor_path=MAYOR_FILE, output_path=OUTPUT_FILE,
+                       duplicates="keep", confirm=None, tolerance_cents=SALDO_TOLERANCE_CENTS,
+                       incremental=INCREMENTAL_RECONCILIATION, streaming_write=STREAMING_WRITE,
+                       parallel_load=PARALLEL_LOAD, cache_dir=CACHE_DIR, profile=None):
+    """
+    Reconcile one (InputPL, Mayor) pair without any user interaction and write the updated
+    InputPL to output_path. duplicates is one of DUPLICATE_POLICIES; with 'ask', confirm() is
+    called once when exact duplicates are found and they are removed if it returns True.
+    Stages are recorded in profile (a RunProfile) when given. The on-disk caches (parsed files,
+    knowledge base, reconciliation state) live under cache_dir.
+    Returns a summary dict; raises ValueError when a file fails validation.
+    """
+    if duplicates not in DUPLICATE_POLICIES:
+        raise ValueError(f"Política de duplicados no válida: '{duplicates}'. Opciones: {', '.join(DUPLICATE_POLICIES)}.")
+    if duplicates == "ask" and confirm is None:
+        raise ValueError("La política de duplicados 'ask' necesita una confirmación interactiva.")
+    profile = profile if profile is not None else RunProfile()
+
+    input_df, mayor_df, all_findings = load_and_audit(input_path, mayor_path, profile, parallel_load, cache_dir)
+    summary = {
+        "status": "up_to_date",
+        "input_rows": len(input_df),
+        "mayor_rows": len(mayor_df),
+        "findings": len(all_findings),
+        "duplicates_removed": 0,
+        "tolerance_matches": 0,
+        "new_rows": 0,
+        "low_confidence": 0,
+        "output": None,
+    }
+    if all_findings:
+        logger.warning("Se han detectado problemas de calidad en los datos:")
+        for finding in all_findings:
+            logger.warning(f"  {finding.message}")
+
+    if any(finding.check_id == EXACT_DUPLICATES for finding in all_findings):
+        if duplicates == "remove" or (duplicates == "ask" and confirm()):
+            input_df, removed_input, msg_input = remove_exact_duplicates(input_df, "InputPL")
+            mayor_df, removed_mayor, msg_mayor = remove_exact_duplicates(mayor_df, "Mayor")
+            for msg in (msg_input, msg_mayor):
+                if msg:
+                    logger.info(f"  {msg}")
+            summary["duplicates_removed"] = removed_input + removed_mayor
+            if summary["duplicates_removed"] > 0:
+                logger.success(f"Se eliminaron {summary['duplicates_removed']} duplicados en total. Continuando con datos limpios...")
+        else:
+            logger.info("Continuando sin eliminar duplicados...")
+
+    update = add_new_movements(
+        input_df, mayor_df, input_path, profile, output_path=output_path, tolerance_cents=tolerance_cents,
+        incremental=incremental, streaming_write=streaming_write, cache_dir=cache_dir
+    )
+    tolerance_report = update.tolerance_report
+    summary["tolerance_matches"] = len(tolerance_report)
+    if len(tolerance_report) > 0:
+        logger.warning(f"{len(tolerance_report)} movimientos del Mayor coinciden con el InputPL solo dentro de la tolerancia de Saldo:")
+        for index, row in tolerance_report.head(10).iterrows():
+            logger.warning(f"  Fila {index + 2}: Nº Asiento {row['Nº Asiento']}, Saldo {row['Saldo']} (InputPL: {row['Saldo InputPL']})")
+
+    if update.classified_df is None:
+        logger.info("No new records found to add. Everything is up to date!")
+        return summary
+
+    summary.update(
+        status="updated",
+        new_rows=len(update.classified_df),
+        low_confidence=int((update.classified_df['Confidence'] < LOW_CONFIDENCE).sum()),
+        output=update.output,
+    )
+    return summary
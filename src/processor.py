@@ -1,35 +1,197 @@
+import datetime
+import numpy as np
 import pandas as pd
-from src.config import UNIQUE_IDENTIFIERS
+from src.config import UNIQUE_IDENTIFIERS, SALDO_TOLERANCE_CENTS
 from src.logger import get_logger
 
 logger = get_logger(__name__)
 
-def find_missing_records(input_df, mayor_df):
+# Kinds of key values; values of different kinds never match
+MISSING, NUMBER, TEXT, DATETIME = range(4)
+
+# Identifier compared in integer cents (optionally within a tolerance) instead of as a float
+AMOUNT_KEY = 'Saldo'
+# Keep composite (group, cents) sort keys well inside int64
+MAX_COMPOSITE_KEY = 2**62
+
+_type_of = np.frompyfunc(type, 1, 1)
+
+def _type_kind(value_type):
+    if issubclass(value_type, str):
+        return TEXT
+    if issubclass(value_type, (datetime.date, np.datetime64)):
+        return DATETIME
+    if issubclass(value_type, (int, float, np.number, np.bool_)):
+        return NUMBER
+    return TEXT
+
+def to_cents(values):
+    """Round amounts to integer cents (int64). NaN must be masked out by the caller."""
+    return np.rint(np.asarray(values, dtype=np.float64) * 100).astype(np.int64)
+
+def _number_bits(values, cents=False):
+    """
+    64-bit value of numbers: integer cents for amounts, otherwise the float64 bit
+    pattern with -0.0 folded into 0.0 so that equal numbers share a key.
+    """
+    if cents:
+        return to_cents(values).view(np.uint64)
+    return (np.asarray(values, dtype=np.float64) + 0.0).view(np.uint64)
+
+def _canonical_column(series, cents=False):
+    """
+    Return (kind, value) arrays for a key column, independent of its dtype: 1 and 1.0
+    get the same value, '1' does not (the same equality pd.merge uses).
+    With cents=True numbers are compared in integer cents (100.1 and 100.10000001 match).
+    """
+    kind = np.full(len(series), MISSING, dtype=np.int8)
+    value = np.zeros(len(series), dtype=np.uint64)
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        present = series.notna().to_numpy()
+        kind[present] = DATETIME
+        value[present] = pd.DatetimeIndex(series[present]).as_unit('ns').asi8.view(np.uint64)
+        return kind, value
+
+    if pd.api.types.is_numeric_dtype(series):
+        present = series.notna().to_numpy()
+        kind[present] = NUMBER
+        value[present] = _number_bits(series[present], cents)
+        return kind, value
+
+    values = series.to_numpy(dtype=object)
+    types = _type_of(values)
+    for value_type in pd.unique(types):
+        kind[types == value_type] = _type_kind(value_type)
+    kind[pd.isna(values)] = MISSING
+    numbers = kind == NUMBER
+    value[numbers] = _number_bits(values[numbers].astype(np.float64), cents)
+    dates = kind == DATETIME
+    if dates.any():
+        value[dates] = pd.DatetimeIndex(values[dates]).as_unit('ns').asi8.view(np.uint64)
+    texts = kind == TEXT
+    if texts.any():
+        value[texts] = pd.util.hash_array(values[texts].astype(str).astype(object))
+    return kind, value
+
+def record_keys(df, columns=UNIQUE_IDENTIFIERS):
+    """
+    Hash the identifier columns of each row into one uint64 key.
+    Rows with equal identifiers (as pd.merge compares them, with Saldo in integer cents) get
+    equal keys; the chance of two different rows colliding is about n² / 2⁶⁵ (≈ 3e-8 for a
+    million rows).
     """
-    Compare Mayor with InputPL to find rows that exist in Mayor 
+    parts = {}
+    for col in columns:
+        parts[f"{col}__kind"], parts[f"{col}__value"] = _canonical_column(df[col], cents=col == AMOUNT_KEY)
+    return pd.util.hash_pandas_object(pd.DataFrame(parts), index=False).to_numpy()
+
+def _match_within_tolerance(input_df, candidates_df, tolerance_cents):
+    """
+    For each candidate row, find the InputPL row with the same identifiers except Saldo whose
+    Saldo is closest, and whether it is within tolerance_cents.
+    Rows are grouped by the hash of the other identifiers and sorted by (group, cents) in a
+    single composite int64 key, so every candidate is resolved with one binary search:
+    O((n + m) log n) overall. Returns (matched mask, closest InputPL cents) over candidates_df.
+    """
+    group_cols = [col for col in UNIQUE_IDENTIFIERS if col != AMOUNT_KEY]
+    matched = np.zeros(len(candidates_df), dtype=bool)
+    closest = np.zeros(len(candidates_df), dtype=np.int64)
+
+    input_saldo = pd.to_numeric(input_df[AMOUNT_KEY], errors='coerce').to_numpy(dtype=np.float64)
+    candidate_saldo = pd.to_numeric(candidates_df[AMOUNT_KEY], errors='coerce').to_numpy(dtype=np.float64)
+    input_ok, candidate_ok = np.isfinite(input_saldo), np.isfinite(candidate_saldo)
+    if not input_ok.any() or not candidate_ok.any():
+        return matched, closest
+
+    input_cents, candidate_cents = to_cents(input_saldo[input_ok]), to_cents(candidate_saldo[candidate_ok])
+    groups, _ = pd.factorize(np.concatenate([
+        record_keys(input_df[input_ok], group_cols), record_keys(candidates_df[candidate_ok], group_cols)
+    ]))
+    input_groups, candidate_groups = groups[:len(input_cents)], groups[len(input_cents):]
+
+    low = min(input_cents.min(), candidate_cents.min()) - tolerance_cents
+    span = max(input_cents.max(), candidate_cents.max()) + tolerance_cents - low + 1
+    if int(groups.max() + 1) * int(span) >= MAX_COMPOSITE_KEY:
+        logger.warning("Saldo range too wide for tolerance matching; using exact matching only.")
+        return matched, closest
+
+    input_keys = input_groups * span + (input_cents - low)
+    order = np.argsort(input_keys, kind='stable')
+    sorted_keys, sorted_cents = input_keys[order], input_cents[order]
+    candidate_keys = candidate_groups * span + (candidate_cents - low)
+
+    position = np.searchsorted(sorted_keys, candidate_keys)
+    right = np.minimum(position, len(sorted_keys) - 1)
+    left = np.maximum(position - 1, 0)
+    right_distance = np.abs(sorted_keys[right] - candidate_keys)
+    left_distance = np.abs(sorted_keys[left] - candidate_keys)
+    nearest = np.where(left_distance <= right_distance, left, right)
+
+    # Keys of another group are at least span away, so a small distance implies the same group
+    matched[candidate_ok] = np.minimum(left_distance, right_distance) <= tolerance_cents
+    closest[candidate_ok] = sorted_cents[nearest]
+    return matched, closest
+
+def find_missing_records(input_df, mayor_df, reconciled=None, tolerance_cents=SALDO_TOLERANCE_CENTS, return_report=False):
+    """
+    Compare Mayor with InputPL to find rows that exist in Mayor
     but are not yet in InputPL based on UNIQUE_IDENTIFIERS.
+    This is an anti-join on hashed row keys (see record_keys): only the key sets are
+    built, never the merged frame, and the Mayor rows keep their original index.
+
+    With reconciled (the ReconciliationState saved when this InputPL was written), the
+    persisted keys replace hashing InputPL, and Mayor rows dated after the watermark are
+    new by definition; only rows up to the watermark are checked against the keys.
+
+    With tolerance_cents > 0, a Mayor row whose Saldo differs from an InputPL row with the
+    same Nº Asiento and Fecha by at most that many cents is also considered present.
+    With return_report=True, returns (missing_records, tolerance_report), where the report
+    lists the Mayor rows that matched only within tolerance.
     """
 
     if input_df is None or mayor_df is None:
         logger.error("Cannot compare: one or both DataFrames are empty.")
-        return None
+        return (None, None) if return_report else None
 
     logger.info(f"Comparing records using identifiers: {UNIQUE_IDENTIFIERS}")
 
-    comparison_df = pd.merge(
-        mayor_df, 
-        input_df[UNIQUE_IDENTIFIERS], 
-        on=UNIQUE_IDENTIFIERS, 
-        how='left', 
-        indicator=True
-    )
+    if reconciled is None:
+        is_missing = ~pd.Index(record_keys(mayor_df)).isin(record_keys(input_df))
+    else:
+        if pd.notna(reconciled.watermark):
+            is_missing = (mayor_df['Fecha'] > reconciled.watermark).to_numpy(copy=True)
+        else:
+            is_missing = np.zeros(len(mayor_df), dtype=bool)
+        to_check = ~is_missing
+        is_missing[to_check] = ~pd.Index(record_keys(mayor_df[to_check])).isin(reconciled.keys)
+        logger.info(
+            f"Incremental comparison: {(~to_check).sum()} Mayor rows after {reconciled.watermark}, "
+            f"{to_check.sum()} checked against {len(reconciled)} reconciled keys"
+        )
 
-    missing_records = comparison_df[comparison_df['_merge'] == 'left_only'].copy()
+    is_missing &= (mayor_df['Nº Asiento'] != 'END').to_numpy()
 
-    missing_records = missing_records.drop(columns=['_merge'])
+    within_tolerance = np.array([], dtype=np.int64)
+    closest_cents = np.array([], dtype=np.int64)
+    if tolerance_cents > 0 and is_missing.any():
+        candidates = np.flatnonzero(is_missing)
+        matched, closest = _match_within_tolerance(input_df, mayor_df.iloc[candidates], tolerance_cents)
+        within_tolerance, closest_cents = candidates[matched], closest[matched]
+        is_missing[within_tolerance] = False
+        if len(within_tolerance):
+            logger.warning(
+                f"{len(within_tolerance)} Mayor rows matched InputPL only within ±{tolerance_cents} cents "
+                f"of Saldo and were not added."
+            )
 
-    missing_records = missing_records[missing_records['Nº Asiento'] != 'END']
+    missing_records = mayor_df[is_missing]
 
     logger.success(f"Comparison finished. Found {len(missing_records)} new records.")
-    
+
+    if return_report:
+        tolerance_report = mayor_df.iloc[within_tolerance][UNIQUE_IDENTIFIERS].copy()
+        tolerance_report['Saldo InputPL'] = closest_cents / 100
+        tolerance_report['Diferencia'] = (to_cents(tolerance_report[AMOUNT_KEY]) - closest_cents) / 100
+        return missing_records, tolerance_report
     return missing_records
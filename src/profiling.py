@@ -0,0 +1,162 @@
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+from src.config import PROFILE_DIR
+from src.logger import get_logger
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = get_logger(__name__)
+
+def process_peak_rss_mib():
+    """
+    Return the peak resident memory of the whole process since it started (not of one stage),
+    in MiB, or None where it is not available (Windows). On a long-lived server this is the
+    server's historical maximum.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KiB on Linux
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def child_cpu_seconds():
+    """User + system CPU time of the finished child processes of the process (e.g. parallel loads)."""
+    times = os.times()
+    return times.children_user + times.children_system
+
+def count_rows(result):
+    """Rows of a stage result: a DataFrame, or the DataFrames in a tuple (e.g. InputPL and Mayor)."""
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, tuple):
+        frames = [item for item in result if isinstance(item, pd.DataFrame)]
+        return sum(len(df) for df in frames) if frames else None
+    return None
+
+class StageRecord:
+    """
+    Wall time, CPU time of the thread running the stage, CPU time of the child processes
+    that finished during it, process peak RSS and rows of one pipeline stage.
+    """
+
+    def __init__(self, name, rows=None, listener=None):
+        self.name = name
+        self.rows = rows
+        self.wall_s = None
+        self.cpu_s = None
+        self.child_cpu_s = None
+        self.process_peak_rss_mib = None
+        self._listener = listener
+
+    def progress(self, done, total):
+        """Report that done of total rows of this stage are processed (e.g. every N rows)."""
+        if self._listener is not None and total:
+            self._listener(self.name, min(done / total, 1.0), done, total)
+
+    def to_dict(self):
+        return {
+            "stage": self.name,
+            "wall_s": self.wall_s,
+            "cpu_s": self.cpu_s,
+            "child_cpu_s": self.child_cpu_s,
+            "process_peak_rss_mib": self.process_peak_rss_mib,
+            "rows": self.rows,
+        }
+
+class RunProfile:
+    """
+    The stages of one pipeline run, in order. Record a stage with the stage() context
+    manager (set record.rows inside it) or wrap a function with track(); the run is then
+    reported as a table (to_frame, format_table) or a JSON report (to_json, save).
+    With a listener, listener(stage, fraction, done=None, total=None) is called when each
+    stage starts (fraction 0) and ends (fraction 1), and on every record.progress(done, total).
+    CPU time is measured on the thread running each stage, so stages of other runs sharing
+    the process (e.g. web sessions on a thread pool) are not counted in it.
+    """
+
+    def __init__(self, label="run", stages=None, listener=None):
+        self.label = label
+        self.started_at = datetime.now()
+        self.stages = list(stages or [])
+        self.listener = listener
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        record = StageRecord(name, rows, self.listener)
+        if self.listener is not None:
+            self.listener(name, 0.0)
+        wall_start, cpu_start, child_start = time.perf_counter(), time.thread_time(), child_cpu_seconds()
+        try:
+            yield record
+            if self.listener is not None:
+                self.listener(name, 1.0)
+        finally:
+            record.wall_s = time.perf_counter() - wall_start
+            record.cpu_s = time.thread_time() - cpu_start
+            record.child_cpu_s = child_cpu_seconds() - child_start
+            record.process_peak_rss_mib = process_peak_rss_mib()
+            self.stages.append(record)
+            logger.info(
+                f"Stage {name}: {record.wall_s:.2f}s wall, {record.cpu_s:.2f}s CPU, "
+                f"{record.child_cpu_s:.2f}s child CPU, rows {record.rows}"
+            )
+
+    def track(self, name=None, rows=count_rows):
+        """Decorator recording each call of a function as a stage; rows is computed from its result."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.stage(name or func.__name__) as record:
+                    result = func(*args, **kwargs)
+                    record.rows = rows(result)
+                return result
+            return wrapper
+        return decorator
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "total_wall_s": sum(stage.wall_s for stage in self.stages),
+            "process_peak_rss_mib": process_peak_rss_mib(),
+            "stages": [stage.to_dict() for stage in self.stages],
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    def to_frame(self):
+        return pd.DataFrame([stage.to_dict() for stage in self.stages],
+                            columns=["stage", "wall_s", "cpu_s", "child_cpu_s", "process_peak_rss_mib", "rows"])
+
+    def format_table(self):
+        """The stages as a fixed-width text table, for the terminal."""
+        lines = [f"{'Stage':<26}{'Wall s':>8}{'CPU s':>8}{'Child s':>9}{'Proc peak MiB':>15}{'Rows':>9}"]
+        for stage in self.stages:
+            peak = f"{stage.process_peak_rss_mib:.0f}" if stage.process_peak_rss_mib is not None else "-"
+            rows = stage.rows if stage.rows is not None else "-"
+            lines.append(
+                f"{stage.name:<26}{stage.wall_s:>8.2f}{stage.cpu_s:>8.2f}{stage.child_cpu_s:>9.2f}{peak:>15}{rows:>9}"
+            )
+        return "\n".join(lines)
+
+    def save(self, report_dir=PROFILE_DIR):
+        """Write the JSON run report to report_dir and return its path, or None if it could not be written."""
+        path = os.path.join(report_dir, f"{self.label}-{self.started_at:%Y%m%d-%H%M%S}.json")
+        try:
+            os.makedirs(report_dir, exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.to_json())
+        except OSError as e:
+            logger.warning(f"Could not write run report: {e}")
+            return None
+        return path
@@ -0,0 +1,101 @@
+import glob
+import os
+import numpy as np
+import pandas as pd
+from src.config import RECONCILIATION_DIR
+from src.frame_cache import file_hash
+from src.logger import get_logger
+from src.processor import record_keys
+
+logger = get_logger(__name__)
+
+RECONCILIATION_VERSION = 2
+MAX_STATES = 20
+
+class ReconciliationState:
+    """
+    The identifier keys (see processor.record_keys) of every row in a reconciled InputPL,
+    and the latest Fecha among them (the watermark).
+    """
+
+    def __init__(self, keys, watermark):
+        self.keys = np.unique(np.asarray(keys, dtype=np.uint64))
+        self.watermark = pd.Timestamp(watermark)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @classmethod
+    def from_frames(cls, *frames):
+        """Build the state from the rows of an InputPL (e.g. the original rows plus the new ones)."""
+        frames = [df for df in frames if df is not None and len(df) > 0]
+        keys = np.concatenate([record_keys(df) for df in frames]) if frames else np.array([], dtype=np.uint64)
+        dates = [pd.to_datetime(df['Fecha'], errors='coerce').max() for df in frames if 'Fecha' in df.columns]
+        dates = [date for date in dates if pd.notna(date)]
+        return cls(keys, max(dates) if dates else pd.NaT)
+
+def _state_path(store_dir, digest):
+    return os.path.join(store_dir, f"recon-{digest}.npz")
+
+def load_reconciliation_state(input_source, store_dir=RECONCILIATION_DIR):
+    """
+    Return the state saved when input_source was written by save_to_excel, or None
+    if this InputPL was not produced by a previous run (or the state is unusable).
+    """
+    try:
+        path = _state_path(store_dir, file_hash(input_source))
+    except OSError:
+        return None
+    if not os.path.exists(path):
+        return None
+
+    try:
+        with np.load(path) as data:
+            if int(data["version"]) != RECONCILIATION_VERSION:
+                raise ValueError("stale state")
+            state = ReconciliationState(data["keys"], data["watermark"][0])
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Discarding unusable reconciliation state {path}: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+    os.utime(path)
+    logger.info(f"Loaded {len(state)} reconciled keys (watermark {state.watermark}) from {path}")
+    return state
+
+def save_reconciliation_state(output, input_df, new_df=None, store_dir=RECONCILIATION_DIR):
+    """
+    Persist the keys of every row of the InputPL written to output (input_df plus new_df)
+    and its Fecha watermark, keyed by the content hash of the written file. output is a
+    path or the buffer returned by save_to_excel(..., in_memory=True).
+    """
+    state = ReconciliationState.from_frames(input_df, new_df)
+    path = _state_path(store_dir, file_hash(output))
+    tmp_path = f"{path}.tmp.npz"
+    try:
+        os.makedirs(store_dir, exist_ok=True)
+        np.savez(tmp_path, version=RECONCILIATION_VERSION, keys=state.keys, watermark=pd.DatetimeIndex([state.watermark]).as_unit("ns").to_numpy())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not persist reconciliation state: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
+
+    _prune_states(store_dir)
+    logger.info(f"Saved {len(state)} reconciled keys (watermark {state.watermark}) to {path}")
+    return state
+
+def _prune_states(store_dir):
+    """
+    Keep only the MAX_STATES most recently used states.
+    """
+    states = sorted(glob.glob(os.path.join(store_dir, "recon-*.npz")), key=os.path.getmtime, reverse=True)
+    for path in states[MAX_STATES:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,112 +1,291 @@
+import time
+import numpy as np
 import pandas as pd
 from src.config import UNIQUE_IDENTIFIERS
+from src.logger import get_logger
 
-def audit_data_quality(df, file_label):
+logger = get_logger(__name__)
+
+NEGATIVE_COLS = ['Debe', 'Haber']
+CRITICAL_COLS = ['Concepto', 'Nº Asiento', 'Fecha']
+# Inconsistent movements share these identifiers but not the Saldo
+PAIR_KEYS = ['Nº Asiento', 'Fecha']
+
+_type_of = np.frompyfunc(type, 1, 1)
+
+def _text_cells(series):
+    """
+    (mask, values) of the string cells of a column, the only ones that can be blank or
+    an END marker once converted with astype(str).
+    """
+    if pd.api.types.is_string_dtype(series) and series.dtype != object:
+        is_text = series.notna().to_numpy()
+    elif series.dtype == object:
+        types = _type_of(series.to_numpy())
+        is_text = np.zeros(len(series), dtype=bool)
+        for value_type in pd.unique(types):
+            if issubclass(value_type, str):
+                is_text |= types == value_type
+    else:
+        is_text = np.zeros(len(series), dtype=bool)
+    return is_text, series[is_text].astype(str)
+
+def _end_mask(df, text_cells=None):
+    """Rows whose Nº Asiento is an END marker (case-insensitive), as a boolean array."""
+    is_end = np.zeros(len(df), dtype=bool)
+    if 'Nº Asiento' in df.columns:
+        is_text, texts = text_cells('Nº Asiento') if text_cells else _text_cells(df['Nº Asiento'])
+        is_end[is_text] = texts.str.upper().eq('END').to_numpy()
+    return is_end
+
+class AuditFrame:
+    """
+    Everything the audit checks share, computed once per DataFrame: the END mask, the
+    numeric coercion of the amount columns and group ids for the identifiers.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self._texts = {}
+        self.is_end = _end_mask(df, self.texts)
+        self.numbers = {
+            col: df[col] if pd.api.types.is_numeric_dtype(df[col]) else pd.to_numeric(df[col], errors='coerce')
+            for col in NEGATIVE_COLS if col in df.columns
+        }
+        self.pair_ids = self.group_ids = None
+        if all(col in df.columns for col in UNIQUE_IDENTIFIERS):
+            self._group_identifiers()
+
+    def texts(self, col):
+        """Cached _text_cells of a column."""
+        if col not in self._texts:
+            self._texts[col] = _text_cells(self.df[col])
+        return self._texts[col]
+
+    def _group_identifiers(self):
+        """
+        Combine the codes of the identifiers one column at a time into pair_ids (PAIR_KEYS)
+        and group_ids (UNIQUE_IDENTIFIERS). Rows that are END markers or miss an identifier
+        get -1, as groupby drops them. Ids are not in key order (see first_in_key_order).
+        """
+        valid = ~self.is_end
+        codes = {}
+        for col in UNIQUE_IDENTIFIERS:
+            codes[col] = pd.factorize(self.df[col])[0]
+            valid &= codes[col] >= 0
+
+        ids = np.zeros(valid.sum(), dtype=np.int64)
+        for col in PAIR_KEYS + [col for col in UNIQUE_IDENTIFIERS if col not in PAIR_KEYS]:
+            code = codes[col][valid].astype(np.int64)
+            # Densify after each step so the combined ids stay below n * cardinality
+            _, ids = np.unique(ids * (code.max(initial=0) + 1) + code, return_inverse=True)
+            if col == PAIR_KEYS[-1]:
+                pair_ids = ids
+        self.pair_ids = np.full(len(self.df), -1, dtype=np.int64)
+        self.group_ids = np.full(len(self.df), -1, dtype=np.int64)
+        self.pair_ids[valid] = pair_ids
+        self.group_ids[valid] = ids
+
+    def first_in_key_order(self, rows):
+        """
+        Of the given row positions, the one whose identifiers sort first (the order of
+        groupby keys, mixed types included).
+        """
+        keys = self.df.iloc[rows]
+        codes = [pd.factorize(keys[col], sort=True)[0] for col in reversed(UNIQUE_IDENTIFIERS)]
+        return rows[np.lexsort(codes)[0]]
+
+    def index_of(self, mask):
+        """DataFrame index labels of the rows in mask, as a NumPy array."""
+        return self.df.index[mask].to_numpy()
+
+# Check ids of AuditFinding
+NEGATIVE_VALUES = "negative_values"
+EMPTY_CELLS = "empty_cells"
+EXACT_DUPLICATES = "exact_duplicates"
+SALDO_INCONSISTENCIES = "saldo_inconsistencies"
+
+MESSAGES = {
+    NEGATIVE_VALUES: "**[{file_label}]** Detectados {count} valores negativos en la columna '{column}' (Filas Excel aprox: {examples}...).",
+    EMPTY_CELLS: " **[{file_label}]** Detectadas {count} celdas vacías en la columna crítica '{column}' (Filas Excel aprox: {examples}...).",
+    EXACT_DUPLICATES: (
+        "**[{file_label}]** Detectados {groups} grupos de duplicados exactos "
+        "(mismo Nº Asiento, Fecha y Saldo) con un total de {count} filas afectadas "
+        "(Filas Excel aprox: {examples}...)."
+    ),
+    SALDO_INCONSISTENCIES: " **[{file_label}]** Detectadas {groups} posibles inconsistencias: Registros con mismo Nº Asiento y Fecha pero diferente Saldo (posibles duplicados con error).",
+}
+
+EXAMPLE_ROWS = 5
+
+class AuditFinding:
+    """
+    One data quality issue: the check that found it, the file and column, how many rows
+    (and groups, for duplicates and inconsistencies) are affected, and the DataFrame index
+    of every affected row. The warning text is only rendered when message is read.
+    """
+
+    def __init__(self, check_id, file_label, rows, column=None, groups=None, examples=None):
+        self.check_id = check_id
+        self.file_label = file_label
+        self.rows = np.asarray(rows)
+        self.column = column
+        self.groups = groups
+        # Rows quoted in the message; by default the first affected ones
+        self.examples = self.rows[:EXAMPLE_ROWS] if examples is None else np.asarray(examples)[:EXAMPLE_ROWS]
+
+    @property
+    def count(self):
+        return len(self.rows)
+
+    @property
+    def excel_rows(self):
+        """Approximate Excel row numbers of the affected rows (header + 1-based)."""
+        return self.rows + 2
+
+    @property
+    def message(self):
+        return MESSAGES[self.check_id].format(
+            file_label=self.file_label, count=self.count, column=self.column,
+            groups=self.groups, examples=(self.examples + 2).tolist(),
+        )
+
+    def __str__(self):
+        return self.message
+
+    def __repr__(self):
+        return f"AuditFinding({self.check_id!r}, {self.file_label!r}, count={self.count}, column={self.column!r})"
+
+def _check_negatives(audit, file_label):
+    findings = []
+    for col, values in audit.numbers.items():
+        negatives = (values < 0).to_numpy()
+        if negatives.any():
+            findings.append(AuditFinding(NEGATIVE_VALUES, file_label, audit.index_of(negatives), column=col))
+    return findings
+
+def _check_empty_cells(audit, file_label):
+    findings = []
+    for col in CRITICAL_COLS:
+        if col not in audit.df.columns:
+            continue
+        empties = audit.df[col].isna().to_numpy(copy=True)
+        is_text, texts = audit.texts(col)
+        empties[is_text] |= texts.str.strip().eq("").to_numpy()
+        if col == 'Nº Asiento':
+            empties &= ~audit.is_end
+        if empties.any():
+            findings.append(AuditFinding(EMPTY_CELLS, file_label, audit.index_of(empties), column=col))
+    return findings
+
+def _check_duplicates(audit, file_label):
+    if audit.group_ids is None:
+        return []
+    rows = np.flatnonzero(audit.group_ids >= 0)
+    _, first, sizes = np.unique(audit.group_ids[rows], return_index=True, return_counts=True)
+    duplicated = sizes > 1
+    if not duplicated.any():
+        return []
+
+    affected = np.zeros(len(audit.df), dtype=bool)
+    affected[rows] = duplicated[audit.group_ids[rows]]
+    # Example rows come from the first duplicated group in key order, as groupby lists them
+    example_row = audit.first_in_key_order(rows[first[duplicated]])
+    example = audit.group_ids == audit.group_ids[example_row]
+    return [AuditFinding(EXACT_DUPLICATES, file_label, audit.index_of(affected),
+                         groups=int(duplicated.sum()), examples=audit.index_of(example))]
+
+def _check_inconsistencies(audit, file_label):
+    if audit.group_ids is None:
+        return []
+    rows = np.flatnonzero(audit.group_ids >= 0)
+    if len(rows) == 0:
+        return []
+    group_ids, pair_ids = audit.group_ids[rows], audit.pair_ids[rows]
+    # One entry per distinct (pair, Saldo) group; a pair with several is inconsistent
+    pair_of_group = np.zeros(group_ids.max() + 1, dtype=np.int64)
+    pair_of_group[group_ids] = pair_ids
+    saldos_per_pair = np.bincount(pair_of_group)
+    inconsistent = saldos_per_pair > 1
+    if not inconsistent.any():
+        return []
+
+    affected = np.zeros(len(audit.df), dtype=bool)
+    affected[rows] = inconsistent[pair_ids]
+    return [AuditFinding(SALDO_INCONSISTENCIES, file_label, audit.index_of(affected), groups=int(inconsistent.sum()))]
+
+AUDIT_CHECKS = [
+    (NEGATIVE_VALUES, _check_negatives),
+    (EMPTY_CELLS, _check_empty_cells),
+    (EXACT_DUPLICATES, _check_duplicates),
+    (SALDO_INCONSISTENCIES, _check_inconsistencies),
+]
+
+def audit_findings(df, file_label):
     """
     Performs a data quality audit on the DataFrame to find potential quality issues.
-    Returns a list of warning messages.
+    The shared work (END mask, numeric columns, identifier groups) is done once in
+    AuditFrame and every check is derived from it.
+    Returns a list of AuditFinding.
     """
-    warnings = []
-    
+    findings = []
+
     if df is None or df.empty:
-        return warnings
-
-    for col in ['Debe', 'Haber']:
-        if col in df.columns:
-            negatives = df[pd.to_numeric(df[col], errors='coerce') < 0]
-            if not negatives.empty:
-                count = len(negatives)
-                rows = (negatives.index + 2).tolist()[:5]
-                warnings.append(f"**[{file_label}]** Detectados {count} valores negativos en la columna '{col}' (Filas Excel aprox: {rows}...).")
-
-    critical_cols = ['Concepto', 'Nº Asiento', 'Fecha']
-    for col in critical_cols:
-        if col in df.columns:
-            empties = df[df[col].isna() | (df[col].astype(str).str.strip() == "")]
-            if col == 'Nº Asiento':
-                empties = empties[empties[col].astype(str).str.upper() != 'END']
-            
-            if not empties.empty:
-                count = len(empties)
-                rows = (empties.index + 2).tolist()[:5]
-                warnings.append(f" **[{file_label}]** Detectadas {count} celdas vacías en la columna crítica '{col}' (Filas Excel aprox: {rows}...).")
-
-
-    if all(c in df.columns for c in UNIQUE_IDENTIFIERS):
-        clean_df = df[df['Nº Asiento'].astype(str).str.upper() != 'END']
-        
-        duplicates = clean_df.groupby(UNIQUE_IDENTIFIERS).size()
-        duplicate_groups = duplicates[duplicates > 1]
-        
-        if not duplicate_groups.empty:
-            count_groups = len(duplicate_groups)
-            total_duplicate_rows = duplicate_groups.sum()
-
-            first_duplicate_key = duplicate_groups.index[0]
-            mask = True
-            for idx, col in enumerate(UNIQUE_IDENTIFIERS):
-                if col == 'Fecha':
-                    mask = mask & (pd.to_datetime(clean_df[col]) == pd.to_datetime(first_duplicate_key[idx]))
-                else:
-                    mask = mask & (clean_df[col] == first_duplicate_key[idx])
-            duplicate_rows = clean_df[mask]
-            example_rows = (duplicate_rows.index + 2).tolist()[:5]
-            
-            warnings.append(
-                f"**[{file_label}]** Detectados {count_groups} grupos de duplicados exactos "
-                f"(mismo Nº Asiento, Fecha y Saldo) con un total de {total_duplicate_rows} filas afectadas "
-                f"(Filas Excel aprox: {example_rows}...)."
-            )
-
-    if all(c in df.columns for c in ['Nº Asiento', 'Fecha', 'Saldo']):
-        clean_df = df[df['Nº Asiento'].astype(str).str.upper() != 'END']
-        inconsistent = clean_df.groupby(['Nº Asiento', 'Fecha'])['Saldo'].nunique()
-        bad_groups = inconsistent[inconsistent > 1]
-        
-        if not bad_groups.empty:
-            count = len(bad_groups)
-            warnings.append(f" **[{file_label}]** Detectadas {count} posibles inconsistencias: Registros con mismo Nº Asiento y Fecha pero diferente Saldo (posibles duplicados con error).")
-
-    return warnings
-
-def remove_exact_duplicates(df, file_label):
+        return findings
+
+    start = time.perf_counter()
+    audit = AuditFrame(df)
+    timings = {"prepare": time.perf_counter() - start}
+    for check_id, check in AUDIT_CHECKS:
+        check_start = time.perf_counter()
+        findings.extend(check(audit, file_label))
+        timings[check_id] = time.perf_counter() - check_start
+
+    logger.info(f"Audited {file_label} ({len(df)} rows): " + ", ".join(f"{name} {elapsed:.3f}s" for name, elapsed in timings.items()))
+    return findings
+
+def audit_data_quality(df, file_label):
+    """
+    Performs a data quality audit on the DataFrame to find potential quality issues.
+    Returns a list of warning messages (see audit_findings for the structured results).
+    """
+    return [finding.message for finding in audit_findings(df, file_label)]
+
+def remove_exact_duplicates(df, file_label, return_removed=False):
     """
     Removes exact duplicates (same Nº Asiento, Fecha and Saldo) from the DataFrame.
-    Keeps only the first occurrence of each duplicate group.
+    Keeps only the first occurrence of each duplicate group; END rows are never removed.
+    This is a single boolean mask (duplicated() on the identifiers, minus END rows), so
+    the remaining rows keep their order without concatenating or sorting.
     
     Args:
         df: DataFrame to clean
         file_label: File label for informative messages
+        return_removed: Also return the index of the removed rows (for audit)
     
     Returns:
-        tuple: (df_cleaned, removed_count, summary_message)
+        tuple: (df_cleaned, removed_count, summary_message[, removed_index])
             - df_cleaned: DataFrame without duplicates
             - removed_count: Number of rows removed
             - summary_message: Summary message of what was removed
+            - removed_index: Index labels of the removed rows as a NumPy array (only with return_removed)
     """
-    if df is None or df.empty:
-        return df, 0, ""
-    
-    if not all(c in df.columns for c in UNIQUE_IDENTIFIERS):
-        return df, 0, ""
-  
-    original_size = len(df)
-
-    end_mask = df['Nº Asiento'].astype(str).str.upper() == 'END'
-    end_rows = df[end_mask].copy() if end_mask.any() else pd.DataFrame()
-    clean_df = df[~end_mask].copy()
+    removed = np.array([], dtype=np.int64)
+    if df is None or df.empty or not all(c in df.columns for c in UNIQUE_IDENTIFIERS):
+        return (df, 0, "", removed) if return_removed else (df, 0, "")
 
-    df_cleaned = clean_df.drop_duplicates(subset=UNIQUE_IDENTIFIERS, keep='first')
+    # END rows can only collide with other END rows, so they don't change which rows are duplicates
+    is_duplicate = df.duplicated(subset=UNIQUE_IDENTIFIERS, keep='first').to_numpy() & ~_end_mask(df)
+    removed_count = int(is_duplicate.sum())
 
-    if not end_rows.empty:
-        df_cleaned = pd.concat([df_cleaned, end_rows], ignore_index=False)
-        df_cleaned = df_cleaned.sort_index()
-    
-    removed_count = original_size - len(df_cleaned)
-    
     if removed_count > 0:
+        df_cleaned = df[~is_duplicate]
+        removed = df.index[is_duplicate].to_numpy()
         summary_message = f"[{file_label}] Se eliminaron {removed_count} duplicados exactos automáticamente."
     else:
+        df_cleaned = df
         summary_message = ""
-    
+
+    if return_removed:
+        return df_cleaned, removed_count, summary_message, removed
     return df_cleaned, removed_count, summary_message
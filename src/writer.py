@@ -1,118 +1,467 @@
+import bisect
+import io
+import math
 import openpyxl
-from openpyxl.styles import PatternFill
+from openpyxl.cell.cell import Cell
+from openpyxl.cell.read_only import EMPTY_CELL
+from openpyxl.formatting.formatting import ConditionalFormatting, ConditionalFormattingList
+from openpyxl.styles import NamedStyle, PatternFill
+from openpyxl.worksheet.cell_range import MultiCellRange
 import os
-from src.config import OUTPUT_FILE, INPUT_PL_FILE, INPUT_PL_COLS
+import pandas as pd
+from src.config import OUTPUT_FILE, INPUT_PL_FILE, INPUT_PL_COLS, STREAMING_WRITE
 from src.logger import get_logger
 
 logger = get_logger(__name__)
 
-def save_to_excel(classified_df, template_path, input_df=None):
+AMOUNT_COLS = ['Debe', 'Haber', 'Saldo', 'Neto']
+LOW_CONFIDENCE = 80
+# Rows written between two progress reports of save_to_excel
+PROGRESS_ROWS = 5000
+
+# Number format of each formatted column of the new rows
+NUMBER_FORMATS = {'Fecha': 'DD/MM/YYYY', 'Mes': '@', **{col: '#,##0.00' for col in AMOUNT_COLS}}
+WARNING_FILL = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
+
+class SheetIndex:
     """
-    Open the original Excel, find the END row, and insert new data with styling.
-    If input_df is provided, also rewrite existing rows to fix corrupted values.
+    Layout of an InputPL sheet, built once: END rows (from a single pass over column A),
+    the row where new data goes and the column of each INPUT_PL_COLS name.
+    Columns are taken from the header; names missing from it keep their INPUT_PL_COLS position,
+    or go after the last header column if that position is already taken.
     """
-    if classified_df is None or len(classified_df) == 0:
-        logger.info("No data to write.")
-        return
 
+    def __init__(self, sheet):
+        self.end_rows = [
+            row_idx for row_idx, (value,) in enumerate(sheet.iter_rows(max_col=1, values_only=True), start=1)
+            if _is_end(value)
+        ]
+
+        header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+        self.columns = _header_columns(header)
+        self.max_row = sheet.max_row
+
+    @property
+    def insert_row(self):
+        """First END row, or the row after the last one when there is no END marker."""
+        return self.end_rows[0] if self.end_rows else self.max_row + 1
+
+def _header_columns(header):
+    """Map each INPUT_PL_COLS name to its sheet column, as described in SheetIndex."""
+    columns = {}
+    for col_idx, name in enumerate(header, start=1):
+        if name is not None and str(name).strip() in INPUT_PL_COLS:
+            columns.setdefault(str(name).strip(), col_idx)
+    used = set(columns.values())
+    next_free = len(header) + 1
+    for col_idx, col_name in enumerate(INPUT_PL_COLS, start=1):
+        if col_name in columns:
+            continue
+        if col_idx in used:
+            col_idx, next_free = next_free, next_free + 1
+        columns[col_name] = col_idx
+        used.add(col_idx)
+    return columns
+
+def _is_end(value):
+    return isinstance(value, str) and value.strip().upper() == 'END'
+
+def _new_row_styles(wb):
+    """
+    Register (or reuse) the named styles of the new rows and return their style arrays,
+    keyed by (number_format, highlighted). Unformatted, non-highlighted cells have no style.
+    """
+    styles = {}
+    for number_format in set(NUMBER_FORMATS.values()) | {None}:
+        for highlighted in (False, True):
+            if number_format is None and not highlighted:
+                styles[(None, False)] = None
+                continue
+            name = f"CFO {number_format or 'General'}{' revisar' if highlighted else ''}"
+            if name not in wb.named_styles:
+                style = NamedStyle(name=name)
+                if number_format:
+                    style.number_format = number_format
+                if highlighted:
+                    style.fill = WARNING_FILL
+                wb.add_named_style(style)
+            named_style = wb._named_styles[name]
+            styles[(number_format, highlighted)] = named_style.as_tuple()
+    return styles
+
+def _column_values(col_name, series):
+    """
+    Convert a column of new rows to the plain Python values written to the sheet.
+    """
+    if col_name == 'Fecha':
+        return [None if pd.isna(value) else value.to_pydatetime() if hasattr(value, 'to_pydatetime') else value
+                for value in series.tolist()]
+    if col_name == 'Mes':
+        return [str(value) if value else "" for value in series.tolist()]
+    return series.tolist()
+
+def _new_rows(wb, classified_df, columns=None):
+    """
+    Yield the cells of each classified row as ((column, style array), value) pairs, with the
+    styles registered in wb by _new_row_styles.
+    """
+    styles = _new_row_styles(wb)
+    if columns is None:
+        columns = {col_name: col_idx for col_idx, col_name in enumerate(INPUT_PL_COLS, start=1)}
+    columns = [(columns[col_name], col_name) for col_name in INPUT_PL_COLS if col_name in classified_df.columns]
+    rows = zip(*(_column_values(col_name, classified_df[col_name]) for _, col_name in columns))
+
+    if 'Confidence' in classified_df.columns:
+        highlighted = (classified_df['Confidence'] < LOW_CONFIDENCE).tolist()
+    else:
+        highlighted = [False] * len(classified_df)
+
+    row_styles = {
+        flag: [(col_idx, styles[(NUMBER_FORMATS.get(col_name), flag)]) for col_idx, col_name in columns]
+        for flag in (False, True)
+    }
+    for values, flag in zip(rows, highlighted):
+        yield zip(row_styles[flag], values)
+
+def _write_new_rows(wb, sheet, classified_df, start_row, columns=None, progress=None):
+    """
+    Write the classified rows starting at start_row in bulk: the DataFrame is converted to
+    row tuples once and every cell gets a copy of a shared named style (number format and,
+    below LOW_CONFIDENCE, the warning fill). columns maps names to sheet columns
+    (SheetIndex.columns); by default INPUT_PL_COLS positions are used.
+    With progress, progress(done, total) is called every PROGRESS_ROWS rows.
+    """
+    cells = sheet._cells
+    for done, row in enumerate(_new_rows(wb, classified_df, columns), start=1):
+        row_idx = start_row + done - 1
+        for (col_idx, style), value in row:
+            cells[(row_idx, col_idx)] = Cell(sheet, row=row_idx, column=col_idx, value=value, style_array=style)
+        if progress is not None and done % PROGRESS_ROWS == 0:
+            progress(done, len(classified_df))
+
+def _is_empty(value):
+    return value is None or value == "" or (isinstance(value, float) and math.isnan(value))
+
+def _same_value(current, value):
+    """Whether a cell already holds value (empty, None, '' and NaN are all the same)."""
+    if _is_empty(current) or _is_empty(value):
+        return _is_empty(current) and _is_empty(value)
+    if isinstance(current, bool) != isinstance(value, bool):
+        return False
+    try:
+        return bool(current == value)
+    except (TypeError, ValueError):
+        return False
+
+def _rewrite_existing_rows(sheet, input_df, index):
+    """
+    Rewrite the rows above the insertion point from the normalized input_df (DataFrame row i
+    is sheet row i + 2) to fix corrupted values, such as 'dic/99' in Mes. Only cells whose
+    value or number format differ are touched. Returns (rewritten cells, compared cells).
+    """
+    rows = input_df.iloc[:max(index.insert_row - 2, 0)]
+    skip = rows['Nº Asiento'].astype(str).str.strip().str.upper().eq('END').tolist() \
+        if 'Nº Asiento' in rows.columns else [False] * len(rows)
+
+    cells = sheet._cells
+    rewritten = compared = 0
+    for col_name in INPUT_PL_COLS:
+        if col_name not in rows.columns:
+            continue
+        col_idx = index.columns[col_name]
+        number_format = NUMBER_FORMATS.get(col_name)
+        for row_idx, (value, skipped) in enumerate(zip(_column_values(col_name, rows[col_name]), skip), start=2):
+            if skipped:
+                continue
+            compared += 1
+            cell = cells.get((row_idx, col_idx))
+            fix_format = number_format and not (col_name == 'Fecha' and value is None)
+            if cell is None:
+                if _is_empty(value):
+                    continue
+                cell = sheet.cell(row=row_idx, column=col_idx)
+            elif _same_value(cell.value, value) and (not fix_format or cell.number_format == number_format):
+                continue
+            rewritten += 1
+            if not _same_value(cell.value, value):
+                cell.value = value
+            if fix_format:
+                cell.number_format = number_format
+    return rewritten, compared
+
+def _relayout_bounds(min_row, max_row, end_rows, amount):
+    """
+    New (min_row, max_row) of a row span after _relayout_rows, or None if it only held END rows.
+    A span that contains the first END row grows by the inserted rows.
+    """
+    if min_row >= end_rows[0]:
+        min_row += amount - bisect.bisect_left(end_rows, min_row)
+    if max_row >= end_rows[0]:
+        max_row += amount - bisect.bisect_right(end_rows, max_row)
+    return (min_row, max_row) if min_row <= max_row else None
+
+def _relayout_ranges(ranges, end_rows, amount):
+    """Move the cell ranges of a MultiCellRange like _relayout_rows moves rows, dropping emptied ones."""
+    moved = []
+    for cell_range in ranges:
+        bounds = _relayout_bounds(cell_range.min_row, cell_range.max_row, end_rows, amount)
+        if bounds is not None:
+            cell_range.min_row, cell_range.max_row = bounds
+            moved.append(cell_range)
+    return MultiCellRange(moved)
+
+def _relayout_sheet_ranges(sheet, end_rows, amount):
+    """
+    Move the row-based structures that openpyxl keeps apart from the cells: merged ranges,
+    data validations, conditional formats and row dimensions (heights, hidden rows).
+    """
+    sheet.merged_cells = _relayout_ranges(sheet.merged_cells.ranges, end_rows, amount)
+
+    validations = sheet.data_validations.dataValidation
+    for validation in validations:
+        validation.sqref = _relayout_ranges(validation.sqref.ranges, end_rows, amount)
+    sheet.data_validations.dataValidation = [validation for validation in validations if validation.sqref]
+
+    conditional_formatting = ConditionalFormattingList()
+    for formatting in sheet.conditional_formatting:
+        sqref = _relayout_ranges(formatting.sqref.ranges, end_rows, amount)
+        for rule in formatting.rules if sqref else ():
+            conditional_formatting.add(ConditionalFormatting(sqref), rule)
+    sheet.conditional_formatting = conditional_formatting
+
+    dimensions = list(sheet.row_dimensions.items())
+    sheet.row_dimensions.clear()
+    for row, dimension in dimensions:
+        bounds = _relayout_bounds(row, row, end_rows, amount)
+        if bounds is not None:
+            dimension.index = bounds[0]
+            sheet.row_dimensions[bounds[0]] = dimension
+
+def _relayout_rows(sheet, end_rows, amount):
+    """
+    Open `amount` empty rows at the first END row and drop every END row, in one pass over
+    the cells (insert_rows/delete_rows shift all cells below on every call).
+    A row r below the first END ends up at r + amount - (END rows above r); cells keep their
+    styles and hyperlinks, and merged ranges, data validations, conditional formats and row
+    dimensions are moved with their rows (see _relayout_sheet_ranges).
+    """
+    end_rows = sorted(end_rows)
+    first_end = end_rows[0]
+    dropped = set(end_rows)
+    cells = {}
+    for (row, col), cell in sheet._cells.items():
+        if row < first_end:
+            cells[(row, col)] = cell
+        elif row not in dropped:
+            cell.row = row + amount - bisect.bisect_left(end_rows, row)
+            cells[(cell.row, col)] = cell
+            if cell.hyperlink:
+                cell.hyperlink.ref = cell.coordinate
+    sheet._cells = cells
+    _relayout_sheet_ranges(sheet, end_rows, amount)
+
+def _style_id(cell):
+    """Style index of a read-only cell; 0 (no style) for the EMPTY_CELL filler."""
+    return getattr(cell, '_style_id', 0)
+
+class _StyleMap:
+    """
+    Copy the styles of read-only cells into a write-only workbook. Each distinct source style
+    (optionally with a number format override) is registered once and reused. Relies on the
+    openpyxl internals _style_id and _style (openpyxl is pinned in requirements.txt).
+    """
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+        self.styles = {}
+
+    def __call__(self, cell, number_format=None):
+        key = (_style_id(cell), number_format)
+        if key not in self.styles:
+            target = Cell(self.sheet)
+            if key[0]:
+                target.font = cell.font
+                target.fill = cell.fill
+                target.border = cell.border
+                target.alignment = cell.alignment
+                target.protection = cell.protection
+                target.number_format = cell.number_format
+            if number_format:
+                target.number_format = number_format
+            self.styles[key] = target._style if target.has_style else None
+        return self.styles[key]
+
+def _copy_row(sheet, row, style_of, overrides=()):
+    """
+    Build a write-only row from the cells of a read-only row. overrides holds
+    (column, value, number format) triples from the normalized data, applied like
+    _rewrite_existing_rows does.
+    """
+    values = [None] * max(len(row), max((col_idx for col_idx, _, _ in overrides), default=0))
+    for col_idx, cell in enumerate(row, start=1):
+        if cell.value is None and not _style_id(cell):
+            continue
+        values[col_idx - 1] = Cell(sheet, column=col_idx, value=cell.value, style_array=style_of(cell))
+    for col_idx, value, number_format in overrides:
+        source = row[col_idx - 1] if col_idx <= len(row) else EMPTY_CELL
+        if source is EMPTY_CELL and _is_empty(value):
+            continue
+        if _same_value(source.value, value):
+            value = source.value
+        values[col_idx - 1] = Cell(sheet, column=col_idx, value=value, style_array=style_of(source, number_format))
+    return values
+
+def _rewrite_values(input_df, columns):
+    """
+    The (column, value, number format) triples of each existing row (DataFrame row i is
+    sheet row i + 2) for the streaming writer; END rows of input_df get none.
+    """
+    if input_df is None:
+        return []
+    names = [col_name for col_name in INPUT_PL_COLS if col_name in input_df.columns]
+    if not names:
+        return []
+    skip = input_df['Nº Asiento'].astype(str).str.strip().str.upper().eq('END').tolist() \
+        if 'Nº Asiento' in input_df.columns else [False] * len(input_df)
+    rows = zip(*(_column_values(col_name, input_df[col_name]) for col_name in names))
+    return [
+        [] if skipped else [
+            (columns[col_name], value,
+             None if col_name == 'Fecha' and value is None else NUMBER_FORMATS.get(col_name))
+            for col_name, value in zip(names, values)
+        ]
+        for values, skipped in zip(rows, skip)
+    ]
+
+def _stream_to_excel(classified_df, template_path, input_df, output_path, progress=None):
+    """
+    Write the output with a write-only workbook while reading the template in read-only mode,
+    so neither sheet is held in memory. The layout is the same as _update_template: the rows
+    above the first END (rewritten from input_df when given), the new rows and the rows below,
+    without any END row; without END the new rows go after the last row. Other sheets are
+    copied as they are. Cell values and styles are kept; column widths,
+    merged cells and other sheet-level settings are not.
+    With progress, progress(done, total) is called every PROGRESS_ROWS rows of the InputPL sheet,
+    total being estimated from the template's declared dimensions.
+    """
+    source = openpyxl.load_workbook(template_path, read_only=True, data_only=True, keep_vba=False)
+    wb = openpyxl.Workbook(write_only=True)
+    try:
+        for template_sheet in source.worksheets:
+            sheet = wb.create_sheet(template_sheet.title)
+            style_of = _StyleMap(sheet)
+            expected_rows = (template_sheet.max_row or 0) + len(classified_df)
+            template_sheet.reset_dimensions()
+            if template_sheet.title != source.active.title:
+                for row in template_sheet.iter_rows():
+                    sheet.append(_copy_row(sheet, row, style_of))
+                continue
+
+            written = 0
+
+            def append(values):
+                nonlocal written
+                sheet.append(values)
+                written += 1
+                if progress is not None and written % PROGRESS_ROWS == 0:
+                    progress(written, max(expected_rows, written))
+
+            rows = template_sheet.iter_rows()
+            header = next(rows, ())
+            append(_copy_row(sheet, header, style_of))
+            columns = _header_columns([cell.value for cell in header])
+            rewrites = _rewrite_values(input_df, columns)
+
+            def append_new_rows():
+                for row in _new_rows(wb, classified_df, columns):
+                    values = []
+                    for (col_idx, style), value in row:
+                        values.extend([None] * (col_idx - len(values)))
+                        values[col_idx - 1] = Cell(sheet, column=col_idx, value=value, style_array=style)
+                    append(values)
+
+            found_end = False
+            for row_idx, row in enumerate(rows, start=2):
+                if row and _is_end(row[0].value):
+                    if not found_end:
+                        found_end = True
+                        append_new_rows()
+                    continue
+                overrides = rewrites[row_idx - 2] if not found_end and row_idx - 2 < len(rewrites) else ()
+                append(_copy_row(sheet, row, style_of, overrides))
+            if not found_end:
+                logger.warning("Could not find 'END' row. Writing at the end of the sheet.")
+                append_new_rows()
+        wb.save(output_path)
+    finally:
+        source.close()
+
+def _update_template(classified_df, template_path, input_df, output, progress=None):
+    """
+    Load the whole template, rewrite existing rows, lay out the new rows in place and save.
+    With progress, progress(done, total) counts the existing rows once they are rewritten,
+    then every PROGRESS_ROWS new rows.
+    """
     logger.info(f"Opening template: {template_path}")
     wb = openpyxl.load_workbook(template_path, data_only=True, keep_vba=False)
     sheet = wb.active
 
-    end_rows = []
-    for row in range(1, sheet.max_row + 1):
-        cell_val = str(sheet.cell(row=row, column=1).value).strip().upper()
-        if cell_val == 'END':
-            end_rows.append(row)
+    index = SheetIndex(sheet)
+    end_row = index.insert_row
 
-    if not end_rows:
-        end_row = sheet.max_row + 1
-        first_end_row = end_row
+    if not index.end_rows:
         logger.warning("Could not find 'END' row. Writing at the end of the sheet.")
+    elif len(index.end_rows) > 1:
+        logger.info(f"Found {len(index.end_rows)} 'END' rows. Removing all of them; new rows go at row {end_row}.")
     else:
-        first_end_row = min(end_rows)
-        end_row = first_end_row
-        
-        if len(end_rows) > 1:
-            logger.info(f"Found {len(end_rows)} 'END' rows. Removing all except the first one at row {first_end_row}.")
-            for row_to_delete in sorted(end_rows[1:], reverse=True):
-                sheet.delete_rows(row_to_delete)
-            logger.info(f"Cleaned up. Using 'END' at row {end_row} as insertion point.")
-        else:
-            logger.info(f"Found 'END' at row {end_row}. Inserting {len(classified_df)} rows...")
-    
-   
-    if input_df is not None and first_end_row > 2:  
-        logger.info(f"Fixing existing rows (1 to {first_end_row-1}) from normalized DataFrame...")
-        for df_idx, (_, row_data) in enumerate(input_df.iterrows(), start=2):  
-            if df_idx >= first_end_row:
-                break
-            if str(row_data.get('Nº Asiento', '')).strip().upper() == 'END':
-                continue
-            for col_idx, col_name in enumerate(INPUT_PL_COLS, start=1):
-                if col_name in row_data:
-                    cell_value = row_data[col_name]
-                    cell = sheet.cell(row=df_idx, column=col_idx)
-
-                    if col_name == 'Fecha' and hasattr(cell_value, 'to_pydatetime'):
-                        cell.value = cell_value.to_pydatetime()
-                        cell.number_format = 'DD/MM/YYYY'
-                    elif col_name == 'Mes':
-                      
-                        cell.number_format = '@'
-                        cell.value = str(cell_value) if cell_value else ""
-                    elif col_name in ['Debe', 'Haber', 'Saldo', 'Neto']:
-                        cell.value = cell_value
-                        cell.number_format = '#,##0.00'
-                    else:
-                        cell.value = cell_value
-
-    sheet.insert_rows(end_row, amount=len(classified_df))
-
-    end_row_after_insert = end_row + len(classified_df)
-    if end_row_after_insert <= sheet.max_row:
-        cell_val_after = str(sheet.cell(row=end_row_after_insert, column=1).value).strip().upper()
-        if cell_val_after == 'END':
-            logger.info(f"Removing intermediate 'END' row at {end_row_after_insert} (now in the middle after insertion).")
-            sheet.delete_rows(end_row_after_insert)
-
-    warning_fill = PatternFill(start_color="FFF2CC", end_color="FFF2CC", fill_type="solid")
-
-    for i, (index, row_data) in enumerate(classified_df.iterrows()):
-        current_row = end_row + i
-
-        for col_idx, col_name in enumerate(INPUT_PL_COLS, start=1):
-            if col_name in row_data:
-                cell_value = row_data[col_name]
-
-                if col_name == 'Fecha' and hasattr(cell_value, 'to_pydatetime'):
-                    cell_value = cell_value.to_pydatetime()
-                
-            
-                cell = sheet.cell(row=current_row, column=col_idx)
-
-                if col_name == 'Fecha':
-                    cell.value = cell_value
-                    cell.number_format = 'DD/MM/YYYY'
-                
-                elif col_name == 'Mes':
-                    
-                    cell.number_format = '@' 
-                    cell.value = str(cell_value) if cell_value else ""
-                
-                elif col_name in ['Debe', 'Haber', 'Saldo', 'Neto']:
-                    cell.value = cell_value
-                    cell.number_format = '#,##0.00'
-                else:
-                    cell.value = cell_value
-
-                if row_data.get('Confidence', 100) < 80:
-                    cell.fill = warning_fill
-
-    output_dir = os.path.dirname(OUTPUT_FILE)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    logger.info(f"Saving results to: {OUTPUT_FILE}")
-    wb.save(OUTPUT_FILE)
-    logger.success("Process completed! Check the output folder.")
+        logger.info(f"Found 'END' at row {end_row}. Inserting {len(classified_df)} rows...")
+
+    if input_df is not None and end_row > 2:
+        logger.info(f"Fixing existing rows (1 to {end_row - 1}) from normalized DataFrame...")
+        rewritten, compared = _rewrite_existing_rows(sheet, input_df, index)
+        logger.info(f"Rewrote {rewritten} of {compared} existing cells that differed from the normalized data.")
+
+    if index.end_rows:
+        _relayout_rows(sheet, index.end_rows, len(classified_df))
+
+    report = None
+    if progress is not None:
+        existing, total = end_row - 2, end_row - 2 + len(classified_df)
+        progress(existing, total)
+
+        def report(done, _):
+            progress(existing + done, total)
+    _write_new_rows(wb, sheet, classified_df, end_row, index.columns, progress=report)
+    wb.save(output)
+
+def save_to_excel(classified_df, template_path, input_df=None, streaming=STREAMING_WRITE, in_memory=False,
+                  output_path=OUTPUT_FILE, progress=None):
+    """
+    Open the original Excel, find the END row, and insert new data with styling.
+    If input_df is provided, also rewrite existing rows to fix corrupted values.
+    With streaming=True the output is streamed row by row instead (see _stream_to_excel).
+    The workbook is saved to output_path (OUTPUT_FILE by default). With in_memory=True nothing
+    is written: the workbook is returned as a BytesIO buffer (e.g. for a download button).
+    With progress, progress(done, total) is called as rows are written (every PROGRESS_ROWS rows).
+    """
+    if classified_df is None or len(classified_df) == 0:
+        logger.info("No data to write.")
+        return
+
+    if in_memory:
+        output = io.BytesIO()
+    else:
+        output = output_path
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+    if streaming:
+        logger.info(f"Streaming {len(classified_df)} new rows from template {template_path}...")
+        _stream_to_excel(classified_df, template_path, input_df, output, progress)
+    else:
+        _update_template(classified_df, template_path, input_df, output, progress)
+
+    if in_memory:
+        logger.success("Process completed! The updated workbook is ready in memory.")
+        output.seek(0)
+        return output
+    logger.success(f"Process completed! Results saved to: {output_path}")
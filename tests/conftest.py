@@ -1,9 +1,11 @@
 """
 Shared fixtures for all tests.
 """
+import openpyxl
 import pandas as pd
 import pytest
 from datetime import datetime
+from src.config import INPUT_PL_COLS
 
 
 @pytest.fixture
@@ -89,3 +91,28 @@ def df_with_negative_values():
         'Concepto': ['A', 'B', 'C']
     })
 
+
+def write_workbook(path, header, rows):
+    """Write a single-sheet Excel file with a header row."""
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    sheet.append(header)
+    for row in rows:
+        sheet.append(row)
+    wb.save(path)
+
+
+@pytest.fixture
+def workbooks(tmp_path):
+    """InputPL and Mayor files with an END row."""
+    input_path = tmp_path / "InputPL.xlsx"
+    mayor_path = tmp_path / "Mayor.xlsx"
+    write_workbook(input_path, INPUT_PL_COLS, [
+        [1, datetime(2025, 1, 15), 'DOC1', 'Amazon', 600, 100.5, 0, 100.5, 'Cuenta', -100.5, 'ene/25', 'IT', None],
+        ['END'] + [None] * 12,
+    ])
+    write_workbook(mayor_path, ['Nº Asiento', 'Fecha', 'Concepto', 'Saldo', 'Net', 'Month'], [
+        [1, datetime(2025, 1, 15), 'Amazon', 100.5, -100.5, datetime(2025, 1, 1)],
+        [2, datetime(2025, 2, 10), 'Taxi', 20, -20, datetime(2025, 2, 1)],
+    ])
+    return str(input_path), str(mayor_path)
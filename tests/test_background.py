@@ -0,0 +1,58 @@
+"""
+Unit tests for running the pipeline off the UI thread.
+"""
+import threading
+import pytest
+from src.background import BackgroundRun, ProgressState
+
+
+class TestProgressState:
+    """Tests for the progress shared between the worker and the UI."""
+
+    def test_snapshot_before_any_event(self):
+        """Test: nothing reported yet means no stage and no progress."""
+        assert ProgressState(["a", "b"]).snapshot() == {"stage": None, "fraction": 0.0, "rows": None, "overall": 0.0}
+
+    def test_overall_fraction_weighs_stages_equally(self):
+        """Test: halfway through the second of two stages is 75% overall, with its rows."""
+        progress = ProgressState(["a", "b"])
+        progress("a", 1.0)
+        progress("b", 0.5, 50, 100)
+
+        snapshot = progress.snapshot()
+        assert snapshot["stage"] == "b"
+        assert snapshot["rows"] == (50, 100)
+        assert snapshot["overall"] == pytest.approx(0.75)
+
+
+class TestBackgroundRun:
+    """Tests for BackgroundRun."""
+
+    def test_runs_in_another_thread_with_listener(self):
+        """Test: the function runs in a worker thread, its progress is visible and its result returned."""
+        started, release = threading.Event(), threading.Event()
+
+        def job(value, listener):
+            listener("a", 0.5, 5, 10)
+            started.set()
+            release.wait(5)
+            return value * 2, threading.current_thread().name
+
+        run = BackgroundRun(job, ["a"], 21)
+        assert started.wait(5)
+        assert not run.done()
+        assert run.snapshot()["rows"] == (5, 10)
+
+        release.set()
+        result, thread_name = run.result()
+        assert result == 42
+        assert thread_name.startswith("pipeline") and run.done()
+
+    def test_exception_is_raised_by_result(self):
+        """Test: an error in the worker is raised again when the result is read."""
+        def job(listener):
+            raise ValueError("Formato incorrecto")
+
+        run = BackgroundRun(job, ["a"])
+        with pytest.raises(ValueError, match="Formato incorrecto"):
+            run.result()
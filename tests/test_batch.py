@@ -0,0 +1,111 @@
+"""
+Unit tests for reconciling many companies in one batch.
+"""
+import os
+import shutil
+import pandas as pd
+import pytest
+from src.batch import CompanyJob, discover_jobs, read_manifest, run_batch, run_company, save_summary
+
+
+@pytest.fixture
+def companies(tmp_path, workbooks, monkeypatch):
+    """A companies directory with two complete companies and one without a Mayor."""
+    monkeypatch.chdir(tmp_path)
+    input_path, mayor_path = workbooks
+    for company in ("acme", "globex"):
+        os.makedirs(tmp_path / "companies" / company)
+        shutil.copy(input_path, tmp_path / "companies" / company / "InputPL.xlsx")
+        shutil.copy(mayor_path, tmp_path / "companies" / company / "Mayor_2025.xlsx")
+    os.makedirs(tmp_path / "companies" / "initech")
+    shutil.copy(input_path, tmp_path / "companies" / "initech" / "InputPL.xlsx")
+    return str(tmp_path / "companies")
+
+
+class TestJobs:
+    """Tests for finding the companies to reconcile."""
+
+    def test_discover_jobs(self, companies, tmp_path):
+        """Test: one job per company directory, incomplete ones marked as failed."""
+        jobs = discover_jobs(companies, "out")
+
+        assert [job.company for job in jobs] == ["acme", "globex", "initech"]
+        assert jobs[0].mayor_path.endswith("Mayor_2025.xlsx")
+        assert jobs[0].output_path == os.path.join("out", "acme", "InputPL_Updated.xlsx")
+        assert jobs[0].error is None and jobs[2].error is not None
+
+    def test_discover_jobs_missing_directory(self, tmp_path):
+        """Test: a missing directory raises ValueError."""
+        with pytest.raises(ValueError):
+            discover_jobs(str(tmp_path / "missing"), "out")
+
+    def test_read_manifest(self, tmp_path):
+        """Test: manifest paths are relative to the manifest, the default output to output_dir."""
+        manifest = tmp_path / "clients" / "manifest.csv"
+        os.makedirs(manifest.parent)
+        manifest.write_text("company,input_pl,mayor,output\nacme,a/InputPL.xlsx,a/Mayor.xlsx,\nglobex,g/In.xlsx,g/May.xlsx,g/Out.xlsx\n")
+
+        jobs = read_manifest(str(manifest), "out")
+
+        assert jobs[0].input_path == os.path.join(str(manifest.parent), "a/InputPL.xlsx")
+        assert jobs[0].output_path == os.path.join("out", "acme", "InputPL_Updated.xlsx")
+        assert jobs[1].output_path == os.path.join(str(manifest.parent), "g/Out.xlsx")
+
+    def test_read_manifest_missing_columns(self, tmp_path):
+        """Test: a manifest without the mayor column raises ValueError."""
+        manifest = tmp_path / "manifest.csv"
+        manifest.write_text("company,input_pl\nacme,InputPL.xlsx\n")
+        with pytest.raises(ValueError):
+            read_manifest(str(manifest), "out")
+
+
+class TestRunBatch:
+    """Tests for running the batch and its summary."""
+
+    def test_failures_do_not_stop_the_batch(self, companies):
+        """Test: every company gets a summary row, in job order, with its own status."""
+        results = run_batch(discover_jobs(companies, "out"), workers=1, duplicates="keep", parallel_load=False)
+
+        assert [(r["company"], r["status"]) for r in results] == [
+            ("acme", "updated"), ("globex", "updated"), ("initech", "error"),
+        ]
+        assert results[0]["new_rows"] == 1
+        assert os.path.exists(os.path.join("out", "acme", "InputPL_Updated.xlsx"))
+
+    def test_process_pool(self, companies):
+        """Test: the process pool returns the same results as the sequential run."""
+        results = run_batch(discover_jobs(companies, "out"), workers=2, duplicates="keep")
+
+        assert [(r["company"], r["status"], r.get("new_rows")) for r in results] == [
+            ("acme", "updated", 1), ("globex", "updated", 1), ("initech", "error", None),
+        ]
+
+    def test_caches_are_scoped_per_company(self, companies):
+        """Test: each company's caches live next to its output, not in the shared data/cache."""
+        run_batch(discover_jobs(companies, "out"), workers=1, duplicates="keep", parallel_load=False)
+
+        for company in ("acme", "globex"):
+            cache_dir = os.path.join("out", company, "cache")
+            assert len(os.listdir(os.path.join(cache_dir, "frames"))) == 2
+            assert len(os.listdir(os.path.join(cache_dir, "knowledge_base"))) == 1
+            assert len(os.listdir(os.path.join(cache_dir, "reconciliation"))) == 1
+        assert not os.path.exists(os.path.join("data", "cache"))
+
+    def test_missing_file_reported(self, tmp_path):
+        """Test: a job whose file does not exist fails with the missing path."""
+        job = CompanyJob("acme", str(tmp_path / "InputPL.xlsx"), str(tmp_path / "Mayor.xlsx"), str(tmp_path / "out.xlsx"))
+        result = run_company(job, duplicates="keep")
+
+        assert result["status"] == "error"
+        assert "InputPL.xlsx" in result["error"]
+
+    def test_save_summary(self, tmp_path):
+        """Test: the summary CSV has one row per company and integer counts."""
+        path = save_summary([
+            {"company": "acme", "status": "updated", "new_rows": 3, "seconds": 1.5},
+            {"company": "initech", "status": "error", "error": "Falta el Mayor", "seconds": 0.0},
+        ], str(tmp_path / "out" / "summary.csv"))
+
+        summary = pd.read_csv(path)
+        assert summary["company"].tolist() == ["acme", "initech"]
+        assert open(path).read().splitlines()[1].startswith("acme,updated,,,,,,3,")
@@ -0,0 +1,270 @@
+"""
+Unit tests for classification functions.
+"""
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+from src import classifier
+from src.classifier import (
+    ConceptIndex, SuggestionCache, create_knowledge_base, get_suggestion, get_suggestions,
+    classify_missing_records
+)
+
+
+@pytest.fixture
+def knowledge_base():
+    """Knowledge base with a few recurring concepts."""
+    return {
+        'Factura Amazon Web Services': 'IT',
+        'Nomina empleados enero': 'Payroll',
+        'Comision mantenimiento Banco Santander': 'Bank',
+        'Alquiler oficina Madrid': 'Admin',
+        'Seguro responsabilidad civil': 'Admin',
+    }
+
+
+class TestConceptIndex:
+    """Tests for the ConceptIndex class."""
+
+    def test_candidates_share_tokens_with_query(self, knowledge_base):
+        """Test: only concepts sharing n-grams with the query are candidates."""
+        index = ConceptIndex(knowledge_base)
+
+        candidates = index.candidates('Amazon Web Services marzo')
+
+        assert 'Factura Amazon Web Services' in candidates
+        assert 'Nomina empleados enero' not in candidates
+
+    def test_candidates_empty_when_nothing_in_common(self, knowledge_base):
+        """Test: return no candidates for a concept without common n-grams."""
+        index = ConceptIndex(knowledge_base)
+
+        assert index.candidates('xyz') == []
+
+    def test_candidates_respect_limit(self):
+        """Test: truncate candidates to candidate_limit."""
+        mapping = {f'Pago proveedor {i}': 'Admin' for i in range(50)}
+        index = ConceptIndex(mapping, candidate_limit=10)
+
+        assert len(index.candidates('Pago proveedor')) == 10
+
+    def test_candidate_pairs_match_candidate_ids(self):
+        """Test: batched candidates equal the per-concept ones, including ties at the limit."""
+        mapping = {f'Pago proveedor {i}': 'Admin' for i in range(50)}
+        mapping.update({'Proveedor luz': 'Admin', 'Pago nominas': 'Payroll'})
+        index = ConceptIndex(mapping, candidate_limit=10)
+        concepts = ['Pago proveedor', 'xyz', 'Proveedor 7', 'Pago luz']
+
+        query_ids, concept_ids = index.candidate_pairs(concepts)
+
+        for i, concept in enumerate(concepts):
+            assert list(concept_ids[query_ids == i]) == list(index.candidate_ids(concept))
+        assert index.candidate_ids('Pago proveedor').tolist() == list(range(10))
+
+    def test_candidate_pairs_memory_depends_on_hits_not_knowledge_base(self):
+        """Test: candidates are found without allocating an array sized to the knowledge base per concept."""
+        mapping = {f'Proveedor {i:05d}': 'Admin' for i in range(20000)}
+        mapping.update({'Taxi aeropuerto Barajas': 'Travel', 'Taxi estacion': 'Travel'})
+        index = ConceptIndex(mapping)
+
+        tracemalloc.start()
+        query_ids, concept_ids = index.candidate_pairs(['Taxi aeropuerto', 'Taxi hotel'] * 50)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        assert peak < len(index) * np.dtype(np.int64).itemsize
+        assert set(concept_ids.tolist()) == {20000, 20001}
+
+
+class TestGetSuggestion:
+    """Tests for the get_suggestion function."""
+
+    def test_get_suggestion_exact_match(self, knowledge_base):
+        """Test: exact concept returns its category with confidence 100."""
+        assert get_suggestion('Alquiler oficina Madrid', knowledge_base) == ('Admin', 100)
+
+    def test_get_suggestion_indexed_matches_linear_scan(self, knowledge_base):
+        """Test: indexed lookup returns the same suggestion as the full scan."""
+        index = ConceptIndex(knowledge_base)
+
+        for concept in ['Amazon Web Services', 'Nomina empleados febrero', 'Banco Santander comision', 'Taxi aeropuerto']:
+            assert get_suggestion(concept, knowledge_base, index=index)[0] == get_suggestion(concept, knowledge_base)[0]
+
+    def test_get_suggestion_empty_knowledge_base(self):
+        """Test: return NEW - NEEDS REVIEW when there is no history."""
+        assert get_suggestion('Concepto', {}) == ("NEW - NEEDS REVIEW", 0)
+
+
+class TestGetSuggestions:
+    """Tests for the get_suggestions batch function."""
+
+    CONCEPTS = [
+        'Alquiler oficina Madrid', 'Amazon Web Services', 'Nómina empleados febrero',
+        'Banco Santander comision', 'Taxi aeropuerto', '', 'Seguro civil'
+    ]
+
+    def test_get_suggestions_matches_get_suggestion(self, knowledge_base):
+        """Test: batch matrix scoring returns the same result as one call per concept."""
+        categories, scores = get_suggestions(self.CONCEPTS, knowledge_base)
+
+        expected = [get_suggestion(concept, knowledge_base) for concept in self.CONCEPTS]
+        assert list(zip(categories, scores)) == expected
+
+    def test_get_suggestions_with_index_matches_get_suggestion(self, knowledge_base):
+        """Test: indexed batch scoring returns the same result as indexed get_suggestion."""
+        index = ConceptIndex(knowledge_base)
+
+        categories, scores = get_suggestions(self.CONCEPTS, knowledge_base, index=index)
+
+        expected = [get_suggestion(concept, knowledge_base, index=index) for concept in self.CONCEPTS]
+        assert list(zip(categories, scores)) == expected
+
+    def test_get_suggestions_with_index_scores_in_one_call(self, knowledge_base, monkeypatch):
+        """Test: with an index, all candidate pairs are scored in a single batched call."""
+        calls = []
+        cpdist = classifier.rf_process.cpdist
+        monkeypatch.setattr(classifier.rf_process, "cpdist", lambda *args, **kwargs: calls.append(1) or cpdist(*args, **kwargs))
+
+        get_suggestions(self.CONCEPTS, knowledge_base, index=ConceptIndex(knowledge_base))
+
+        assert len(calls) == 1
+
+    def test_get_suggestions_empty_knowledge_base(self):
+        """Test: every concept needs review when there is no history."""
+        categories, scores = get_suggestions(['A', 'B'], {})
+
+        assert list(categories) == ["NEW - NEEDS REVIEW"] * 2
+        assert list(scores) == [0, 0]
+
+
+class TestSuggestionCache:
+    """Tests for the SuggestionCache class."""
+
+    def test_cache_evicts_least_recently_used(self):
+        """Test: keep at most maxsize entries, evicting the least recently used."""
+        cache = SuggestionCache(maxsize=2)
+        cache.put('A', ('IT', 100))
+        cache.put('B', ('Admin', 90))
+        cache.get('A')
+        cache.put('C', ('Sales', 80))
+
+        assert cache.get('A') == ('IT', 100)
+        assert cache.get('B') is None
+        assert len(cache) == 2
+
+    def test_cache_cleared_for_other_knowledge_base(self):
+        """Test: binding to a different fingerprint clears the entries."""
+        cache = SuggestionCache()
+        cache.bind('kb-1')
+        cache.put('A', ('IT', 100))
+
+        cache.bind('kb-1')
+        assert cache.get('A') == ('IT', 100)
+
+        cache.bind('kb-2')
+        assert cache.get('A') is None
+
+
+class TestClassifyMissingRecords:
+    """Tests for the classify_missing_records function."""
+
+    def test_classify_missing_records_fills_columns(self, sample_input_df, sample_mayor_df):
+        """Test: fill Tipo de gasto and Confidence for new records."""
+        new_df = sample_mayor_df.iloc[[0, 3]].copy()
+
+        result = classify_missing_records(new_df, sample_input_df)
+
+        assert result['Tipo de gasto'].iloc[0] == 'Admin'
+        assert result['Confidence'].iloc[0] == 100
+        assert 'Confidence' in result.columns
+
+    def test_classify_missing_records_fans_out_repeated_concepts(self, sample_input_df):
+        """Test: rows with the same normalized concept get the same suggestion."""
+        new_df = pd.DataFrame({'Concepto': ['Concepto 1', ' Concepto  1 ', 'Concepto 9', 'Concepto 9']})
+
+        result = classify_missing_records(new_df, sample_input_df)
+
+        assert list(result['Tipo de gasto'].iloc[:2]) == ['Admin', 'Admin']
+        assert list(result['Confidence'].iloc[:2]) == [100, 100]
+        assert result['Tipo de gasto'].iloc[2] == result['Tipo de gasto'].iloc[3]
+
+    def test_classify_missing_records_reuses_cache(self, sample_input_df):
+        """Test: a second run with the same history is served from the cache."""
+        cache = SuggestionCache()
+        new_df = pd.DataFrame({'Concepto': ['Concepto 1', 'Concepto 2', 'Concepto 1']})
+
+        first = classify_missing_records(new_df.copy(), sample_input_df, cache=cache)
+        second = classify_missing_records(new_df.copy(), sample_input_df, cache=cache)
+
+        assert len(cache) == 2
+        assert cache.hits == 2
+        assert list(first['Tipo de gasto']) == list(second['Tipo de gasto'])
+
+    def test_classify_missing_records_reports_row_progress(self, sample_input_df, monkeypatch):
+        """Test: progress counts classified rows batch by batch and the result does not change."""
+        monkeypatch.setattr(classifier, "PROGRESS_CONCEPTS", 2)
+        new_df = pd.DataFrame({'Concepto': ['Concepto 1', 'Concepto 2', 'Concepto 1', 'Nuevo', 'Otro']})
+        reports = []
+
+        with_progress = classify_missing_records(new_df.copy(), sample_input_df, progress=lambda *r: reports.append(r))
+        without_progress = classify_missing_records(new_df.copy(), sample_input_df)
+
+        assert reports == [(3, 5), (5, 5)]
+        assert list(with_progress['Tipo de gasto']) == list(without_progress['Tipo de gasto'])
+        assert list(with_progress['Confidence']) == list(without_progress['Confidence'])
+
+    def test_classify_missing_records_handles_empty(self, sample_input_df):
+        """Test: return empty DataFrames unchanged."""
+        empty_df = pd.DataFrame(columns=['Concepto'])
+
+        result = classify_missing_records(empty_df, sample_input_df)
+
+        assert len(result) == 0
+
+    def test_create_knowledge_base_keeps_majority_category(self):
+        """Test: the most frequent category wins instead of the last one."""
+        history = pd.DataFrame({
+            'Concepto': ['Amazon', 'Amazon', 'Amazon', 'Amazon'],
+            'Tipo de gasto': ['IT', 'IT', 'IT', 'Marketing']
+        })
+
+        knowledge_base = create_knowledge_base(history)
+
+        assert knowledge_base['Amazon'] == 'IT'
+        assert knowledge_base.agreement_of('Amazon') == 0.75
+        assert get_suggestion('Amazon', knowledge_base) == ('IT', 75)
+
+    def test_create_knowledge_base_ties_go_to_most_recent(self):
+        """Test: on equal counts, the most recently used category wins."""
+        history = pd.DataFrame({
+            'Concepto': ['Amazon', 'Amazon', 'Google'],
+            'Tipo de gasto': ['IT', 'Marketing', 'IT']
+        })
+
+        knowledge_base = create_knowledge_base(history)
+
+        assert knowledge_base['Amazon'] == 'Marketing'
+        assert list(knowledge_base) == ['Amazon', 'Google']
+
+    def test_classify_missing_records_confidence_reflects_agreement(self):
+        """Test: fuzzy matches scale their confidence by the label agreement."""
+        history = pd.DataFrame({
+            'Concepto': ['Factura Amazon', 'Factura Amazon', 'Nomina'],
+            'Tipo de gasto': ['IT', 'Marketing', 'Payroll']
+        })
+        new_df = pd.DataFrame({'Concepto': ['Factura Amazon', 'Factura Amazon marzo', 'Nomina']})
+
+        result = classify_missing_records(new_df, history)
+
+        assert list(result['Tipo de gasto']) == ['Marketing', 'Marketing', 'Payroll']
+        assert list(result['Confidence']) == [50, 50, 100]
+
+    def test_create_knowledge_base_skips_missing_values(self):
+        """Test: ignore rows without Concepto or Tipo de gasto."""
+        history = pd.DataFrame({
+            'Concepto': ['A', None, 'C'],
+            'Tipo de gasto': ['IT', 'Admin', None]
+        })
+
+        assert create_knowledge_base(history) == {'A': 'IT'}
@@ -0,0 +1,76 @@
+"""
+Unit tests for the parsed workbook cache.
+"""
+import io
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime
+from src import frame_cache
+from src.loader import get_prepared_data
+
+
+class TestFrameCache:
+    """Tests for the columnar frame cache."""
+
+    def test_store_and_load_round_trip_mixed_columns(self, tmp_path):
+        """Test: mixed object columns come back with the same values and types."""
+        df = pd.DataFrame({
+            'Nº Asiento': pd.Series([1, 2.5, 'END', None, True], dtype=object),
+            'Fecha': pd.to_datetime(['2025-01-15', None, '2025-02-10', '2025-03-01', '2025-03-02']),
+            'Concepto': pd.Series(['A', np.nan, 'C', 'D', 'E'], dtype=object),
+            'Saldo': [1.0, 2.0, 3.0, 4.0, 5.0],
+        })
+
+        frame_cache.store_frame("key", df, cache_dir=str(tmp_path))
+        result = frame_cache.load_frame("key", cache_dir=str(tmp_path))
+
+        pd.testing.assert_frame_equal(result, df)
+        assert [type(v) for v in result['Nº Asiento']] == [int, float, str, type(None), bool]
+
+    def test_round_trip_mixed_columns_with_nan_and_dates(self, tmp_path):
+        """Test: blank cells (NaN) and date cells in mixed columns survive the round trip."""
+        df = pd.DataFrame({
+            'Nº Asiento': pd.Series([1, 2, 'END', np.nan, 'Nota'], dtype=object),
+            'Documento': pd.Series([1001, 'F-2025-01', np.nan, datetime(2025, 1, 15), 'F-2025-02'], dtype=object),
+        })
+
+        frame_cache.store_frame("key", df, cache_dir=str(tmp_path))
+        result = frame_cache.load_frame("key", cache_dir=str(tmp_path))
+
+        assert result is not None
+        pd.testing.assert_frame_equal(result, df)
+        assert np.isnan(result['Nº Asiento'][3])
+        assert isinstance(result['Documento'][3], datetime)
+
+    def test_load_frame_miss_returns_none(self, tmp_path):
+        """Test: return None for unknown keys."""
+        assert frame_cache.load_frame("missing", cache_dir=str(tmp_path)) is None
+
+    def test_load_frame_discards_corrupt_entry(self, tmp_path):
+        """Test: an unreadable entry is removed and reported as a miss."""
+        (tmp_path / "bad.parquet").write_bytes(b"not parquet")
+
+        assert frame_cache.load_frame("bad", cache_dir=str(tmp_path)) is None
+        assert not (tmp_path / "bad.parquet").exists()
+
+    def test_cache_key_depends_on_content_not_source_type(self, workbooks):
+        """Test: a path and an upload buffer with the same bytes share the key."""
+        input_path, mayor_path = workbooks
+        with open(input_path, "rb") as f:
+            buffer = io.BytesIO(f.read())
+
+        assert frame_cache.cache_key(input_path, 1) == frame_cache.cache_key(buffer, 1)
+        assert frame_cache.cache_key(input_path, 1) != frame_cache.cache_key(mayor_path, 1)
+        assert frame_cache.cache_key(input_path, 1) != frame_cache.cache_key(input_path, 2)
+
+    def test_get_prepared_data_skips_parsing_on_repeat(self, workbooks, tmp_path, monkeypatch):
+        """Test: a second run on the same files does not parse the Excel files."""
+        monkeypatch.chdir(tmp_path)
+        input_df, mayor_df = get_prepared_data(*workbooks)
+
+        monkeypatch.setattr("src.loader.load_data", lambda *args, **kwargs: pytest.fail("parsed again"))
+        cached_input, cached_mayor = get_prepared_data(*workbooks)
+
+        pd.testing.assert_frame_equal(cached_input, input_df)
+        pd.testing.assert_frame_equal(cached_mayor, mayor_df)
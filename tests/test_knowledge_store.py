@@ -0,0 +1,110 @@
+"""
+Unit tests for the persisted knowledge base.
+"""
+import glob
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from src.classifier import ConceptIndex, create_knowledge_base
+from src.knowledge_store import load_knowledge_base
+
+
+@pytest.fixture
+def history_df():
+    """Historical InputPL rows with a concept classified twice."""
+    return pd.DataFrame({
+        'Concepto': ['Amazon', 'Nomina', 'Amazon', None, 'Banco'],
+        'Tipo de gasto': ['IT', 'Payroll', 'Cloud', 'Admin', 'Bank']
+    })
+
+
+def assert_same_knowledge_base(knowledge_base, expected):
+    """Compare counts, last_seen and agreement, not only the majority category of each concept."""
+    assert knowledge_base.stats.equals(expected.stats)
+    assert list(knowledge_base) == list(expected)
+    assert dict(knowledge_base) == dict(expected)
+    assert knowledge_base.agreement_of('Amazon') == expected.agreement_of('Amazon') == 0.5
+
+
+class TestLoadKnowledgeBase:
+    """Tests for the load_knowledge_base function."""
+
+    def test_load_knowledge_base_builds_and_persists(self, history_df, tmp_path):
+        """Test: build the knowledge base and write one artifact."""
+        mapping, index = load_knowledge_base(history_df, store_dir=str(tmp_path))
+
+        assert_same_knowledge_base(mapping, create_knowledge_base(history_df))
+        assert index.concepts == list(mapping)
+        assert len(glob.glob(os.path.join(tmp_path, "kb-*.npz"))) == 1
+
+    def test_load_knowledge_base_reuses_artifact(self, history_df, tmp_path, monkeypatch):
+        """Test: an unchanged history is loaded from disk without re-learning."""
+        _, built_index = load_knowledge_base(history_df, store_dir=str(tmp_path))
+        monkeypatch.setattr("src.knowledge_store.create_knowledge_base", lambda *args, **kwargs: pytest.fail("re-learned"))
+        monkeypatch.setattr("src.classifier._concept_ngrams", lambda *args, **kwargs: pytest.fail("re-indexed"))
+
+        mapping, index = load_knowledge_base(history_df, store_dir=str(tmp_path))
+
+        assert_same_knowledge_base(mapping, create_knowledge_base(history_df))
+        assert list(index.choices) == list(built_index.choices)
+        assert index._postings.keys() == built_index._postings.keys()
+
+    def test_load_knowledge_base_same_file_skips_history_hashing(self, history_df, tmp_path, monkeypatch):
+        """Test: the artifact of the same InputPL file is found without hashing the history rows."""
+        input_path = tmp_path / "InputPL.xlsx"
+        input_path.write_bytes(b"InputPL content")
+        load_knowledge_base(history_df, store_dir=str(tmp_path / "kb"), input_source=str(input_path))
+        monkeypatch.setattr("src.knowledge_store.history_row_hashes", lambda *args: pytest.fail("hashed history"))
+
+        mapping, _ = load_knowledge_base(history_df, store_dir=str(tmp_path / "kb"), input_source=str(input_path))
+
+        assert_same_knowledge_base(mapping, create_knowledge_base(history_df))
+
+    def test_load_knowledge_base_learns_only_new_rows(self, history_df, tmp_path, monkeypatch):
+        """Test: appended rows extend the previous artifact and match a full rebuild."""
+        load_knowledge_base(history_df, store_dir=str(tmp_path))
+        grown_df = pd.concat([history_df, pd.DataFrame({
+            'Concepto': ['Nomina', 'Taxi'],
+            'Tipo de gasto': ['Salaries', 'Travel']
+        })], ignore_index=True)
+
+        learned_rows = []
+        original = create_knowledge_base
+        monkeypatch.setattr(
+            "src.knowledge_store.create_knowledge_base",
+            lambda df, **kwargs: learned_rows.append(len(df)) or original(df, **kwargs)
+        )
+        knowledge_base, index = load_knowledge_base(grown_df, store_dir=str(tmp_path))
+
+        rebuilt = create_knowledge_base(grown_df)
+        rebuilt_index = ConceptIndex(rebuilt)
+        assert learned_rows == [2]
+        assert knowledge_base.stats.equals(rebuilt.stats)
+        assert list(knowledge_base) == list(rebuilt)
+        assert list(index.choices) == list(rebuilt_index.choices)
+        for concept in ['Taxi', 'Amazon', 'Nomina marzo']:
+            assert np.array_equal(index.candidate_ids(concept), rebuilt_index.candidate_ids(concept))
+
+    def test_load_knowledge_base_rebuilds_corrupt_artifact(self, history_df, tmp_path):
+        """Test: a corrupt artifact is discarded and rebuilt."""
+        load_knowledge_base(history_df, store_dir=str(tmp_path))
+        artifact = glob.glob(os.path.join(tmp_path, "kb-*.npz"))[0]
+        with open(artifact, "w") as f:
+            f.write("not an npz")
+
+        mapping, index = load_knowledge_base(history_df, store_dir=str(tmp_path))
+
+        assert_same_knowledge_base(mapping, create_knowledge_base(history_df))
+        assert index.concepts == list(mapping)
+        assert len(glob.glob(os.path.join(tmp_path, "kb-*.npz"))) == 1
+
+    def test_load_knowledge_base_rebuilds_when_history_changed(self, history_df, tmp_path):
+        """Test: an edited (not appended) history triggers a full rebuild."""
+        load_knowledge_base(history_df, store_dir=str(tmp_path))
+        edited_df = history_df.copy()
+        edited_df.loc[0, 'Tipo de gasto'] = 'Marketing'
+
+        mapping, _ = load_knowledge_base(edited_df, store_dir=str(tmp_path))
+
+        assert_same_knowledge_base(mapping, create_knowledge_base(edited_df))
@@ -1,11 +1,14 @@
 """
 Unit tests for data loading and normalization functions.
 """
+import io
+import openpyxl
 import pandas as pd
 import pytest
 from datetime import datetime
-from src.loader import normalize_data, validate_columns
+from src.loader import normalize_data, normalize_mes, format_month_year, validate_columns, stream_excel, load_data, get_prepared_data
 from src.config import INPUT_PL_COLS, COLUMN_MAPPING
+from tests.conftest import write_workbook
 
 
 class TestNormalizeData:
@@ -75,6 +78,35 @@ class TestNormalizeData:
         assert result['Saldo'].iloc[0] == 100.12
 
 
+class TestNormalizeMes:
+    """Tests for the vectorized Mes normalization."""
+
+    def test_format_month_year(self):
+        """Test: format dates as 'ene/25' and keep NaT as None."""
+        dates = pd.to_datetime(['2025-01-15', None, '2009-12-31', '2025-01-02'])
+
+        assert list(format_month_year(dates)) == ['ene/25', None, 'dic/09', 'ene/25']
+
+    def test_normalize_mes_prefers_mes_then_fecha(self):
+        """Test: dates in Mes win, unreadable Mes is derived from Fecha, or kept without a valid Fecha."""
+        mes = pd.Series([datetime(2024, 3, 1), 'dic/99', 'dic/99', '2025-06-01'], dtype=object)
+        fecha = pd.Series(pd.to_datetime(['2025-01-15', '2025-02-20', None, '2025-01-01']))
+
+        result = normalize_mes(mes, fecha)
+
+        assert list(result) == ['mar/24', 'feb/25', 'dic/99', 'jun/25']
+
+    def test_normalize_mes_cleans_missing_values(self):
+        """Test: None, NaN and 'None'/'nan' texts become '' when Fecha cannot fill them."""
+        mes = pd.Series([None, float('nan'), ' None ', 'nan', '  '], dtype=object)
+        fecha = pd.Series([pd.NaT] * 5)
+
+        result = normalize_mes(mes, fecha)
+
+        assert list(result) == ['', '', '', '', '  ']
+        assert result.dtype == object
+
+
 class TestValidateColumns:
     """Tests for the validate_columns function."""
     
@@ -106,3 +138,87 @@ class TestValidateColumns:
         required_cols_with_end = ['Nº Asiento', 'Fecha', 'Concepto', 'END']
         validate_columns(df, required_cols_with_end, "Test")
 
+
+
+@pytest.fixture
+def excel_file(tmp_path):
+    """Small Excel file with an unused column, an END row and trailing empty rows."""
+    path = tmp_path / "mayor.xlsx"
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    sheet.append(['Nº Asiento', 'Fecha', 'Concepto', 'Saldo', 'Extra'])
+    sheet.append([1, datetime(2025, 1, 15), 'Amazon', 100.5, 'x'])
+    sheet.append([2, datetime(2025, 2, 20), None, 200, 'y'])
+    sheet.append(['END', None, None, None, None])
+    sheet.append([None, None, None, None, None])
+    sheet.cell(row=8, column=1).value = None
+    wb.save(path)
+    return str(path)
+
+
+class TestStreamExcel:
+    """Tests for the streaming Excel loader."""
+
+    def test_stream_excel_reads_only_requested_columns(self, excel_file):
+        """Test: materialize only the requested columns."""
+        df = stream_excel(excel_file, columns=['Nº Asiento', 'Fecha', 'Saldo'])
+
+        assert list(df.columns) == ['Nº Asiento', 'Fecha', 'Saldo']
+        assert df['Saldo'].dtype == 'float64'
+
+    def test_stream_excel_matches_read_excel(self, excel_file):
+        """Test: same rows and values as pd.read_excel after normalization."""
+        expected = normalize_data(pd.read_excel(excel_file, engine='openpyxl'))
+        result = normalize_data(stream_excel(excel_file))
+
+        assert len(result) == len(expected) == 3
+        assert list(result['Nº Asiento']) == [1, 2, 'END']
+        assert result['Fecha'].equals(expected['Fecha'])
+        assert result['Saldo'].equals(expected['Saldo'].astype('float64'))
+        assert result['Concepto'].isna().tolist() == expected['Concepto'].isna().tolist()
+
+    def test_load_data_streaming_handles_missing_file(self, tmp_path):
+        """Test: return None when the file does not exist."""
+        assert load_data(str(tmp_path / "missing.xlsx"), streaming=True) is None
+
+
+class TestGetPreparedData:
+    """Tests for loading both workbooks, sequentially or in a process pool."""
+
+    def test_parallel_matches_sequential(self, workbooks):
+        """Test: parallel loading returns the same frames as a sequential run."""
+        sequential = get_prepared_data(*workbooks, use_cache=False, parallel=False)
+        parallel = get_prepared_data(*workbooks, use_cache=False, parallel=True)
+
+        pd.testing.assert_frame_equal(parallel[0], sequential[0])
+        pd.testing.assert_frame_equal(parallel[1], sequential[1])
+
+    def test_parallel_accepts_upload_buffers(self, workbooks):
+        """Test: file-like sources (Streamlit uploads) are sent to the workers as bytes."""
+        buffers = []
+        for path in workbooks:
+            with open(path, "rb") as f:
+                buffers.append(io.BytesIO(f.read()))
+
+        input_df, mayor_df = get_prepared_data(*buffers, use_cache=False, parallel=True)
+
+        assert list(mayor_df['Concepto']) == ['Amazon', 'Taxi']
+        assert 'Neto' in mayor_df.columns
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_reports_validation_error(self, workbooks, tmp_path, parallel):
+        """Test: a structural error in a worker surfaces as the same ValueError."""
+        bad_input = tmp_path / "bad.xlsx"
+        write_workbook(bad_input, ['Nº Asiento', 'Fecha'], [[1, datetime(2025, 1, 15)]])
+
+        with pytest.raises(ValueError, match="Error de Estructura en InputPL"):
+            get_prepared_data(str(bad_input), workbooks[1], use_cache=False, parallel=parallel)
+
+    @pytest.mark.parametrize("parallel", [False, True])
+    def test_load_failure_takes_precedence(self, workbooks, tmp_path, parallel):
+        """Test: a file that cannot be loaded is reported before validation errors."""
+        bad_input = tmp_path / "bad.xlsx"
+        write_workbook(bad_input, ['Nº Asiento'], [[1]])
+
+        with pytest.raises(ValueError, match="No se pudieron cargar"):
+            get_prepared_data(str(bad_input), str(tmp_path / "missing.xlsx"), use_cache=False, parallel=parallel)
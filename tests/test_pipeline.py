@@ -0,0 +1,109 @@
+"""
+Unit tests for the non-interactive reconciliation of one company.
+"""
+import openpyxl
+import pytest
+from datetime import datetime
+from src.config import INPUT_PL_COLS
+from src.pipeline import add_new_movements, load_and_audit, run_reconciliation, LOAD_STAGES, UPDATE_STAGES
+from src.profiling import RunProfile
+from tests.conftest import write_workbook
+
+
+@pytest.fixture
+def company(tmp_path, monkeypatch):
+    """InputPL with one movement and a Mayor with two new ones, one of them duplicated; caches go to tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    write_workbook(tmp_path / "InputPL.xlsx", INPUT_PL_COLS, [
+        [1, datetime(2025, 1, 15), 'DOC1', 'Amazon', 600, 100.5, 0, 100.5, 'Cuenta', -100.5, 'ene/25', 'IT', None],
+        ['END'] + [None] * 12,
+    ])
+    write_workbook(tmp_path / "Mayor.xlsx", ['Nº Asiento', 'Fecha', 'Concepto', 'Saldo', 'Net', 'Month'], [
+        [1, datetime(2025, 1, 15), 'Amazon', 100.5, -100.5, datetime(2025, 1, 1)],
+        [2, datetime(2025, 2, 10), 'Amazon', 20, -20, datetime(2025, 2, 1)],
+        [2, datetime(2025, 2, 10), 'Amazon', 20, -20, datetime(2025, 2, 1)],
+        [3, datetime(2025, 2, 11), 'Taxi', 15, -15, datetime(2025, 2, 1)],
+    ])
+    return str(tmp_path / "InputPL.xlsx"), str(tmp_path / "Mayor.xlsx"), str(tmp_path / "out" / "InputPL_Updated.xlsx")
+
+
+def output_asientos(path):
+    return [row[0] for row in openpyxl.load_workbook(path).active.iter_rows(min_row=2, values_only=True)]
+
+
+class TestRunReconciliation:
+    """Tests for run_reconciliation."""
+
+    def test_remove_policy_drops_duplicates(self, company):
+        """Test: with duplicates='remove' the duplicated movement is written once."""
+        input_path, mayor_path, output_path = company
+        summary = run_reconciliation(input_path, mayor_path, output_path, duplicates="remove", parallel_load=False)
+
+        assert summary["status"] == "updated"
+        assert summary["duplicates_removed"] == 1
+        assert summary["new_rows"] == 2
+        assert summary["output"] == output_path
+        assert output_asientos(output_path) == [1, 2, 3]
+
+    def test_keep_policy_keeps_duplicates(self, company):
+        """Test: with duplicates='keep' both copies are added."""
+        input_path, mayor_path, output_path = company
+        summary = run_reconciliation(input_path, mayor_path, output_path, duplicates="keep", parallel_load=False)
+
+        assert summary["duplicates_removed"] == 0
+        assert summary["new_rows"] == 3
+
+    def test_ask_policy_uses_confirm(self, company):
+        """Test: with duplicates='ask' the answer of confirm decides."""
+        input_path, mayor_path, output_path = company
+        answers = []
+        summary = run_reconciliation(input_path, mayor_path, output_path, duplicates="ask",
+                                     confirm=lambda: answers.append(True) or True, parallel_load=False)
+
+        assert answers == [True]
+        assert summary["duplicates_removed"] == 1
+
+    def test_ask_policy_requires_confirm(self, company):
+        """Test: 'ask' without a confirm callback is rejected before loading anything."""
+        input_path, mayor_path, output_path = company
+        with pytest.raises(ValueError):
+            run_reconciliation(input_path, mayor_path, output_path, duplicates="ask")
+
+    def test_up_to_date_writes_nothing(self, company, tmp_path):
+        """Test: when the Mayor has nothing new, no output is written."""
+        input_path, _, output_path = company
+        summary = run_reconciliation(input_path, input_path, output_path, parallel_load=False)
+
+        assert summary["status"] == "up_to_date"
+        assert summary["output"] is None
+        assert not (tmp_path / "out").exists()
+
+    def test_stages_recorded_in_profile(self, company):
+        """Test: every stage is recorded in the given RunProfile."""
+        input_path, mayor_path, output_path = company
+        profile = RunProfile("test")
+        run_reconciliation(input_path, mayor_path, output_path, parallel_load=False, profile=profile)
+
+        assert [stage.name for stage in profile.stages] == [
+            "get_prepared_data", "audit_data_quality", "find_missing_records",
+            "classify_missing_records", "save_to_excel",
+        ]
+
+
+class TestPipelinePhases:
+    """Tests for running the pipeline in two phases, as the web app does."""
+
+    def test_phases_in_memory_with_listener(self, company, tmp_path):
+        """Test: the update is returned as a buffer and every stage reports its start and end."""
+        input_path, mayor_path, _ = company
+        events = []
+        profile = RunProfile("web", listener=lambda *event: events.append(event))
+
+        input_df, mayor_df, findings = load_and_audit(input_path, mayor_path, profile, parallel_load=False)
+        update = add_new_movements(input_df, mayor_df, input_path, profile, in_memory=True)
+
+        assert "exact_duplicates" in [finding.check_id for finding in findings]
+        assert len(update.classified_df) == 3
+        assert output_asientos(update.output) == [1, 2, 2, 3]
+        assert not (tmp_path / "data" / "output" / "InputPL_Updated.xlsx").exists()
+        assert [event[0] for event in events if event[1:] == (1.0,)] == LOAD_STAGES + UPDATE_STAGES
@@ -3,7 +3,7 @@ Unit tests for processing and comparison functions.
 """
 import pandas as pd
 import pytest
-from src.processor import find_missing_records
+from src.processor import find_missing_records, record_keys
 from src.config import UNIQUE_IDENTIFIERS
 
 
@@ -95,5 +95,92 @@ class TestFindMissingRecords:
         missing = find_missing_records(empty_input, mayor_df)
         
         assert missing is not None
-        assert len(missing) == 2 
+        assert len(missing) == 2
+
+    def test_find_missing_records_keeps_mayor_index(self, sample_input_df, sample_mayor_df):
+        """Test: missing rows keep their Mayor index and are not duplicated by repeated InputPL keys."""
+        input_df = pd.concat([sample_input_df, sample_input_df], ignore_index=True)
+
+        missing = find_missing_records(input_df, sample_mayor_df)
+
+        assert missing.index.tolist() == [3, 4]
+        assert list(missing.columns) == list(sample_mayor_df.columns)
+
+
+class TestRecordKeys:
+    """Tests for the hashed identifier keys."""
+
+    def test_record_keys_ignore_dtype_differences(self):
+        """Test: 1 and 1.0, -0.0 and 0.0, and datetime units produce the same key."""
+        left = pd.DataFrame({
+            'Nº Asiento': pd.Series([1, 'END'], dtype=object),
+            'Fecha': pd.to_datetime(['2025-01-15', None]).as_unit('us'),
+            'Saldo': [-0.0, 0.0],
+        })
+        right = pd.DataFrame({
+            'Nº Asiento': [1.0, float('nan')],
+            'Fecha': pd.to_datetime(['2025-01-15', None]).as_unit('ns'),
+            'Saldo': [0.0, 0.0],
+        })
+
+        keys_left, keys_right = record_keys(left), record_keys(right)
+
+        assert keys_left[0] == keys_right[0]
+        assert keys_left[1] != keys_right[1]
+
+    def test_record_keys_distinguish_text_from_numbers(self):
+        """Test: '1' and 1 are different identifiers, as in pd.merge."""
+        df = pd.DataFrame({
+            'Nº Asiento': pd.Series([1, '1', None], dtype=object),
+            'Fecha': pd.to_datetime(['2025-01-15'] * 3),
+            'Saldo': [10.0] * 3,
+        })
+
+        assert len(set(record_keys(df))) == 3
+
+
+class TestToleranceMatching:
+    """Tests for matching Saldo within a tolerance in cents."""
+
+    @pytest.fixture
+    def frames(self):
+        input_df = pd.DataFrame({
+            'Nº Asiento': [1, 1, 2],
+            'Fecha': pd.to_datetime(['2025-01-15', '2025-01-15', '2025-01-20']),
+            'Saldo': [100.00, 200.00, 50.00],
+        })
+        mayor_df = pd.DataFrame({
+            'Nº Asiento': [1, 1, 2, 2],
+            'Fecha': pd.to_datetime(['2025-01-15', '2025-01-15', '2025-01-20', '2025-01-21']),
+            'Saldo': [100.01, 150.00, 50.000000001, 50.00],
+        })
+        return input_df, mayor_df
+
+    def test_exact_match_uses_cents(self, frames):
+        """Test: float noise below a cent is not a new record."""
+        input_df, mayor_df = frames
+
+        missing = find_missing_records(input_df, mayor_df)
+
+        assert missing.index.tolist() == [0, 1, 3]
+
+    def test_tolerance_matches_same_asiento_and_fecha(self, frames):
+        """Test: a Saldo within the tolerance matches, other Fecha or larger differences do not."""
+        input_df, mayor_df = frames
+
+        missing, report = find_missing_records(input_df, mayor_df, tolerance_cents=2, return_report=True)
+
+        assert missing.index.tolist() == [1, 3]
+        assert report.index.tolist() == [0]
+        assert report['Saldo InputPL'].iloc[0] == 100.00
+        assert report['Diferencia'].iloc[0] == pytest.approx(0.01)
+
+    def test_report_is_empty_without_tolerance(self, frames):
+        """Test: the report has no rows when matching is exact."""
+        input_df, mayor_df = frames
+
+        _, report = find_missing_records(input_df, mayor_df, return_report=True)
+
+        assert len(report) == 0
+        assert list(report.columns) == ['Nº Asiento', 'Fecha', 'Saldo', 'Saldo InputPL', 'Diferencia']
 
@@ -0,0 +1,105 @@
+"""
+Unit tests for the pipeline profiling helpers.
+"""
+import json
+import subprocess
+import sys
+import threading
+import time
+import pandas as pd
+from src.profiling import RunProfile, count_rows
+
+
+class TestRunProfile:
+    """Tests for recording and reporting pipeline stages."""
+
+    def test_stage_records_times_and_rows(self):
+        """Test: a stage records wall time, CPU time, peak memory and the rows set inside it."""
+        profile = RunProfile()
+        with profile.stage("find_missing_records", rows=10) as stage:
+            sum(range(10000))
+            stage.rows = 12
+
+        record = profile.stages[0]
+        assert record.name == "find_missing_records"
+        assert record.rows == 12
+        assert record.wall_s >= 0 and record.cpu_s >= 0 and record.child_cpu_s >= 0
+        assert record.process_peak_rss_mib is None or record.process_peak_rss_mib > 0
+
+    def test_stage_cpu_excludes_other_threads_and_reports_children(self):
+        """Test: CPU time of other threads is not counted; finished child processes are reported apart."""
+        stop = threading.Event()
+        busy = threading.Thread(target=lambda: [sum(range(1000)) for _ in iter(stop.is_set, True)])
+        profile = RunProfile()
+        busy.start()
+        try:
+            with profile.stage("get_prepared_data"):
+                subprocess.run([sys.executable, "-c", "sum(range(10**7))"], check=True)
+                time.sleep(0.2)
+        finally:
+            stop.set()
+            busy.join()
+
+        record = profile.stages[0]
+        assert record.cpu_s < 0.1
+        assert record.child_cpu_s > 0
+
+    def test_stage_is_recorded_when_it_fails(self):
+        """Test: a stage that raises is still part of the report."""
+        profile = RunProfile()
+        try:
+            with profile.stage("get_prepared_data"):
+                raise ValueError("boom")
+        except ValueError:
+            pass
+
+        assert [stage.name for stage in profile.stages] == ["get_prepared_data"]
+
+    def test_track_counts_rows_of_result(self):
+        """Test: the decorator names the stage after the function and counts the rows it returns."""
+        profile = RunProfile()
+
+        @profile.track()
+        def load():
+            return pd.DataFrame({'a': [1, 2]}), pd.DataFrame({'a': [3]})
+
+        load()
+
+        assert profile.stages[0].name == "load"
+        assert profile.stages[0].rows == 3
+
+    def test_json_report_and_table(self, tmp_path):
+        """Test: the run is saved as a JSON report and rendered as a table with one line per stage."""
+        profile = RunProfile("cli")
+        with profile.stage("save_to_excel", rows=5):
+            pass
+
+        path = profile.save(str(tmp_path))
+        report = json.loads(open(path, encoding="utf-8").read())
+
+        assert report["label"] == "cli"
+        assert report["stages"][0]["stage"] == "save_to_excel"
+        assert report["stages"][0]["rows"] == 5
+        assert list(profile.to_frame()["stage"]) == ["save_to_excel"]
+        assert len(profile.format_table().splitlines()) == 2
+
+    def test_listener_gets_stage_and_row_progress(self):
+        """Test: the listener is told when each stage starts and ends, and of progress inside it."""
+        events = []
+        profile = RunProfile(listener=lambda *event: events.append(event))
+        with profile.stage("classify_missing_records") as stage:
+            stage.progress(50, 200)
+            stage.progress(300, 200)
+
+        assert events == [
+            ("classify_missing_records", 0.0),
+            ("classify_missing_records", 0.25, 50, 200),
+            ("classify_missing_records", 1.0, 300, 200),
+            ("classify_missing_records", 1.0),
+        ]
+
+    def test_count_rows(self):
+        """Test: rows are counted for frames and tuples of frames only."""
+        assert count_rows(pd.DataFrame({'a': [1, 2]})) == 2
+        assert count_rows((pd.DataFrame({'a': [1]}), None)) == 1
+        assert count_rows("text") is None
@@ -0,0 +1,80 @@
+"""
+Unit tests for the persisted reconciliation state.
+"""
+import io
+import pandas as pd
+import pytest
+from src.processor import find_missing_records
+from src.reconciliation_store import ReconciliationState, load_reconciliation_state, save_reconciliation_state
+
+
+@pytest.fixture
+def written_file(tmp_path):
+    """Stand-in for the InputPL written by save_to_excel."""
+    path = tmp_path / "InputPL_Updated.xlsx"
+    path.write_bytes(b"written workbook")
+    return str(path)
+
+
+class TestReconciliationStore:
+    """Tests for saving and loading reconciled keys."""
+
+    def test_save_and_load_round_trip(self, sample_input_df, sample_mayor_df, written_file, tmp_path):
+        """Test: the state is found again from the content of the written file."""
+        new_rows = sample_mayor_df.iloc[3:]
+        saved = save_reconciliation_state(written_file, sample_input_df, new_rows, store_dir=str(tmp_path / "store"))
+
+        loaded = load_reconciliation_state(written_file, store_dir=str(tmp_path / "store"))
+
+        assert loaded is not None
+        assert len(loaded) == len(saved) == 5
+        assert loaded.watermark == pd.Timestamp('2025-03-20')
+
+    def test_save_from_in_memory_output(self, sample_input_df, tmp_path):
+        """Test: a state saved from an output buffer is found from an upload of the same bytes."""
+        output = io.BytesIO(b"written workbook")
+        save_reconciliation_state(output, sample_input_df, store_dir=str(tmp_path / "store"))
+
+        uploaded = io.BytesIO(output.getvalue())
+        assert load_reconciliation_state(uploaded, store_dir=str(tmp_path / "store")) is not None
+
+    def test_load_unknown_file_returns_none(self, written_file, tmp_path):
+        """Test: an InputPL not written by a previous run has no state."""
+        assert load_reconciliation_state(written_file, store_dir=str(tmp_path / "store")) is None
+
+    def test_load_discards_corrupt_state(self, sample_input_df, written_file, tmp_path):
+        """Test: an unreadable state is removed and ignored."""
+        store_dir = tmp_path / "store"
+        save_reconciliation_state(written_file, sample_input_df, store_dir=str(store_dir))
+        state_path = next(store_dir.glob("recon-*.npz"))
+        state_path.write_bytes(b"corrupt")
+
+        assert load_reconciliation_state(written_file, store_dir=str(store_dir)) is None
+        assert not state_path.exists()
+
+
+class TestIncrementalComparison:
+    """Tests for find_missing_records with a reconciliation state."""
+
+    def test_incremental_matches_full_comparison(self, sample_input_df, sample_mayor_df):
+        """Test: rows after the watermark and late rows before it are both found."""
+        reconciled = ReconciliationState.from_frames(sample_input_df)
+        mayor_df = pd.concat([sample_mayor_df, sample_mayor_df.iloc[[0]].assign(Saldo=999.0)], ignore_index=True)
+
+        incremental = find_missing_records(sample_input_df, mayor_df, reconciled=reconciled)
+        full = find_missing_records(sample_input_df, mayor_df)
+
+        pd.testing.assert_frame_equal(incremental, full)
+        assert incremental.index.tolist() == [3, 4, 5]
+
+    def test_incremental_skips_end_rows(self, sample_input_df):
+        """Test: END rows are never reported as new."""
+        mayor_df = pd.DataFrame({
+            'Nº Asiento': [1, 'END'],
+            'Fecha': pd.to_datetime(['2025-01-15', None]),
+            'Saldo': [100.50, 0.0],
+        })
+
+        missing = find_missing_records(sample_input_df, mayor_df, reconciled=ReconciliationState.from_frames(sample_input_df))
+
+        assert len(missing) == 0
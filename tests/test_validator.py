@@ -1,9 +1,13 @@
 """
 Unit tests for data validation and cleaning functions.
 """
+import numpy as np
 import pandas as pd
 import pytest
-from src.validator import audit_data_quality, remove_exact_duplicates
+from src.validator import (
+    EXACT_DUPLICATES, NEGATIVE_VALUES, SALDO_INCONSISTENCIES,
+    audit_data_quality, audit_findings, remove_exact_duplicates,
+)
 from src.config import UNIQUE_IDENTIFIERS
 
 
@@ -44,13 +48,53 @@ class TestAuditDataQuality:
         assert len(warnings) > 0
         assert any("duplicados exactos" in w.lower() for w in warnings)
     
+    def test_audit_duplicate_example_is_first_group_in_key_order(self):
+        """Test: duplicate counts and example rows follow groupby key order, skipping END rows."""
+        df = pd.DataFrame({
+            'Nº Asiento': [9, 9, 'END', 2, 2, 2, 'END'],
+            'Fecha': pd.to_datetime(['2025-03-01', '2025-03-01', '2025-03-31', '2025-01-15', '2025-01-15', '2025-01-15', '2025-03-31']),
+            'Saldo': [10.0, 10.0, 0.0, 5.0, 5.0, 5.0, 0.0],
+        })
+
+        warnings = audit_data_quality(df, "Test")
+
+        assert warnings == [
+            "**[Test]** Detectados 2 grupos de duplicados exactos (mismo Nº Asiento, Fecha y Saldo) "
+            "con un total de 5 filas afectadas (Filas Excel aprox: [5, 6, 7]...)."
+        ]
+
+    def test_audit_counts_saldo_inconsistencies(self):
+        """Test: each Nº Asiento and Fecha with several Saldo values is one inconsistency."""
+        df = pd.DataFrame({
+            'Nº Asiento': [1, 1, 1, 2, 2],
+            'Fecha': pd.to_datetime(['2025-01-15'] * 3 + ['2025-01-20'] * 2),
+            'Saldo': [10.0, 12.0, None, 7.0, 7.5],
+        })
+
+        warnings = audit_data_quality(df, "Test")
+
+        assert any("Detectadas 2 posibles inconsistencias" in w for w in warnings)
+
     def test_audit_data_quality_ignores_end_row(self, df_with_end_row):
         """Test: ignore END row in audit."""
         warnings = audit_data_quality(df_with_end_row, "Test")
 
         end_warnings = [w for w in warnings if "end" in w.lower()]
         assert len(end_warnings) == 0
-    
+
+    def test_audit_findings_end_only_frame(self):
+        """Test: a fresh template with only an END row has no duplicate or Saldo findings."""
+        df = pd.DataFrame({
+            'Nº Asiento': pd.Series(['END'], dtype=object),
+            'Fecha': pd.Series([pd.NaT]),
+            'Saldo': [np.nan],
+        })
+
+        check_ids = [finding.check_id for finding in audit_findings(df, "InputPL")]
+
+        assert EXACT_DUPLICATES not in check_ids
+        assert SALDO_INCONSISTENCIES not in check_ids
+
     def test_audit_data_quality_empty_dataframe(self):
         """Test: handle empty DataFrame."""
         df = pd.DataFrame()
@@ -63,6 +107,50 @@ class TestAuditDataQuality:
         assert len(warnings) == 0
 
 
+class TestAuditFindings:
+    """Tests for the structured audit results."""
+
+    def test_findings_carry_check_id_and_all_rows(self):
+        """Test: every affected row is kept (not just the first 5) and the message is rendered from the finding."""
+        df = pd.DataFrame({
+            'Nº Asiento': range(1, 9),
+            'Fecha': pd.to_datetime(['2025-01-15'] * 8),
+            'Saldo': [10.0] * 8,
+            'Debe': [-1.0] * 7 + [1.0],
+        })
+
+        findings = audit_findings(df, "Test")
+
+        assert [finding.check_id for finding in findings] == [NEGATIVE_VALUES]
+        finding = findings[0]
+        assert finding.count == 7 and finding.column == 'Debe'
+        assert isinstance(finding.rows, np.ndarray)
+        assert finding.excel_rows.tolist() == list(range(2, 9))
+        assert finding.message == audit_data_quality(df, "Test")[0]
+        assert "[2, 3, 4, 5, 6]" in finding.message
+
+    def test_duplicate_finding_lists_every_duplicated_row(self, df_with_duplicates):
+        """Test: duplicates report all rows of every duplicated group and the number of groups."""
+        finding = next(f for f in audit_findings(df_with_duplicates, "Test") if f.check_id == EXACT_DUPLICATES)
+
+        assert finding.groups == 2
+        assert finding.rows.tolist() == [0, 1, 3, 4, 5]
+        assert finding.examples.tolist() == [0, 1]
+
+    def test_inconsistency_finding_rows(self):
+        """Test: inconsistencies list the rows of each Nº Asiento and Fecha with several Saldo values."""
+        df = pd.DataFrame({
+            'Nº Asiento': [1, 1, 2],
+            'Fecha': pd.to_datetime(['2025-01-15', '2025-01-15', '2025-01-20']),
+            'Saldo': [10.0, 12.0, 7.0],
+        })
+
+        finding = next(f for f in audit_findings(df, "Test") if f.check_id == SALDO_INCONSISTENCIES)
+
+        assert finding.groups == 1
+        assert finding.rows.tolist() == [0, 1]
+
+
 class TestRemoveExactDuplicates:
     """Tests for the remove_exact_duplicates function."""
     
@@ -136,3 +224,17 @@ class TestRemoveExactDuplicates:
         assert len(df_cleaned) == 1
         assert df_cleaned['Concepto'].iloc[0] == 'Primera' 
 
+
+    def test_remove_exact_duplicates_returns_removed_index(self):
+        """Test: with return_removed, the index of every removed row is returned and order is kept."""
+        df = pd.DataFrame({
+            'Nº Asiento': [1, 1, 'END', 2, 1, 'END'],
+            'Fecha': pd.to_datetime(['2025-01-15'] * 6),
+            'Saldo': [10.0, 10.0, 0.0, 5.0, 10.0, 0.0],
+        }, index=[10, 11, 12, 13, 14, 15])
+
+        df_cleaned, removed_count, message, removed = remove_exact_duplicates(df, "Test", return_removed=True)
+
+        assert removed_count == 2
+        assert removed.tolist() == [11, 14]
+        assert df_cleaned.index.tolist() == [10, 12, 13, 15]
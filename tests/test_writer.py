@@ -0,0 +1,328 @@
+"""
+Unit tests for writing the updated InputPL workbook.
+"""
+import io
+import os
+import openpyxl
+from openpyxl.cell.cell import Cell
+from openpyxl.cell.read_only import EMPTY_CELL
+from openpyxl.formatting.rule import CellIsRule
+from openpyxl.styles import Font
+from openpyxl.worksheet.datavalidation import DataValidation
+import pandas as pd
+import pytest
+from datetime import datetime
+from src.config import INPUT_PL_COLS, OUTPUT_FILE
+from src import writer
+from src.writer import SheetIndex, _rewrite_existing_rows, save_to_excel
+from tests.conftest import write_workbook
+
+
+@pytest.fixture
+def template(tmp_path, monkeypatch):
+    """InputPL with two movements, an END row and a note below it; output goes to tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / "InputPL.xlsx"
+    write_workbook(path, INPUT_PL_COLS, [
+        [1, datetime(2025, 1, 15), 'DOC1', 'Amazon', 600, 100.5, 0, 100.5, 'Cuenta', -100.5, 'ene/25', 'IT', None],
+        [2, datetime(2025, 1, 20), 'DOC2', 'Taxi', 600, 20, 0, 20, 'Cuenta', -20, 'ene/25', 'Travel', None],
+        ['END'] + [None] * 12,
+        ['Notas'] + [None] * 12,
+    ])
+    return str(path)
+
+
+@pytest.fixture
+def classified_df():
+    """Two new movements, the second one with low confidence."""
+    return pd.DataFrame({
+        'Nº Asiento': [3, 4],
+        'Fecha': pd.to_datetime(['2025-02-10', '2025-02-11']),
+        'Concepto': ['Google', 'Nuevo proveedor'],
+        'Saldo': [30.25, 99.99],
+        'Neto': [-30.25, -99.99],
+        'Mes': ['feb/25', ''],
+        'Tipo de gasto': ['IT', 'NEW - NEEDS REVIEW'],
+        'Confidence': [100, 0],
+    })
+
+
+def read_output():
+    return openpyxl.load_workbook(OUTPUT_FILE).active
+
+
+class TestSaveToExcel:
+    """Tests for save_to_excel."""
+
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_inserts_new_rows_at_end_marker(self, template, classified_df, streaming):
+        """Test: new rows replace the END marker and the rows below it are kept, in both output modes."""
+        save_to_excel(classified_df, template, streaming=streaming)
+        sheet = read_output()
+
+        column_a = [row[0] for row in sheet.iter_rows(values_only=True)]
+        assert column_a == ['Nº Asiento', 1, 2, 3, 4, 'Notas']
+
+    def test_new_rows_values_and_formats(self, template, classified_df):
+        """Test: dates, Mes and amounts are written with their number formats."""
+        save_to_excel(classified_df, template)
+        sheet = read_output()
+
+        assert sheet['B4'].value == datetime(2025, 2, 10)
+        assert sheet['B4'].number_format == 'DD/MM/YYYY'
+        assert sheet['K4'].value == 'feb/25' and sheet['K4'].number_format == '@'
+        assert sheet['K5'].value is None
+        assert sheet['H4'].value == 30.25 and sheet['H4'].number_format == '#,##0.00'
+        assert sheet['D4'].value == 'Google'
+
+    def test_highlights_low_confidence_rows(self, template, classified_df):
+        """Test: only rows with confidence below 80 get the yellow fill, in every written column."""
+        save_to_excel(classified_df, template)
+        sheet = read_output()
+
+        assert sheet['D4'].fill.fgColor.rgb != '00FFF2CC'
+        assert all(sheet.cell(row=5, column=col).fill.fgColor.rgb == '00FFF2CC' for col in (1, 2, 4, 8, 10, 11, 12))
+        assert sheet['C5'].fill.fill_type is None
+
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_output_can_be_used_as_next_template(self, template, classified_df, tmp_path, streaming):
+        """Test: writing again on a previous output reuses its named styles."""
+        save_to_excel(classified_df, template, streaming=streaming)
+        next_template = tmp_path / "previous.xlsx"
+        read_output().parent.save(next_template)
+        openpyxl.load_workbook(next_template).save(next_template)
+
+        save_to_excel(classified_df.assign(**{'Nº Asiento': [5, 6]}), str(next_template), streaming=streaming)
+        sheet = read_output()
+
+        assert [row[0] for row in sheet.iter_rows(values_only=True)] == ['Nº Asiento', 1, 2, 3, 4, 'Notas', 5, 6]
+        assert sheet['H8'].number_format == '#,##0.00'
+
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_removes_stray_end_rows_and_keeps_layout_below(self, tmp_path, classified_df, monkeypatch, streaming):
+        """Test: every END row is dropped, rows below keep their order, gaps and styles."""
+        monkeypatch.chdir(tmp_path)
+        path = tmp_path / "stray.xlsx"
+        write_workbook(path, INPUT_PL_COLS, [
+            [1, datetime(2025, 1, 15)],
+            ['END'],
+            ['Nota 1'],
+            [None],
+            ['END'],
+            ['Nota 2', None, None, None, None, None, None, 5.5],
+        ])
+        wb = openpyxl.load_workbook(path)
+        wb.active['H7'].number_format = '#,##0.00'
+        wb.save(path)
+
+        save_to_excel(classified_df, str(path), streaming=streaming)
+        sheet = read_output()
+
+        assert [row[0] for row in sheet.iter_rows(values_only=True)] == ['Nº Asiento', 1, 3, 4, 'Nota 1', None, 'Nota 2']
+        assert sheet['H7'].value == 5.5 and sheet['H7'].number_format == '#,##0.00'
+
+    def test_moves_merged_cells_validations_and_formats_below(self, tmp_path, classified_df, monkeypatch):
+        """Test: merged ranges, data validations, conditional formats and row heights move with their rows."""
+        monkeypatch.chdir(tmp_path)
+        path = tmp_path / "ranges.xlsx"
+        write_workbook(path, INPUT_PL_COLS, [
+            [1, datetime(2025, 1, 15)],
+            ['END'],
+            ['Nota 1'],
+            [None],
+            ['END'],
+            ['Nota 2'],
+        ])
+        wb = openpyxl.load_workbook(path)
+        sheet = wb.active
+        sheet.merge_cells('A4:C4')
+        validation = DataValidation(type="list", formula1='"Si,No"')
+        validation.add('M4:M5')
+        sheet.add_data_validation(validation)
+        sheet.conditional_formatting.add('H4:H7', CellIsRule(operator='lessThan', formula=['0'], fill=writer.WARNING_FILL))
+        sheet.row_dimensions[3].height = 5
+        sheet.row_dimensions[4].height = 30
+        wb.save(path)
+
+        save_to_excel(classified_df, str(path))
+        sheet = read_output()
+
+        assert [str(merged) for merged in sheet.merged_cells.ranges] == ['A5:C5']
+        assert sheet['A5'].value == 'Nota 1'
+        assert [str(validation.sqref) for validation in sheet.data_validations.dataValidation] == ['M5:M6']
+        assert [str(formatting.sqref) for formatting in sheet.conditional_formatting] == ['H5:H7']
+        assert sheet.row_dimensions[5].height == 30
+        assert sheet.row_dimensions[3].height is None and sheet.row_dimensions[4].height is None
+
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_without_end_marker_appends_rows(self, tmp_path, classified_df, monkeypatch, streaming):
+        """Test: without END rows, new rows go after the last row and no END row is added."""
+        monkeypatch.chdir(tmp_path)
+        path = tmp_path / "no_end.xlsx"
+        write_workbook(path, INPUT_PL_COLS, [[1, datetime(2025, 1, 15)]])
+
+        save_to_excel(classified_df, str(path), streaming=streaming)
+        sheet = read_output()
+
+        assert [row[0] for row in sheet.iter_rows(values_only=True)] == ['Nº Asiento', 1, 3, 4]
+
+
+class TestInMemoryOutput:
+    """Tests for returning the output as an in-memory buffer."""
+
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_returns_buffer_without_writing_output_file(self, template, classified_df, streaming):
+        """Test: the workbook is returned as bytes and OUTPUT_FILE is not created."""
+        output = save_to_excel(classified_df, template, streaming=streaming, in_memory=True)
+
+        assert isinstance(output, io.BytesIO) and output.tell() == 0
+        assert not os.path.exists(OUTPUT_FILE)
+        sheet = openpyxl.load_workbook(output).active
+        assert [row[0] for row in sheet.iter_rows(max_row=5, values_only=True)] == ['Nº Asiento', 1, 2, 3, 4]
+
+    def test_output_file_mode_returns_none(self, template, classified_df):
+        """Test: by default the output goes to OUTPUT_FILE and nothing is returned."""
+        assert save_to_excel(classified_df, template) is None
+        assert os.path.exists(OUTPUT_FILE)
+
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_reports_progress(self, template, classified_df, streaming, monkeypatch):
+        """Test: progress(done, total) is reported as rows are written and never exceeds the total."""
+        monkeypatch.setattr(writer, "PROGRESS_ROWS", 1)
+        reports = []
+        save_to_excel(classified_df, template, streaming=streaming, progress=lambda *r: reports.append(r))
+
+        assert reports
+        assert all(0 < done <= total for done, total in reports)
+        assert [done for done, _ in reports] == sorted(done for done, _ in reports)
+
+    def test_custom_output_path(self, template, classified_df, tmp_path):
+        """Test: output_path replaces OUTPUT_FILE, creating its directory."""
+        output_path = tmp_path / "acme" / "InputPL_Updated.xlsx"
+        save_to_excel(classified_df, template, output_path=str(output_path))
+
+        assert output_path.exists() and not os.path.exists(OUTPUT_FILE)
+        sheet = openpyxl.load_workbook(output_path).active
+        assert [row[0] for row in sheet.iter_rows(max_row=5, values_only=True)] == ['Nº Asiento', 1, 2, 3, 4]
+
+
+class TestStreamingSaveToExcel:
+    """Tests for the write-only output mode of save_to_excel."""
+
+    def test_streaming_formats_and_fill(self, template, classified_df):
+        """Test: streamed rows get the same number formats and low-confidence fill as the in-place writer."""
+        save_to_excel(classified_df, template, streaming=True)
+        sheet = read_output()
+
+        assert sheet['B4'].value == datetime(2025, 2, 10) and sheet['B4'].number_format == 'DD/MM/YYYY'
+        assert sheet['H4'].value == 30.25 and sheet['H4'].number_format == '#,##0.00'
+        assert sheet['K4'].value == 'feb/25' and sheet['K4'].number_format == '@'
+        assert sheet['D4'].fill.fill_type is None
+        assert sheet['D5'].fill.fgColor.rgb == '00FFF2CC'
+
+    def test_streaming_rewrites_existing_rows_and_copies_styles(self, template, classified_df):
+        """Test: existing rows are fixed from input_df while template styles are kept."""
+        wb = openpyxl.load_workbook(template)
+        wb.active['K3'].value = 'dic/99'
+        wb.active['A1'].font = openpyxl.styles.Font(bold=True)
+        wb.save(template)
+        input_df = pd.DataFrame({
+            'Nº Asiento': [1, 2],
+            'Fecha': pd.to_datetime(['2025-01-15', '2025-01-20']),
+            'Mes': ['ene/25', 'ene/25'],
+        })
+
+        save_to_excel(classified_df, template, input_df=input_df, streaming=True)
+        sheet = read_output()
+
+        assert sheet['K3'].value == 'ene/25' and sheet['K3'].number_format == '@'
+        assert sheet['B2'].number_format == 'DD/MM/YYYY'
+        assert sheet['A1'].font.bold
+
+
+class TestSheetIndex:
+    """Tests for the one-pass sheet index."""
+
+    def test_index_finds_end_rows_and_insert_row(self, template):
+        """Test: END rows and the insertion point come from column A."""
+        index = SheetIndex(openpyxl.load_workbook(template).active)
+
+        assert index.end_rows == [4]
+        assert index.insert_row == 4
+
+    def test_index_maps_columns_from_header(self, tmp_path):
+        """Test: header names give the column positions; missing names never overwrite a header column."""
+        path = tmp_path / "reordered.xlsx"
+        write_workbook(path, ['Fecha', 'Nº Asiento', 'Saldo'], [[datetime(2025, 1, 15), 1, 10.0]])
+
+        index = SheetIndex(openpyxl.load_workbook(path).active)
+
+        assert index.columns['Fecha'] == 1
+        assert index.columns['Nº Asiento'] == 2
+        assert index.columns['Saldo'] == 3
+        assert index.columns['Tipo de gasto'] == INPUT_PL_COLS.index('Tipo de gasto') + 1
+        assert index.columns['Documento'] == 4
+        assert index.end_rows == [] and index.insert_row == 3
+
+
+class TestRewriteExistingRows:
+    """Tests for the diff-only rewrite of existing rows."""
+
+    def test_only_differing_cells_are_rewritten(self, template):
+        """Test: unchanged cells are left alone and a corrupted Mes is fixed."""
+        sheet = openpyxl.load_workbook(template).active
+        for row in (2, 3):
+            sheet.cell(row=row, column=2).number_format = 'DD/MM/YYYY'
+            sheet.cell(row=row, column=11).number_format = '@'
+            for col in (6, 7, 8, 10):
+                sheet.cell(row=row, column=col).number_format = '#,##0.00'
+        sheet['K3'].value = 'dic/99'
+        input_df = pd.DataFrame({
+            'Nº Asiento': [1, 2, 'END'],
+            'Fecha': pd.to_datetime(['2025-01-15', '2025-01-20', None]),
+            'Saldo': [100.5, 20.0, 0.0],
+            'Mes': ['ene/25', 'ene/25', ''],
+            'Documento': ['DOC1', 'DOC2', None],
+        })
+
+        rewritten, compared = _rewrite_existing_rows(sheet, input_df, SheetIndex(sheet))
+
+        assert (rewritten, compared) == (1, 10)
+        assert sheet['K3'].value == 'ene/25'
+
+
+class TestOpenpyxlInternals:
+    """The private openpyxl structures the writer depends on (openpyxl is pinned in requirements.txt)."""
+
+    def test_bulk_writer_internals(self):
+        """Test: named style lookup, the cell dict and Cell(style_array=...) still work as the writer expects."""
+        wb = openpyxl.Workbook()
+        styles = writer._new_row_styles(wb)
+        sheet = wb.active
+
+        style = styles[('#,##0.00', True)]
+        assert wb._named_styles["CFO #,##0.00 revisar"].as_tuple() == style
+        sheet._cells[(2, 3)] = Cell(sheet, row=2, column=3, value=1.5, style_array=style)
+
+        assert isinstance(sheet._cells, dict)
+        assert sheet['C2'].value == 1.5
+        assert sheet['C2'].number_format == '#,##0.00'
+        assert sheet['C2'].fill.start_color.rgb == writer.WARNING_FILL.start_color.rgb
+
+    def test_streaming_writer_internals(self, template):
+        """Test: read-only cells expose _style_id and a styled Cell exposes _style, as _StyleMap expects."""
+        wb = openpyxl.load_workbook(template)
+        wb.active['A1'].font = Font(bold=True)
+        wb.save(template)
+        source = openpyxl.load_workbook(template, read_only=True)
+        header = next(source.active.iter_rows(max_row=1))
+        target_wb = openpyxl.Workbook(write_only=True)
+        target_sheet = target_wb.create_sheet()
+
+        style_map = writer._StyleMap(target_sheet)
+        style = style_map(header[0])
+        source.close()
+
+        assert isinstance(header[0]._style_id, int) and header[0]._style_id == writer._style_id(header[0]) != 0
+        assert writer._style_id(EMPTY_CELL) == 0
+        assert Cell(target_sheet, value='x', style_array=style).font.bold